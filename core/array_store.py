@@ -0,0 +1,185 @@
+"""
+Per-topic array store for recordings.
+
+A recording 'drive.xlsx' is converted once into the directory 'drive.xlsx.npstore/'
+holding one raw .npy file per topic plus 'schema.json' (topic names, dtypes,
+frame count, time step and the source file's size/mtime). ExcelLoader opens a
+fresh store instead of parsing the workbook: every column is np.load'ed with
+mmap_mode='r' on first access, so opening is instant, only touched columns are
+paged in, and parallel batch workers share the OS page cache.
+Text and mixed columns are kept as a JSON list instead (missing values as
+null, numbers and strings as they were parsed) and loaded whole on first
+access, so they come back exactly as parsing the recording gives them.
+
+Convert a folder from the command line:
+    python -m core.array_store <folder or file> [...]
+"""
+import os
+import sys
+import json
+import shutil
+import numpy as np
+
+STORE_SUFFIX = ".npstore"
+SCHEMA_FILE = "schema.json"
+STORE_VERSION = 2
+
+
+def store_path_for(source_path):
+    return source_path + STORE_SUFFIX
+
+
+def is_array_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+
+def _source_signature(source_path):
+    st = os.stat(source_path)
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+
+def store_is_fresh(store_dir, source_path):
+    """True if store_dir exists and was written from the current version of source_path."""
+    if not is_array_store(store_dir) or not os.path.exists(source_path):
+        return False
+    try:
+        with open(os.path.join(store_dir, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return False
+    sig = _source_signature(source_path)
+    return (schema.get("version") == STORE_VERSION and
+            schema.get("source_size") == sig["source_size"] and
+            schema.get("source_mtime_ns") == sig["source_mtime_ns"])
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if value is getattr(sys.modules.get("pandas"), "NA", None):
+        return None
+    raise TypeError(f"Can't store value {value!r} of type {type(value).__name__}")
+
+
+def write_store(store_dir, columns, time_step, source_path=None):
+    """
+    Writes {topic: array} as an array store. Numeric and boolean columns are
+    raw .npy files; object/string columns are JSON lists (see module docstring).
+    The store is built in a temporary directory and moved into place at the end.
+    """
+    tmp_dir = store_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    schema = {"version": STORE_VERSION, "time_step": time_step, "n_frames": 0, "topics": []}
+    if source_path:
+        schema["source"] = os.path.basename(source_path)
+        schema.update(_source_signature(source_path))
+
+    for i, (topic, values) in enumerate(columns.items()):
+        arr = np.asarray(values)
+        # pandas arrays (e.g. the 'str' dtype) keep their dtype name, so loading rebuilds the same array
+        extension = not isinstance(getattr(values, "dtype", arr.dtype), np.dtype)
+        if extension or arr.dtype.kind == 'O':
+            dtype = values.dtype.name if extension else "object"
+            file_name = f"c{i:05d}.json"
+            with open(os.path.join(tmp_dir, file_name), 'w', encoding='utf-8') as f:
+                json.dump([_json_value(v) for v in arr.tolist()], f, ensure_ascii=False, allow_nan=False)
+            schema["topics"].append({"name": topic, "file": file_name, "dtype": dtype})
+        else:
+            file_name = f"c{i:05d}.npy"
+            np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(arr), allow_pickle=False)
+            schema["topics"].append({"name": topic, "file": file_name, "dtype": arr.dtype.str})
+        schema["n_frames"] = len(arr)
+
+    with open(os.path.join(tmp_dir, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(schema, f, indent=1, ensure_ascii=False)
+
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.replace(tmp_dir, store_dir)
+    return store_dir
+
+
+def convert_recording(source_path, store_dir=None):
+    """Parses a recording with ExcelLoader and writes its array store (next to it by default)."""
+    from core.data_loader import ExcelLoader
+    store_dir = store_dir or store_path_for(source_path)
+    loader = ExcelLoader()
+    loader.use_array_store = False
+    loader.use_cache = False
+    loader.load_file(source_path)
+    columns = {t: loader.get_data_for_topic(t) for t in loader.get_topics()}
+    return write_store(store_dir, columns, loader.time_step, source_path)
+
+
+class ArrayStore:
+    """Read-only view of a store directory; columns are memory-mapped lazily."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+            self.schema = json.load(f)
+        self.files = {t["name"]: t["file"] for t in self.schema["topics"]}
+        self.dtypes = {t["name"]: t["dtype"] for t in self.schema["topics"]}
+        self.topics = [t["name"] for t in self.schema["topics"]]
+        self.n_frames = self.schema["n_frames"]
+        self.time_step = self.schema.get("time_step", 0.033)
+        self._arrays = {}
+
+    def __contains__(self, topic):
+        return topic in self.files
+
+    def get(self, topic):
+        arr = self._arrays.get(topic)
+        if arr is None:
+            path = os.path.join(self.store_dir, self.files[topic])
+            if path.endswith(".json"):
+                arr = self._load_json(path, self.dtypes[topic])
+            else:
+                arr = np.load(path, mmap_mode='r', allow_pickle=False)
+            self._arrays[topic] = arr
+        return arr
+
+
+    @staticmethod
+    def _load_json(path, dtype):
+        with open(path, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        if dtype != "object":
+            import pandas as pd
+            return pd.array(values, dtype=dtype)
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = [np.nan if v is None else v for v in values]
+        return arr
+
+
+def main(argv):
+    if not argv:
+        print("Usage: python -m core.array_store <folder or file> [...]")
+        return 1
+    for target in argv:
+        if os.path.isdir(target):
+            paths = [os.path.join(root, f) for root, dirs, files in os.walk(target)
+                     for f in files if f.lower().endswith(('.xlsx', '.xls', '.csv'))]
+        else:
+            paths = [target]
+        for path in paths:
+            if store_is_fresh(store_path_for(path), path):
+                print(f"Up to date: {path}")
+                continue
+            try:
+                convert_recording(path)
+                print(f"Converted: {path}")
+            except Exception as e:
+                print(f"Failed: {path}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,221 @@
+import numpy as np
+
+# Result fields that can be grouped on. 'categories' holds several values per
+# file (" | " joined in batch results), so a file counts once in each category.
+GROUP_FIELDS = ["vehicle", "sw_ver", "test_date", "categories", "tc_number"]
+STATUSES = ["PASS", "FAIL", "ERROR", "NO_CONFIG", "EMPTY_RULES", "MISSING_TOPICS"]
+# Statuses of files that had nothing to check (left out of pass rates)
+UNCHECKED = ["NO_CONFIG", "EMPTY_RULES"]
+
+
+class _CodedColumn:
+    """Dictionary-encoded string column: distinct values plus a growing int code buffer."""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        self.codes = np.zeros(1024, dtype=np.int32)
+        self.size = 0
+
+    def code_of(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        if self.size == len(self.codes):
+            self.codes = np.resize(self.codes, len(self.codes) * 2)
+        self.codes[self.size] = self.code_of(value)
+        self.size += 1
+
+    def view(self):
+        return self.codes[:self.size]
+
+
+class BatchAnalytics:
+    """
+    Columnar accumulator for batch results. Results are added one at a time as
+    they stream in (O(1) each); grouping and per-rule failure counts are then
+    computed with NumPy over the integer-coded columns.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.status = _CodedColumn()
+        for s in STATUSES:
+            self.status.code_of(s) # Fixed codes for the known statuses
+        self.fields = {f: _CodedColumn() for f in GROUP_FIELDS if f != "categories"}
+
+        # Multi-valued columns are stored exploded: (row, code) pairs
+        self.category_names = _CodedColumn()
+        self.category_rows = []
+        self.rule_names = _CodedColumn()
+        self.rule_rows = []
+
+    def add(self, result):
+        row = self.count
+        self.count += 1
+        self.status.append(result.get("status", "UNKNOWN"))
+        for name, column in self.fields.items():
+            column.append(str(result.get(name, "") or ""))
+
+        cats = result.get("categories", "")
+        if isinstance(cats, str):
+            cats = [c.strip() for c in cats.split("|") if c.strip()]
+        for cat in (cats or [""]):
+            self.category_names.append(cat)
+            self.category_rows.append(row)
+
+        for desc in result.get("failed_rules", []):
+            self.rule_names.append(desc)
+            self.rule_rows.append(row)
+
+    def add_many(self, results):
+        for res in results:
+            self.add(res)
+
+    def _group_codes(self, fields, rows):
+        """
+        Returns (group_ids, keys) for the given rows: one group id per row and the
+        tuple of field values for each group id.
+        """
+        combined = np.zeros(len(rows), dtype=np.int64)
+        columns = []
+        for name in fields:
+            if name == "categories":
+                raise ValueError("categories must be expanded before grouping")
+            column = self.fields[name]
+            combined = combined * max(len(column.values), 1) + column.view()[rows]
+            columns.append(column)
+
+        uniq, group_ids = np.unique(combined, return_inverse=True)
+        keys = []
+        for value in uniq:
+            key = []
+            for column in reversed(columns):
+                radix = max(len(column.values), 1)
+                key.append(column.values[value % radix])
+                value //= radix
+            keys.append(tuple(reversed(key)))
+        return group_ids, keys
+
+    def _expanded_rows(self, fields):
+        """Row indices to aggregate over, repeated per category if grouping by category."""
+        if "categories" in fields:
+            return np.asarray(self.category_rows, dtype=np.int64), self.category_names.view()
+        return np.arange(self.count), None
+
+    def _grouping(self, fields, rows, cat_codes):
+        other = [f for f in fields if f != "categories"]
+        group_ids, keys = self._group_codes(other, rows)
+        if cat_codes is None:
+            return group_ids, keys
+
+        # Fold the category code into the group id, then renumber
+        radix = max(len(self.category_names.values), 1)
+        combined = group_ids.astype(np.int64) * radix + cat_codes
+        uniq, group_ids = np.unique(combined, return_inverse=True)
+        cat_pos = list(fields).index("categories")
+        full_keys = []
+        for value in uniq:
+            key = list(keys[value // radix])
+            key.insert(cat_pos, self.category_names.values[value % radix])
+            full_keys.append(tuple(key))
+        return group_ids, full_keys
+
+    def summary(self, fields):
+        """
+        Pass/fail counts per group of 'fields' (e.g. ["sw_ver"] or ["vehicle", "sw_ver"]).
+        pass_rate is PASS over files that had a config (PASS + FAIL + ERROR).
+        """
+        fields = list(fields)
+        if self.count == 0:
+            return []
+        rows, cat_codes = self._expanded_rows(fields)
+        group_ids, keys = self._grouping(fields, rows, cat_codes)
+
+        status_codes = self.status.view()[rows]
+        n_groups = len(keys)
+        counts = np.zeros((n_groups, len(self.status.values)), dtype=np.int64)
+        np.add.at(counts, (group_ids, status_codes), 1)
+
+        table = []
+        for g, key in enumerate(keys):
+            entry = dict(zip(fields, key))
+            for s in STATUSES:
+                entry[s] = int(counts[g, self.status.index[s]])
+            entry["total"] = int(counts[g].sum())
+            checked = entry["total"] - sum(entry[s] for s in UNCHECKED)
+            entry["pass_rate"] = entry["PASS"] / checked if checked else 0.0
+            table.append(entry)
+        table.sort(key=lambda e: tuple(e[f] for f in fields))
+        return table
+
+    def rule_failures(self, fields=()):
+        """
+        How often each rule failed, optionally per group of 'fields'.
+        fail_share is failures over the files in the group that had rules to check.
+        """
+        fields = list(fields)
+        if not self.rule_rows:
+            return []
+
+        fail_rows = np.asarray(self.rule_rows, dtype=np.int64)
+        rule_codes = self.rule_names.view()
+        if fields:
+            group_rows, cat_codes = self._expanded_rows(fields)
+            group_ids, keys = self._grouping(fields, group_rows, cat_codes)
+            if cat_codes is not None:
+                # Join failures to their (row, category) pairs. Exploded rows are
+                # appended in row order, so each row's pairs are one contiguous range.
+                lo = np.searchsorted(group_rows, fail_rows, side="left")
+                reps = np.searchsorted(group_rows, fail_rows, side="right") - lo
+                offsets = np.arange(reps.sum()) - np.repeat(np.cumsum(reps) - reps, reps)
+                rule_codes = np.repeat(rule_codes, reps)
+                fail_groups = group_ids[np.repeat(lo, reps) + offsets]
+            else:
+                fail_groups = group_ids[fail_rows]
+        else:
+            group_rows = np.arange(self.count)
+            group_ids, keys = np.zeros(self.count, dtype=np.int64), [()]
+            fail_groups = np.zeros(len(fail_rows), dtype=np.int64)
+
+        # Files with a config per group (denominator for fail_share)
+        configured = ~np.isin(self.status.view()[group_rows], [self.status.index[s] for s in UNCHECKED])
+        group_sizes = np.bincount(group_ids, weights=configured, minlength=len(keys))
+
+        n_rules = len(self.rule_names.values)
+        combined = fail_groups * n_rules + rule_codes
+        uniq, counts = np.unique(combined, return_counts=True)
+        table = []
+        for value, n in zip(uniq, counts):
+            g, r = divmod(int(value), n_rules)
+            entry = dict(zip(fields, keys[g]))
+            entry["rule"] = self.rule_names.values[r]
+            entry["failures"] = int(n)
+            entry["fail_share"] = float(n / group_sizes[g]) if group_sizes[g] else 0.0
+            table.append(entry)
+        table.sort(key=lambda e: (tuple(e[f] for f in fields), -e["failures"]))
+        return table
+
+    def export_csv(self, file_path, fields):
+        """Writes the group summary followed by the per-rule failure table to one CSV file."""
+        import csv
+        fields = list(fields)
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(fields + ["total"] + STATUSES + ["pass_rate"])
+            for entry in self.summary(fields):
+                writer.writerow([entry[k] for k in fields] + [entry["total"]] +
+                                [entry[s] for s in STATUSES] + [f"{entry['pass_rate']:.4f}"])
+            writer.writerow([])
+            writer.writerow(fields + ["rule", "failures", "fail_share"])
+            for entry in self.rule_failures(fields):
+                writer.writerow([entry[k] for k in fields] + [entry["rule"], entry["failures"],
+                                                             f"{entry['fail_share']:.4f}"])
@@ -0,0 +1,349 @@
+"""
+Pipelined batch engine: the stages of BatchProcessor.run_batch overlap instead
+of running one after another per file.
+
+  discovery -> [read queue] -> read (threads, file bytes into memory)
+            -> [parse queue] -> parse (process pool) -> [eval queue]
+            -> evaluate (threads, check_rules) -> [sink queue] -> sink
+
+Queues are bounded, and the readers also respect a byte budget for recordings held
+in memory, so a slow stage makes the stages before it wait (backpressure) rather
+than buffering the whole folder. Recordings without a config, and those the
+dataset cache or a fresh array store can serve, skip reading and parsing, as
+do those the pre-flight check rejects from their header (see batch_processor.preflight).
+With max_memory_mb, a recording is only read once its estimated peak memory
+(core.memory_budget.MemoryModel) fits next to the recordings already in
+flight; the reservation is replaced by the measured peak once it has been
+parsed and released when it has been evaluated. How many recordings are
+parsed at once thus follows their size: many small ones, or one big one alone.
+Queue depths are sampled while the batch runs, see PipelinedBatchProcessor.stage_stats.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from core.array_store import store_path_for, store_is_fresh
+from core.batch_processor import BatchProcessor, PlanCache, check_file, config_hash, find_recordings, preflight
+from core.batch_scheduler import schedule, record_duration, ORDER_WALK
+from core.data_loader import ExcelLoader
+from core.dataset_cache import dataset_cache
+from core.memory_budget import MemoryModel, measure_peak, WORKER_BASELINE_BYTES
+
+STAGES = ["read", "parse", "evaluate", "sink"]
+_DONE = object() # End-of-stream marker passed down the queues
+
+
+def _load_bytes(data, file_name):
+    loader = ExcelLoader()
+    loader.load_bytes(data, file_name)
+    return loader
+
+
+def _parse_recording(file_name, data):
+    """
+    Process pool entry point: parses an in-memory recording into a loader.
+    Returns (loader, worker pid, worker RSS before parsing, peak bytes used by parsing or None).
+    """
+    loader, rss_before, peak_used = measure_peak(_load_bytes, data, file_name)
+    return loader, os.getpid(), rss_before, peak_used
+
+
+class _ByteBudget:
+    """Admits work while the bytes it holds fit in limit (file content, or estimated memory)."""
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.holders = 0
+        self.max_holders = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, n):
+        async with self._cond:
+            # A file larger than the whole budget still goes through, alone
+            await self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.limit)
+            self.used += n
+            self.holders += 1
+            self.peak = max(self.peak, self.used)
+            self.max_holders = max(self.max_holders, self.holders)
+
+    async def release(self, n):
+        async with self._cond:
+            self.used -= n
+            self.holders -= 1
+            self._cond.notify_all()
+
+    async def resize(self, old, new):
+        """Replaces a holder's reservation of old bytes by new bytes."""
+        async with self._cond:
+            self.used += new - old
+            self.peak = max(self.peak, self.used)
+            self._cond.notify_all()
+
+    async def set_limit(self, limit):
+        async with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+
+class _Item:
+    __slots__ = ("index", "path", "rel_path", "config", "size", "data", "loaded", "estimate", "reserved", "held",
+                 "accepted")
+
+    def __init__(self, index, path, rel_path, config):
+        self.index = index
+        self.path = path
+        self.rel_path = rel_path
+        self.config = config
+        self.size = 0
+        self.data = None
+        self.loaded = None # ExcelLoader or the exception parsing raised; None loads in evaluate
+        self.estimate = 0 # Uncorrected peak memory estimate
+        self.reserved = 0 # Bytes held in the memory budget
+        self.held = False # Holds a memory budget reservation (possibly of 0 bytes)
+        self.accepted = False # Passed the pre-flight check in discover, check_file needn't repeat it
+
+
+class PipelinedBatchProcessor(BatchProcessor):
+    """
+    Drop-in for BatchProcessor with the stages pipelined (see module docstring).
+    Results are returned in discovery (i.e. scheduled) order; progress_callback is called as
+    results complete. After a run, stage_stats holds per stage:
+      items, busy (seconds spent working, summed over workers), workers,
+      queue_avg / queue_max / queue_size (depth of the stage's input queue).
+    A stage whose input queue stays full is the one limiting throughput.
+    max_memory_mb: memory for the parse workers and the recordings in flight
+    (None: no limit beyond max_buffered_mb of file content). memory_stats then
+    holds limit_mb, workers_mb (worker baseline RSS), peak_mb (reserved),
+    max_in_flight, in_flight (reservations still held, 0 after a run) and the
+    learned per file type correction factors.
+    The parse stage forks a process pool, so run it from scripts and services,
+    not from a GUI process (the batch dialog uses BatchProcessor).
+    """
+    def __init__(self, read_workers=4, parse_workers=None, eval_workers=2,
+                 queue_size=8, max_buffered_mb=256, sample_interval=0.05, max_memory_mb=None):
+        super().__init__()
+        self.read_workers = read_workers
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.eval_workers = eval_workers
+        self.queue_size = queue_size
+        self.max_buffered_bytes = int(max_buffered_mb * 1024 * 1024)
+        self.sample_interval = sample_interval
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024) if max_memory_mb else None
+        self.memory_model = MemoryModel(ExcelLoader())
+        self.stage_stats = {}
+        self.memory_stats = {}
+
+    def run_batch(self, folder_path, inspector_logic, progress_callback=None, fail_fast=False,
+                  collect_intervals=False, results_store=None, result_sink=None, resume=False,
+                  keep_results=True, order=ORDER_WALK, use_preflight=True):
+        """Same arguments and result entries as BatchProcessor.run_batch."""
+        self.results = asyncio.run(self._run(folder_path, inspector_logic, progress_callback,
+                                             fail_fast, collect_intervals, results_store,
+                                             result_sink, resume, keep_results, order, use_preflight))
+        return self.results
+
+    async def _run(self, folder_path, inspector_logic, progress_callback, fail_fast,
+                   collect_intervals, results_store, result_sink, resume, keep_results, order, use_preflight):
+        loop = asyncio.get_running_loop()
+        queues = {stage: asyncio.Queue(self.queue_size) for stage in STAGES}
+        workers = {"read": self.read_workers, "parse": self.parse_workers,
+                   "evaluate": self.eval_workers, "sink": 1}
+        stats = {stage: {"items": 0, "busy": 0.0, "workers": workers[stage], "samples": []}
+                 for stage in STAGES}
+        budget = _ByteBudget(self.max_buffered_bytes)
+        self.plan_cache = PlanCache()
+        worker_rss = {} # parse worker pid -> RSS before its last parse
+
+        def memory_limit():
+            # Workers that haven't parsed anything yet are assumed to take WORKER_BASELINE_BYTES
+            unmeasured = max(self.parse_workers - len(worker_rss), 0)
+            workers_bytes = sum(worker_rss.values()) + unmeasured * WORKER_BASELINE_BYTES
+            return max(self.max_memory_bytes - workers_bytes, 0)
+        memory = _ByteBudget(memory_limit()) if self.max_memory_bytes else None
+        collected = []
+        completed = 0
+
+        data_files = find_recordings(folder_path, result_sink.completed_files() if resume and result_sink else ())
+        if order != ORDER_WALK:
+            history = results_store.last_file_results(folder_path) if results_store is not None else None
+            data_files = schedule(data_files, folder_path, inspector_logic, order, history)
+        total_files = len(data_files)
+
+        run_id = None
+        if results_store is not None:
+            run_id = results_store.begin_run(folder_path, config_hash(inspector_logic.master_config_data))
+
+        async def discover():
+            for i, file_path in enumerate(data_files):
+                file_stem = os.path.splitext(os.path.basename(file_path))[0]
+                rel_path = os.path.relpath(file_path, folder_path)
+                item = _Item(i, file_path, rel_path, inspector_logic.get_config_for_file(file_stem, rel_path))
+                rejected = not item.config or (use_preflight and await loop.run_in_executor(
+                    io_pool, preflight, file_path, item.config) is not None)
+                item.accepted = not rejected
+                if rejected or dataset_cache.get(file_path) is not None or \
+                        store_is_fresh(store_path_for(file_path), file_path):
+                    # Nothing to parse here: nothing to check, or loading is already cheap
+                    await queues["evaluate"].put(item)
+                else:
+                    await queues["read"].put(item)
+            await queues["read"].put(_DONE)
+
+        def read_bytes(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        async def read(item):
+            if memory is not None:
+                item.estimate, item.reserved = await loop.run_in_executor(
+                    io_pool, self.memory_model.estimate, item.path)
+                await memory.acquire(item.reserved)
+                item.held = True
+            try:
+                item.size = os.path.getsize(item.path)
+                await budget.acquire(item.size)
+            except OSError as e:
+                item.loaded = e
+                return item
+            try:
+                item.data = await loop.run_in_executor(io_pool, read_bytes, item.path)
+            except OSError as e:
+                await budget.release(item.size)
+                item.loaded = e
+            return item
+
+        async def account(item, pid, rss_before, peak_used):
+            # Replace the estimate by what parsing actually took, and keep the
+            # parse workers' own RSS out of the memory left for recordings
+            if peak_used is not None:
+                measured = item.size + peak_used
+                self.memory_model.observe(item.path, item.estimate, measured)
+                await memory.resize(item.reserved, measured)
+                item.reserved = measured
+            if rss_before is not None:
+                worker_rss[pid] = max(rss_before - item.size, 0)
+                await memory.set_limit(memory_limit())
+
+        async def parse(item):
+            if item.data is None:
+                return item # Reading failed, report it in evaluate
+            try:
+                item.loaded, pid, rss_before, peak_used = await loop.run_in_executor(
+                    cpu_pool, _parse_recording, item.path, item.data)
+                if memory is not None:
+                    await account(item, pid, rss_before, peak_used)
+            except Exception as e:
+                item.loaded = e
+            finally:
+                item.data = None
+                await budget.release(item.size)
+            return item
+
+        def load_parsed(item):
+            def load(file_path):
+                if isinstance(item.loaded, Exception):
+                    raise item.loaded
+                if item.loaded.use_cache:
+                    dataset_cache.put(file_path, item.loaded._snapshot())
+                return item.loaded
+            return load
+
+        async def evaluate(item):
+            load = load_parsed(item) if item.loaded is not None else None
+            entry = await loop.run_in_executor(eval_pool, check_file, item.path, item.config, item.rel_path,
+                                               fail_fast, collect_intervals, load,
+                                               use_preflight and not item.accepted, self.plan_cache)
+            record_duration(item.path, entry["duration"])
+            item.loaded = None
+            if item.held:
+                await memory.release(item.reserved)
+                item.held = False
+            return item.index, entry
+
+        async def sink(indexed_entry):
+            # Runs on the event loop thread, i.e. the thread that opened results_store
+            nonlocal completed
+            entry = indexed_entry[1]
+            completed += 1
+            if keep_results:
+                collected.append(indexed_entry)
+            if result_sink is not None:
+                result_sink.write(entry)
+            if results_store is not None:
+                results_store.add_result(run_id, entry)
+            if progress_callback:
+                progress_callback(completed, total_files, entry)
+            return None
+
+        async def run_stage(stage, fn, out_queue):
+            in_queue = queues[stage]
+            async def worker():
+                while True:
+                    item = await in_queue.get()
+                    if item is _DONE:
+                        await in_queue.put(_DONE) # Let the other workers of this stage see it
+                        return
+                    start = time.perf_counter()
+                    result = await fn(item)
+                    stats[stage]["busy"] += time.perf_counter() - start
+                    stats[stage]["items"] += 1
+                    if out_queue is not None:
+                        await out_queue.put(result)
+            await asyncio.gather(*(worker() for _ in range(workers[stage])))
+            if out_queue is not None:
+                await out_queue.put(_DONE)
+
+        async def sample():
+            while True:
+                for stage in STAGES:
+                    stats[stage]["samples"].append(queues[stage].qsize())
+                await asyncio.sleep(self.sample_interval)
+
+        io_pool = ThreadPoolExecutor(max_workers=self.read_workers)
+        eval_pool = ThreadPoolExecutor(max_workers=self.eval_workers)
+        cpu_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        sampler = asyncio.ensure_future(sample())
+        try:
+            await asyncio.gather(
+                discover(),
+                run_stage("read", read, queues["parse"]),
+                run_stage("parse", parse, queues["evaluate"]),
+                run_stage("evaluate", evaluate, queues["sink"]),
+                run_stage("sink", sink, None))
+        finally:
+            sampler.cancel()
+            io_pool.shutdown()
+            eval_pool.shutdown()
+            cpu_pool.shutdown()
+
+        if results_store is not None:
+            results_store.finish_run(run_id, total_files)
+
+        self.stage_stats = {}
+        for stage in STAGES:
+            samples = stats[stage].pop("samples") or [0]
+            self.stage_stats[stage] = dict(stats[stage], queue_avg=sum(samples) / len(samples),
+                                           queue_max=max(samples), queue_size=self.queue_size)
+        self.memory_stats = {}
+        if memory is not None:
+            mb = 1024 * 1024
+            self.memory_stats = {"limit_mb": self.max_memory_bytes / mb,
+                                 "workers_mb": sum(worker_rss.values()) / mb,
+                                 "peak_mb": memory.peak / mb, "max_in_flight": memory.max_holders,
+                                 "in_flight": memory.holders,
+                                 "factors": dict(self.memory_model.factors)}
+        collected.sort(key=lambda indexed_entry: indexed_entry[0])
+        return [entry for _, entry in collected]
+
+
+def format_stage_stats(stage_stats):
+    """One line per stage: items, busy time and input queue depth (avg / max of size)."""
+    lines = []
+    for stage in STAGES:
+        s = stage_stats.get(stage)
+        if s is None:
+            continue
+        lines.append(f"{stage:<9} {s['items']:5d} items  busy {s['busy']:7.2f} s ({s['workers']} workers)  "
+                     f"queue {s['queue_avg']:4.1f} avg / {s['queue_max']} max of {s['queue_size']}")
+    return "\n".join(lines)
@@ -1,13 +1,23 @@
 import os
 import glob
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from core.data_loader import ExcelLoader
-from core.logic import InspectorLogic
+from core.logic import InspectorLogic, Rule, fail_intervals, missing_topics
+from core.rule_optimizer import optimize_rules
+from core.batch_scheduler import schedule, record_duration, ORDER_WALK
 
 class BatchProcessor:
     def __init__(self):
         self.results = []
+        self.plan_cache = None # PlanCache of the last run
 
-    def run_batch(self, folder_path, inspector_logic, progress_callback=None):
+    def run_batch(self, folder_path, inspector_logic, progress_callback=None, fail_fast=False,
+                  collect_intervals=False, results_store=None, result_sink=None, resume=False,
+                  keep_results=True, order=ORDER_WALK, use_preflight=True):
         """
         Scans folder for .xlsx/.xls/.csv files.
         Looks up config in the provided inspector_logic (Master Config).
@@ -15,95 +25,265 @@ class BatchProcessor:
         Returns list of results.
         
         progress_callback: function(current, total, filename)
+        fail_fast: Stop checking a file at its first failing rule. 'fail_count' is
+                   then at most 1; frame details are left to Inspect.
+        collect_intervals: Evaluate full frame lists so each rule result carries its
+                   failing time intervals (slower than the default verdict-only check).
+        results_store: Optional ResultsStore; the run and every result are appended to it.
+        result_sink: Optional streaming sink (see core.result_sinks); every result is
+                   appended and flushed as soon as its file is checked.
+        resume: Skip the files already in result_sink (e.g. after a crash).
+        keep_results: False keeps no results in memory (self.results / the returned list
+                   stay empty), for very large batches that stream to a sink.
+        order: Processing order, see core.batch_scheduler (ORDER_WALK, ORDER_COST, ORDER_FEEDBACK).
+                   Results come in processing order; results_store provides past durations/statuses.
+        use_preflight: Classify files from their config and header before loading them (see
+                   preflight()): EMPTY_RULES and MISSING_TOPICS files are reported without
+                   being loaded. False loads and checks every file that has a config.
         """
         self.results = []
+        self.plan_cache = PlanCache()
+        run_id = None
         
         # Find all excel/csv files recursively
-        data_files = []
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(('.xlsx', '.xls', '.csv')):
-                    full_path = os.path.join(root, file)
-                    data_files.append(full_path)
+        data_files = find_recordings(folder_path, result_sink.completed_files() if resume and result_sink else ())
+        if order != ORDER_WALK:
+            history = results_store.last_file_results(folder_path) if results_store is not None else None
+            data_files = schedule(data_files, folder_path, inspector_logic, order, history)
         
         total_files = len(data_files)
         
+        if results_store is not None:
+            run_id = results_store.begin_run(folder_path, config_hash(inspector_logic.master_config_data))
+        
         for i, file_path in enumerate(data_files):
             # Use relative path 
             rel_path = os.path.relpath(file_path, folder_path)
             file_stem = os.path.splitext(os.path.basename(file_path))[0]
             
-            result_entry = {
-                "file": rel_path,
-                "status": "UNKNOWN",
-                "fail_count": 0,
-                "details": "",
-                "vehicle": "",
-                "sw_ver": "",
-                "test_date": "",
-                "categories": "",
-                "tc_number": "",
-                "note": ""
-            }
-            
             # Lookup config in Master
-            config_data = inspector_logic.get_config_for_file(file_stem)
-            
-            if not config_data:
-                result_entry["status"] = "NO_CONFIG"
-                result_entry["details"] = "Config not found in Master."
-            else:
-                try:
-                    # Create a TEMPORARY logic instance for this check
-                    # We can't use the main one because it holds state (rules, metadata) 
-                    # that we don't want to mix, although we could reuse it if we are careful.
-                    # Better to create a new instance and populate it from the dict.
-                    temp_logic = InspectorLogic()
-                    temp_logic.load_config_from_dict(config_data)
-                    
-                    # Extract Metadata
-                    result_entry["vehicle"] = temp_logic.metadata.get("vehicle", "")
-                    result_entry["sw_ver"] = temp_logic.metadata.get("sw_ver", "")
-                    result_entry["test_date"] = temp_logic.metadata.get("test_date", "")
-                    
-                    cats = temp_logic.metadata.get("categories", [])
-                    if isinstance(cats, list):
-                        result_entry["categories"] = " | ".join(cats)
-                    else:
-                        result_entry["categories"] = str(cats)
-                        
-                    result_entry["tc_number"] = temp_logic.metadata.get("tc_number", "")
-                    result_entry["note"] = temp_logic.metadata.get("note", "")
-                    
-                    # Load Data
-                    loader = ExcelLoader()
-                    loader.load_file(file_path)
-                    
-                    # Check Rules
-                    check_results = temp_logic.check_rules(loader)
-                    
-                    fail_count = sum(1 for r in check_results if r['status'] == 'FAIL')
-                    
-                    result_entry["fail_count"] = fail_count
-                    
-                    if fail_count == 0:
-                        result_entry["status"] = "PASS"
-                        result_entry["details"] = "All rules passed."
-                    else:
-                        result_entry["status"] = "FAIL"
-                        # Summarize failures
-                        failed_rules = [r['rule_desc'] for r in check_results if r['status'] == 'FAIL']
-                        result_entry["details"] = f"{fail_count} failures: " + ", ".join(failed_rules[:3])
-                        if len(failed_rules) > 3:
-                            result_entry["details"] += "..."
-                            
-                except Exception as e:
-                    result_entry["status"] = "ERROR"
-                    result_entry["details"] = str(e)
+            config_data = inspector_logic.get_config_for_file(file_stem, rel_path)
+            result_entry = check_file(file_path, config_data, rel_path, fail_fast, collect_intervals,
+                                      use_preflight=use_preflight, plan_cache=self.plan_cache)
+            record_duration(file_path, result_entry["duration"])
+            if keep_results:
+                self.results.append(result_entry)
+            if result_sink is not None:
+                result_sink.write(result_entry)
             
-            self.results.append(result_entry)
+            if results_store is not None:
+                results_store.add_result(run_id, result_entry)
             
             if progress_callback:
                 progress_callback(i + 1, total_files, result_entry)
+        
+        if results_store is not None:
+            results_store.finish_run(run_id, total_files)
             
         return self.results
+
+
+def find_recordings(folder_path, skip=()):
+    """Recording files (.xlsx/.xls/.csv) under folder_path, except those whose relative path is in skip."""
+    data_files = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            if file.lower().endswith(('.xlsx', '.xls', '.csv')):
+                full_path = os.path.join(root, file)
+                if not skip or os.path.relpath(full_path, folder_path) not in skip:
+                    data_files.append(full_path)
+    return data_files
+
+
+def new_result_entry(rel_path):
+    """Batch result entry for a file that has not been checked yet (status UNKNOWN)."""
+    return {
+        "file": rel_path,
+        "status": "UNKNOWN",
+        "fail_count": 0,
+        "details": "",
+        "vehicle": "",
+        "sw_ver": "",
+        "test_date": "",
+        "categories": "",
+        "tc_number": "",
+        "note": "",
+        "failed_rules": [],
+        "rule_results": [],
+        "config_hash": "",
+        "duration": 0.0
+    }
+
+
+class PlanCache:
+    """
+    Parsed rules and their evaluation plan (rule_optimizer.RulePlan) per rule
+    list, keyed by a content hash of the rules, so the files of a batch that
+    share a rule list (copies of an entry, or one pattern entry) parse and plan
+    it once. Metadata stays per file. Thread-safe; keeps the max_entries most
+    recently used rule lists.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict() # rules hash -> (rules, plan)
+        self._lock = threading.Lock()
+
+    def get(self, config_data):
+        """(rules, plan) of a config entry (dict with "rules", or a legacy list of rules)."""
+        rules_data = config_data if isinstance(config_data, list) else config_data.get("rules", [])
+        key = config_hash(rules_data)
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return cached
+        rules = [Rule.from_dict(item) for item in rules_data]
+        cached = (rules, optimize_rules(rules))
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = cached
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return cached
+
+
+def preflight(file_path, config_data):
+    """
+    Classifies a recording from its config and header only, without loading its data.
+    Returns (status, details) for a file that can't be checked:
+      NO_CONFIG       no config entry for the file
+      EMPTY_RULES     the config has no rules
+      MISSING_TOPICS  the header lacks topics the rules need (see logic.missing_topics)
+    or None when the file has to be loaded and checked.
+    """
+    if not config_data:
+        return "NO_CONFIG", "Config not found in Master."
+    temp_logic = InspectorLogic()
+    temp_logic.load_config_from_dict(config_data)
+    return _preflight_rules(file_path, temp_logic.rules)
+
+
+def _preflight_rules(file_path, rules):
+    if not rules:
+        return "EMPTY_RULES", "Config has no rules."
+    try:
+        topics = ExcelLoader().probe_file(file_path)["topics"]
+    except Exception:
+        return None # Unreadable header: loading the file reports the error
+    if not topics:
+        return None
+    missing = missing_topics(rules, topics)
+    if missing:
+        details = "Missing topics: " + ", ".join(missing[:3])
+        if len(missing) > 3:
+            details += "..."
+        return "MISSING_TOPICS", details
+    return None
+
+
+def check_file(file_path, config_data, rel_path=None, fail_fast=False, collect_intervals=False,
+               load_recording=None, use_preflight=True, plan_cache=None):
+    """
+    Validates one recording against its config entry (master config format: a dict
+    with "rules"/"metadata", or a legacy list of rules; None gives NO_CONFIG).
+    Returns the batch result entry for the file, see BatchProcessor.run_batch.
+    Module level so it can be run in worker processes.
+    load_recording: optional function(file_path) -> loaded ExcelLoader, e.g. for
+                    recordings parsed elsewhere; default loads the file here.
+    use_preflight: report EMPTY_RULES / MISSING_TOPICS from the file header instead of loading it.
+    plan_cache: PlanCache shared by the files of a batch (default: parse the rules here).
+    """
+    result_entry = new_result_entry(rel_path if rel_path is not None else os.path.basename(file_path))
+    file_start = time.perf_counter()
+    
+    if not config_data:
+        result_entry["status"] = "NO_CONFIG"
+        result_entry["details"] = "Config not found in Master."
+    else:
+        try:
+            # Create a TEMPORARY logic instance for this check
+            # We can't use the main one because it holds state (rules, metadata) 
+            # that we don't want to mix, although we could reuse it if we are careful.
+            # Better to create a new instance and populate it from the dict.
+            temp_logic = InspectorLogic()
+            plan = None
+            if plan_cache is not None:
+                rules, plan = plan_cache.get(config_data)
+                temp_logic.load_config_from_dict(config_data, rules)
+            else:
+                temp_logic.load_config_from_dict(config_data)
+            result_entry["config_hash"] = config_hash(config_data)
+            
+            # Extract Metadata
+            result_entry["vehicle"] = temp_logic.metadata.get("vehicle", "")
+            result_entry["sw_ver"] = temp_logic.metadata.get("sw_ver", "")
+            result_entry["test_date"] = temp_logic.metadata.get("test_date", "")
+            
+            cats = temp_logic.metadata.get("categories", [])
+            if isinstance(cats, list):
+                result_entry["categories"] = " | ".join(cats)
+            else:
+                result_entry["categories"] = str(cats)
+                
+            result_entry["tc_number"] = temp_logic.metadata.get("tc_number", "")
+            result_entry["note"] = temp_logic.metadata.get("note", "")
+            
+            problem = _preflight_rules(file_path, temp_logic.rules) if use_preflight else None
+            if problem is not None:
+                result_entry["status"], result_entry["details"] = problem
+                result_entry["duration"] = time.perf_counter() - file_start
+                return result_entry
+            
+            # Load Data
+            if load_recording is not None:
+                loader = load_recording(file_path)
+            else:
+                loader = ExcelLoader()
+                loader.load_file(file_path)
+            
+            # Check Rules (verdicts only, failing frames are computed on Inspect)
+            check_results = temp_logic.check_rules(loader, verdict_only=not collect_intervals, fail_fast=fail_fast,
+                                                   plan=plan)
+            
+            for r in check_results:
+                intervals = [[s * loader.time_step, e * loader.time_step]
+                             for s, e in fail_intervals(r.get('fail_frames', []))]
+                result_entry["rule_results"].append({
+                    "rule_index": r['rule_index'],
+                    "rule": temp_logic.rules[r['rule_index']].describe(),
+                    "rule_hash": config_hash(temp_logic.rules[r['rule_index']].to_dict()),
+                    "status": r['status'],
+                    "intervals": intervals
+                })
+            
+            fail_count = sum(1 for r in check_results if r['status'] == 'FAIL')
+            
+            result_entry["fail_count"] = fail_count
+            
+            if fail_count == 0:
+                result_entry["status"] = "PASS"
+                result_entry["details"] = "All rules passed."
+            else:
+                result_entry["status"] = "FAIL"
+                # Summarize failures
+                failed_rules = [r['rule_desc'] for r in check_results if r['status'] == 'FAIL']
+                result_entry["failed_rules"] = failed_rules
+                result_entry["details"] = f"{fail_count} failures: " + ", ".join(failed_rules[:3])
+                if len(failed_rules) > 3:
+                    result_entry["details"] += "..."
+                    
+        except Exception as e:
+            result_entry["status"] = "ERROR"
+            result_entry["details"] = str(e)
+    
+    result_entry["duration"] = time.perf_counter() - file_start
+    return result_entry
+
+
+def config_hash(config_data):
+    """Stable short hash of a config dict (key order and whitespace independent)."""
+    canonical = json.dumps(config_data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
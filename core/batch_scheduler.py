@@ -0,0 +1,130 @@
+"""
+Ordering of batch work.
+
+  ORDER_WALK      folder (os.walk) order, as before
+  ORDER_COST      most expensive files first. With a pool of workers this keeps
+                  one big workbook from starting last and stretching the end of
+                  the run (longest-processing-time-first scheduling).
+  ORDER_FEEDBACK  files that failed (or errored) last time first, then files
+                  changed since they were last checked, then new files, then
+                  the rest; cheapest first within each group, so regressions
+                  show up early.
+
+A file's cost is its last measured check duration when it has not changed
+since, otherwise an estimate from its size and rule count, with the
+seconds-per-MB rate learned from files of the same type that have a duration.
+Durations come from the results history (ResultsStore.last_file_results) and
+from files checked earlier in this process (record_duration).
+"""
+import os
+import threading
+
+ORDER_WALK = "walk"
+ORDER_COST = "cost"
+ORDER_FEEDBACK = "feedback"
+ORDERS = [ORDER_WALK, ORDER_COST, ORDER_FEEDBACK]
+
+# Seconds per MB of recording by file type, until durations have been measured
+DEFAULT_SECONDS_PER_MB = {".xlsx": 0.6, ".xls": 1.0, ".csv": 0.05}
+# Evaluation seconds per MB of recording and rule
+RULE_SECONDS_PER_MB = 0.002
+
+# abspath -> (size, mtime_ns, seconds) of checks done in this process
+_durations = {}
+_durations_lock = threading.Lock()
+
+
+def record_duration(file_path, seconds):
+    """Remembers how long checking file_path took (for later scheduling in this process)."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return
+    with _durations_lock:
+        _durations[os.path.abspath(file_path)] = (st.st_size, st.st_mtime_ns, seconds)
+
+
+def _rule_count(config_data):
+    if isinstance(config_data, dict):
+        return len(config_data.get("rules", []))
+    if isinstance(config_data, list):
+        return len(config_data)
+    return 0
+
+
+class _FileInfo:
+    __slots__ = ("path", "rel_path", "ext", "size", "mtime", "rules", "measured", "last", "cost")
+
+    def __init__(self, path, rel_path, inspector_logic, history):
+        self.path = path
+        self.rel_path = rel_path
+        self.ext = os.path.splitext(path)[1].lower()
+        try:
+            st = os.stat(path)
+            self.size, self.mtime = st.st_size, st.st_mtime
+            mtime_ns = st.st_mtime_ns
+        except OSError:
+            self.size, self.mtime, mtime_ns = 0, 0.0, None
+        stem = os.path.splitext(os.path.basename(path))[0]
+        self.rules = _rule_count(inspector_logic.get_config_for_file(stem, rel_path))
+        self.last = history.get(rel_path)
+
+        # Measured duration, if the file is unchanged since it was measured
+        self.measured = None
+        with _durations_lock:
+            cached = _durations.get(os.path.abspath(path))
+        if cached is not None and cached[:2] == (self.size, mtime_ns):
+            self.measured = cached[2]
+        elif self.last and self.last.get("duration") and not self.changed():
+            self.measured = self.last["duration"]
+        self.cost = 0.0
+
+    def changed(self):
+        """Modified after its last check in the history."""
+        return self.last is not None and self.mtime > (self.last.get("started_at") or 0)
+
+
+def estimate_costs(infos):
+    """Fills info.cost: measured duration, or size x learned rate for the file type."""
+    rates = {}
+    for info in infos:
+        if info.measured and info.size > 0:
+            mb = info.size / 1e6
+            rates.setdefault(info.ext, []).append(info.measured / mb - RULE_SECONDS_PER_MB * info.rules)
+    rates = {ext: max(sorted(r)[len(r) // 2], 0.0) for ext, r in rates.items()} # median per type
+    for info in infos:
+        if info.rules == 0:
+            info.cost = 0.0 # No config: the file is not even loaded
+        elif info.measured is not None:
+            info.cost = info.measured
+        else:
+            rate = rates.get(info.ext, DEFAULT_SECONDS_PER_MB.get(info.ext, 0.6))
+            info.cost = info.size / 1e6 * (rate + RULE_SECONDS_PER_MB * info.rules)
+
+
+def schedule(data_files, folder_path, inspector_logic, order=ORDER_WALK, history=None):
+    """
+    Returns data_files reordered for the batch.
+    history: {rel_path: {"status", "duration", "started_at"}}, e.g. ResultsStore.last_file_results(folder_path).
+    """
+    if order == ORDER_WALK or len(data_files) < 2:
+        return list(data_files)
+    if order not in ORDERS:
+        raise ValueError(f"Unknown batch order '{order}'")
+    history = history or {}
+    infos = [_FileInfo(path, os.path.relpath(path, folder_path), inspector_logic, history) for path in data_files]
+    estimate_costs(infos)
+
+    if order == ORDER_COST:
+        infos.sort(key=lambda info: -info.cost)
+    else:
+        def priority(info):
+            if info.last is not None and info.last.get("status") in ("FAIL", "ERROR", "MISSING_TOPICS"):
+                return 0
+            if info.changed():
+                return 1
+            if info.last is None:
+                return 2
+            return 3
+        infos.sort(key=lambda info: (priority(info), info.cost))
+    return [info.path for info in infos]
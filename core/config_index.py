@@ -0,0 +1,186 @@
+"""
+Pattern based config lookup for the master config.
+
+Besides exact "files" entries keyed by file stem, the master config can hold
+"patterns", so one entry serves every recording it matches:
+
+    "patterns": [
+        {"match": "test2 copy *", "use": "test2"},
+        {"match": "^HIL_(\\d+)_night$", "kind": "regex", "priority": 10, "config": {...}},
+        {"match": "highway/*", "on": "path", "config": {...}}
+    ]
+
+  match     glob (default, fnmatch syntax) or regex ("kind": "regex"); matched
+            case-sensitively against the whole stem or relative path
+  on        "stem" (default) or "path" (path relative to the batch folder, '/' separated)
+  priority  higher wins (default 0); equal priorities: earlier entry wins
+  config    the config entry ({"rules", "metadata"}), or
+  use       the stem of a "files" entry to use
+
+An exact "files" entry always wins over patterns.
+
+Lookups go through a compiled index (see _Matcher): a prefix trie walked along
+the name and a table of the literal parts of the other globs give the few
+candidate patterns to check, and patterns without any literal are joined into
+one regex whose alternatives are ordered by precedence, so its first matching
+alternative is the best one. The cost of a lookup follows the length of the
+name and the number of candidates, not the number of patterns.
+"""
+import fnmatch
+import re
+
+MATCH_ON = ("stem", "path")
+
+
+_GLOB_WILDCARD = re.compile(r"\*|\?|\[[^\]]*\]")
+_REGEX_LITERAL = re.compile(r"\^?([^.^$*+?{}\[\]\\|()]*)")
+
+
+def _glob_source(glob, rank):
+    # Older Pythons translate globs with named groups (g1, g2...); keep them unique when joined
+    return re.sub(r"\(\?P([<=])g(\d+)", lambda m: f"(?P{m.group(1)}_g{rank}_{m.group(2)}",
+                  fnmatch.translate(glob))
+
+
+def _regex_prefix(pattern):
+    """Literal text every match of the regex starts with ('' if unknown)."""
+    if "|" in pattern:
+        return ""
+    literal = _REGEX_LITERAL.match(pattern).group(1)
+    rest = pattern[len(_REGEX_LITERAL.match(pattern).group(0)):]
+    if rest[:1] in ("*", "?", "{", "+"):
+        literal = literal[:-1] # The quantifier applies to the last character
+    return literal
+
+
+class _Matcher:
+    """
+    Best pattern (lowest rank) matching a name, for the patterns of one 'on' target.
+    Patterns with a literal prefix hang in a prefix trie, globs starting with a
+    wildcard are filed under their longest literal part (looked up by the
+    substrings of the name); candidates are then checked in rank order. Patterns
+    with neither are joined into one regex.
+    """
+    def __init__(self):
+        self.trie = {} # char -> subtrie; key None -> [(rank, compiled or None for 'prefix*')]
+        self.literals = {} # literal part -> [(rank, compiled)]
+        self.literal_lengths = []
+        self.alternatives = [] # (rank, regex source) of the remaining patterns
+        self.regex = None
+        self.fallback = None # [(rank, compiled)] when the remaining regexes can't be combined
+
+    def add(self, rank, match, kind):
+        if kind == "glob":
+            source = _glob_source(match, rank)
+            parts = _GLOB_WILDCARD.split(match)
+            prefix = parts[0].split("[")[0] # A '[' left in a part may still open a class
+            if match == prefix + "*" and len(parts) == 2:
+                self._add_prefix(prefix, rank, None) # Prefix alone decides
+                return
+            literal = max(parts, key=len)
+            if "[" in literal or "]" in literal:
+                literal = ""
+        else:
+            source = f"(?:{match})\\Z"
+            prefix, literal = _regex_prefix(match), ""
+        regex = re.compile(source) # Report invalid patterns when the index is built
+        if prefix:
+            self._add_prefix(prefix, rank, regex)
+        elif len(literal) >= 2:
+            self.literals.setdefault(literal, []).append((rank, regex))
+        else:
+            self.alternatives.append((rank, source))
+
+    def _add_prefix(self, prefix, rank, regex):
+        node = self.trie
+        for c in prefix:
+            node = node.setdefault(c, {})
+        node.setdefault(None, []).append((rank, regex))
+
+    def compile(self):
+        self.literal_lengths = sorted({len(literal) for literal in self.literals})
+        self.alternatives.sort()
+        if not self.alternatives:
+            return
+        try:
+            # Joining renumbers groups, so numbered backreferences would point elsewhere
+            if any(re.search(r"\\[1-9]", source) for _, source in self.alternatives):
+                raise re.error("numbered backreference")
+            self.regex = re.compile("|".join(f"(?P<_p{i}>{source})" for i, (_, source) in enumerate(self.alternatives)))
+        except re.error:
+            # Match one by one instead
+            self.fallback = [(rank, re.compile(source)) for rank, source in self.alternatives]
+
+    def best(self, name):
+        candidates = []
+        node = self.trie
+        candidates.extend(node.get(None, ()))
+        for c in name:
+            node = node.get(c)
+            if node is None:
+                break
+            candidates.extend(node.get(None, ()))
+        for length in self.literal_lengths:
+            for k in range(len(name) - length + 1):
+                candidates.extend(self.literals.get(name[k:k + length], ()))
+
+        best = None
+        for rank, regex in sorted(candidates, key=lambda c: c[0]):
+            if regex is None or regex.match(name):
+                best = rank
+                break
+        if not self.alternatives or (best is not None and self.alternatives[0][0] > best):
+            return best
+        if self.fallback is not None:
+            for rank, regex in self.fallback:
+                if best is not None and rank > best:
+                    break
+                if regex.match(name):
+                    return rank
+        else:
+            m = self.regex.match(name)
+            if m is not None:
+                rank = self.alternatives[int(m.lastgroup[2:])][0]
+                if best is None or rank < best:
+                    best = rank
+        return best
+
+
+class ConfigIndex:
+    """Compiled "patterns" of a master config; lookup(stem, rel_path) gives the pattern config."""
+    def __init__(self, patterns, files=None):
+        self.files = files or {}
+        self.entries = []
+        self.matchers = {on: _Matcher() for on in MATCH_ON}
+        # Precedence: higher priority first, then list order
+        order = sorted(range(len(patterns)), key=lambda i: (-float(patterns[i].get("priority", 0)), i))
+        for rank, i in enumerate(order):
+            entry = patterns[i]
+            kind = entry.get("kind", "glob")
+            on = entry.get("on", "stem")
+            if kind not in ("glob", "regex") or on not in MATCH_ON or not isinstance(entry.get("match"), str):
+                raise ValueError(f"Invalid config pattern #{i}: {entry}")
+            try:
+                self.matchers[on].add(rank, entry["match"], kind)
+            except re.error as e:
+                raise ValueError(f"Invalid config pattern #{i} '{entry['match']}': {e}")
+            self.entries.append(entry)
+        for matcher in self.matchers.values():
+            matcher.compile()
+
+    def match(self, file_stem, rel_path=None):
+        """The best matching pattern entry, or None."""
+        ranks = [self.matchers["stem"].best(file_stem)]
+        if rel_path is not None:
+            ranks.append(self.matchers["path"].best(rel_path.replace("\\", "/")))
+        ranks = [r for r in ranks if r is not None]
+        return self.entries[min(ranks)] if ranks else None
+
+    def lookup(self, file_stem, rel_path=None):
+        """Config entry of the best matching pattern, or None."""
+        entry = self.match(file_stem, rel_path)
+        if entry is None:
+            return None
+        if "use" in entry:
+            return self.files.get(entry["use"])
+        return entry.get("config")
@@ -0,0 +1,150 @@
+"""
+CSV ingestion with a per-header schema cache.
+
+Recordings in one folder usually share the exact same header, so the dtypes
+pandas infers for the first file are cached under a hash of the header line and
+passed to read_csv for every later file, along with missing-value detection
+limited to the columns that had NaN (plus text columns). Hints are only kept
+where the result is verifiably what a plain pd.read_csv(file, header=0) gives:
+  - int64 columns are read as text and kept only if every value is written as
+    a plain integer (the parser picks float64 for '1.0' or '1e3')
+  - float64 columns: an unexpected text or missing value fails the parse
+  - float64 columns without NaN must not be all-integral (the parser would
+    have picked int64 had every value been written as an integer)
+  - text columns must not be all-numeric or all-boolean
+On any mismatch the file is re-read without hints and the cached schema replaced.
+
+pyarrow's multithreaded parser is used when installed, otherwise the C parser
+with a memory-mapped file.
+"""
+import hashlib
+import threading
+from core.xlsx_reader import NA_STRINGS
+
+_BOOL_STRINGS = ["True", "TRUE", "true", "False", "FALSE", "false"]
+_INT_PATTERN = r"[+-]?\d+"
+
+
+def _engine():
+    try:
+        import pyarrow  # noqa: F401
+        return "pyarrow"
+    except ImportError:
+        return "c"
+
+
+def read_header(file_path):
+    """The raw first line of a CSV file (path or binary file object, which is rewound)."""
+    if hasattr(file_path, "read"):
+        line = file_path.readline()
+        file_path.seek(0)
+        return line.rstrip(b"\r\n")
+    with open(file_path, 'rb') as f:
+        return f.readline().rstrip(b"\r\n")
+
+
+class CsvSchema:
+    def __init__(self, df):
+        self.dtypes = {col: dtype for col, dtype in df.dtypes.items()}
+        has_na = df.isna().any()
+        self.typed_columns = [c for c, d in self.dtypes.items() if d.kind != 'b']
+        self.int_columns = [c for c, d in self.dtypes.items() if d.kind in 'iu']
+        self.float_columns = [c for c, d in self.dtypes.items() if d.kind == 'f']
+        self.text_columns = [c for c, d in self.dtypes.items() if d.kind not in 'iufb']
+        # Numeric columns that had no NaN are parsed without missing-value checks
+        self.na_columns = [c for c, d in self.dtypes.items() if d.kind not in 'iuf' or has_na[c]]
+
+    def read_kwargs(self, engine="c", usecols=None, memory_map=True):
+        keep = (lambda c: True) if usecols is None else usecols
+        kwargs = {"dtype": {c: str if c in self.int_columns else self.dtypes[c]
+                            for c in self.typed_columns if keep(c)}}
+        if engine == "c":
+            # pyarrow rejects per-column NA lists and memory_map
+            kwargs["keep_default_na"] = False
+            kwargs["na_values"] = {c: sorted(NA_STRINGS) for c in self.na_columns if keep(c)}
+            kwargs["memory_map"] = memory_map
+        return kwargs
+
+    def convert_int_columns(self, df):
+        """Converts the int columns read as text; None if a value isn't a plain integer."""
+        import numpy as np
+        converted = {}
+        for col in self.int_columns:
+            if col in df.columns:
+                values = df[col]
+                if values.isna().any() or not values.str.fullmatch(_INT_PATTERN).all():
+                    return None
+                converted[col] = values.to_numpy().astype(self.dtypes[col]) # OverflowError if out of range
+        return df.assign(**converted) if converted else df
+
+    def matches(self, df):
+        """True if df has the dtypes a plain read_csv of the same file would give."""
+        import numpy as np
+        import pandas as pd
+        for col, dtype in df.dtypes.items():
+            if self.dtypes.get(col) != dtype:
+                return False
+
+        floats = [c for c in self.float_columns if c in df.columns]
+        if floats:
+            values = df[floats].to_numpy()
+            ambiguous = ~np.isnan(values).any(axis=0) & (values == np.floor(values)).all(axis=0)
+            if ambiguous.any():
+                return False
+
+        for col in self.text_columns:
+            if col in df.columns:
+                # Text columns in recordings hold few distinct values (versions, states)
+                values = pd.Series(df[col].dropna().unique(), dtype=object)
+                if not len(values):
+                    continue
+                if pd.to_numeric(values, errors='coerce').notna().all():
+                    return False
+                if values.isin(_BOOL_STRINGS).all():
+                    return False
+        return True
+
+
+_schemas = {} # sha1(header line) -> CsvSchema
+_lock = threading.Lock()
+
+
+def clear_schema_cache():
+    with _lock:
+        _schemas.clear()
+
+
+def read_csv(file_path, usecols=None):
+    """
+    Reads a recording CSV (row 1 = header) into a DataFrame, reusing the cached
+    schema of its header when available. usecols: optional callable column filter.
+    file_path may also be a binary file object (e.g. io.BytesIO).
+    """
+    import pandas as pd
+
+    key = hashlib.sha1(read_header(file_path)).hexdigest()
+    with _lock:
+        schema = _schemas.get(key)
+
+    if schema is not None:
+        engine = _engine()
+        kwargs = schema.read_kwargs(engine, usecols, memory_map=isinstance(file_path, str))
+        try:
+            df = pd.read_csv(file_path, header=0, usecols=usecols, engine=engine, **kwargs)
+            if engine == "pyarrow":
+                # pyarrow backs text columns differently; align with the C parser's dtypes
+                df = df.astype({c: schema.dtypes[c] for c in schema.text_columns if c in df.columns})
+            df = schema.convert_int_columns(df)
+            if df is not None and schema.matches(df):
+                return df
+        except Exception:
+            pass # Any parse error under the hints (bad value, overflow...): the plain read decides
+
+    # First file with this header, or it does not fit the cached schema: infer again
+    if hasattr(file_path, "seek"):
+        file_path.seek(0)
+    df = pd.read_csv(file_path, header=0, usecols=usecols)
+    if usecols is None:
+        with _lock:
+            _schemas[key] = CsvSchema(df)
+    return df
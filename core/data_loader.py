@@ -1,46 +1,244 @@
-import pandas as pd
+import os
+import io
+import csv
+import hashlib
+import threading
+import numpy as np
+from core.array_store import ArrayStore, is_array_store, store_path_for, store_is_fresh
+from core.dataset_cache import dataset_cache
+from core.xlsx_reader import read_xlsx, read_xlsx_header, XlsxUnsupported
+from core.csv_reader import read_csv, read_header
+
+# abspath -> (size, mtime_ns, probe result); see ExcelLoader.probe_file
+_probe_cache = {}
+_probe_lock = threading.Lock()
+
+
+def _count_lines(file_path):
+    lines = 0
+    last = b""
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    # A last line without a trailing newline still counts
+    return lines + (1 if last and last != b"\n" else 0)
+
+
+# Topics whose values change more often than every this many frames on average
+# are evaluated frame by frame instead of through a run-length index
+SEGMENT_MIN_RUN = 8
+
 
 class ExcelLoader:
     def __init__(self):
         self.df = None
+        self.store = None # ArrayStore when the recording was opened from a per-topic array store
         self.time_step = 0.033
         self.topics = []
+        self._time_axis = None
+        self._segments = {} # topic -> run-length index (or None), see get_segments
+        # Open an up-to-date '<file>.npstore' next to the recording instead of parsing it
+        self.use_array_store = True
+        # Share parsed recordings through the process-wide dataset cache
+        self.use_cache = True
 
-    def load_file(self, file_path):
+    def load_file(self, file_path, topics=None):
         """
-        Loads the Excel file. 
+        Loads the Excel file.
         Assumes Row 1 (header=0) contains Topic names.
+        file_path may also be an array store directory (see core.array_store).
+        Recently loaded files are served from the dataset cache (see core.dataset_cache).
+        topics: optional list of topic names; other columns are skipped while parsing.
+                Such partial loads are not put into the dataset cache.
         """
         try:
+            self.df = None
+            self.store = None
+            self._time_axis = None
+            self._segments = {}
+
+            if self.use_cache:
+                cached = dataset_cache.get(file_path)
+                if cached is not None:
+                    self._restore(cached)
+                    return True
+
+            if is_array_store(file_path):
+                self._open_store(file_path)
+            elif self.use_array_store and store_is_fresh(store_path_for(file_path), file_path):
+                self._open_store(store_path_for(file_path))
+            else:
+                self._parse_file(file_path, topics)
+
+            if self.use_cache and (topics is None or self.store is not None):
+                dataset_cache.put(file_path, self._snapshot())
+            return True
+        except Exception as e:
+            raise e
+
+    def load_bytes(self, data, file_name, topics=None):
+        """
+        Parses a recording that was already read into memory (e.g. by a batch
+        pipeline reader). file_name only selects the format by its extension.
+        Not put into the dataset cache, which is keyed by file path.
+        """
+        self.df = None
+        self.store = None
+        self._time_axis = None
+        self._segments = {}
+        self._parse_file(file_name, topics, source=io.BytesIO(data))
+        return True
+
+    def _parse_file(self, file_path, topics=None, source=None):
+        # source: file object to parse instead of opening file_path
+        if source is None:
+            source = file_path
+        # pandas (and openpyxl behind read_excel) is imported on first parse, not at startup
+        import pandas as pd
+
+        usecols = None if topics is None else set(topics).__contains__
+
+        columns = None
+        if file_path.lower().endswith('.xlsx'):
+            # Streaming reader fills typed columns directly; pandas handles what it can't
+            try:
+                columns = read_xlsx(source, columns=topics)
+            except XlsxUnsupported:
+                columns = None
+                if hasattr(source, "seek"):
+                    source.seek(0)
+
+        if columns is not None:
+            num_rows = len(next(iter(columns.values()))) if columns else 0
+            # Same values as the list comprehension below, built without a per-row loop
+            columns['_internal_time'] = np.arange(num_rows) * self.time_step
+            self.df = pd.DataFrame(columns)
+        else:
             # Load with pandas
             if file_path.lower().endswith('.csv'):
-                 self.df = pd.read_csv(file_path, header=0)
+                 # Dtypes are reused from earlier files with the same header
+                 self.df = read_csv(source, usecols=usecols)
             else:
                  # Using header=0 to treat the first row as columns (Topic names)
-                 self.df = pd.read_excel(file_path, header=0)
-            
+                 self.df = pd.read_excel(source, header=0, usecols=usecols)
+
             # Generate Time Column if not exists (assuming data is contiguous 0.033s steps)
             # Create a new index based time column for internal usage
             num_rows = len(self.df)
             self.df['_internal_time'] = [i * self.time_step for i in range(num_rows)]
-            
-            # Extract topics (columns)
-            # Exclude internal columns if any
-            self.topics = [col for col in self.df.columns if col != '_internal_time']
-            
-            return True
-        except Exception as e:
-            raise e
+
+        # Extract topics (columns)
+        # Exclude internal columns if any
+        self.topics = [col for col in self.df.columns if col != '_internal_time']
+
+    def probe_file(self, file_path):
+        """
+        Reads only the header row of a recording (xlsx, csv or array store), without loading it.
+        Returns {"topics", "n_frames", "duration", "schema_id"}: n_frames/duration are None
+        when they can't be found cheaply (xlsx without a <dimension>), schema_id is a short
+        hash of the topic list so files with identical headers can be grouped.
+        Results are cached per file by size and mtime.
+        """
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        with _probe_lock:
+            cached = _probe_cache.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return dict(cached[2])
+
+        time_step = self.time_step
+        n_frames = None
+        lower = path.lower()
+        if is_array_store(path) or (self.use_array_store and store_is_fresh(store_path_for(path), path)):
+            store = ArrayStore(path if is_array_store(path) else store_path_for(path))
+            topics, n_frames, time_step = list(store.topics), store.n_frames, store.time_step
+        elif lower.endswith('.csv'):
+            header = read_header(path).decode('utf-8-sig')
+            topics = next(csv.reader([header]), [])
+            n_frames = max(_count_lines(path) - 1, 0)
+        else:
+            try:
+                if not lower.endswith('.xlsx'):
+                    raise XlsxUnsupported("not an xlsx file")
+                topics, n_frames = read_xlsx_header(path)
+            except XlsxUnsupported:
+                import pandas as pd
+                topics = [str(c) for c in pd.read_excel(path, header=0, nrows=0).columns]
+
+        result = {
+            "topics": topics,
+            "n_frames": n_frames,
+            "duration": (n_frames - 1) * time_step if n_frames else None,
+            "schema_id": hashlib.sha1("\n".join(topics).encode('utf-8')).hexdigest()[:12]
+        }
+        with _probe_lock:
+            _probe_cache[path] = (st.st_size, st.st_mtime_ns, result)
+        return dict(result)
+
+    def _open_store(self, store_dir):
+        # Columns are memory-mapped on first access, nothing is read here
+        self.store = ArrayStore(store_dir)
+        self.time_step = self.store.time_step
+        self.topics = list(self.store.topics)
+
+    def _snapshot(self):
+        return {"df": self.df, "store": self.store, "topics": self.topics, "time_step": self.time_step,
+                "segments": self._segments}
+
+    def _restore(self, dataset):
+        self.df = dataset["df"]
+        self.store = dataset["store"]
+        self.topics = list(dataset["topics"])
+        self.time_step = dataset["time_step"]
+        # Shared with every loader of the cached dataset, so each index is built once
+        self._segments = dataset.setdefault("segments", {})
 
     def get_topics(self):
         return self.topics
 
     def get_data_for_topic(self, topic):
+        if self.store is not None:
+            if topic in self.store:
+                return self.store.get(topic)
+            return []
         if self.df is not None and topic in self.df.columns:
             return self.df[topic].values
         return []
-    
+
+    def get_segments(self, topic):
+        """
+        Run-length index of a topic: (starts, lengths, values) arrays with one entry
+        per run of identical consecutive values. Built on first use and cached.
+        Returns None for unknown topics and for topics that change too often
+        (average run shorter than SEGMENT_MIN_RUN frames) to be worth indexing.
+        """
+        if topic in self._segments:
+            return self._segments[topic]
+        data = np.asarray(self.get_data_for_topic(topic))
+        segments = None
+        if len(data) > 0:
+            changed = data[1:] != data[:-1]
+            if not isinstance(changed, np.ndarray):
+                changed = np.array([a != b for a, b in zip(data[1:], data[:-1])], dtype=bool)
+            if data.dtype.kind == 'f':
+                # NaN != NaN, but a run of missing values is still one segment
+                changed &= ~(np.isnan(data[1:]) & np.isnan(data[:-1]))
+            starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+            if len(starts) * SEGMENT_MIN_RUN <= len(data):
+                lengths = np.diff(np.append(starts, len(data)))
+                segments = (starts, lengths, data[starts])
+        self._segments[topic] = segments
+        return segments
+
     def get_time_axis(self):
+        if self.store is not None:
+            if self._time_axis is None:
+                self._time_axis = np.arange(self.store.n_frames) * self.time_step
+            return self._time_axis
         if self.df is not None:
             return self.df['_internal_time'].values
         return []
@@ -49,6 +247,10 @@ class ExcelLoader:
         """
         Returns the value of a topic at a specific integer index (frame).
         """
+        if self.store is not None:
+            if topic in self.store and 0 <= index < self.store.n_frames:
+                return self.store.get(topic)[index]
+            return None
         if self.df is not None and topic in self.df.columns:
             if 0 <= index < len(self.df):
                 return self.df.iloc[index][topic]
@@ -0,0 +1,118 @@
+"""
+Process-wide LRU cache of loaded recordings.
+
+ExcelLoader puts every dataset it parses here, keyed by absolute path plus the
+file's size and mtime, so a file the batch just checked (or that was open a
+moment ago) is not parsed again on Inspect or when switching files. The cache is
+bounded by the estimated memory of the cached datasets, not by entry count.
+Datasets are shared between loaders and must be treated as read-only.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_MB = 1024
+
+# Memory-mapped array stores cost almost nothing to keep open
+_STORE_ENTRY_BYTES = 64 * 1024
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def estimate_bytes(dataset):
+    """Approximate memory held by a cached dataset dict (see ExcelLoader)."""
+    df = dataset.get("df")
+    if df is None:
+        return _STORE_ENTRY_BYTES
+    total = 0
+    for col in df.columns:
+        values = df[col].values
+        total += values.nbytes
+        if values.dtype.kind == 'O' and len(values):
+            # Deep-sizing every Python object is too slow for wide recordings; sample instead
+            sample = values[::max(1, len(values) // 32)][:32]
+            total += int(sum(sys.getsizeof(v) for v in sample) / len(sample) * len(values))
+    return total
+
+
+class DatasetCache:
+    def __init__(self, max_mb=DEFAULT_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict() # key -> (dataset, nbytes)
+        self._paths = {} # abspath -> key currently cached for that path
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def set_max_mb(self, max_mb):
+        with self._lock:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            self._evict()
+
+    def get(self, path):
+        """Cached dataset for the current version of 'path', or None."""
+        try:
+            key = _file_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, path, dataset):
+        try:
+            key = _file_key(path)
+        except OSError:
+            return
+        nbytes = estimate_bytes(dataset)
+        with self._lock:
+            # A new version of the file replaces the old one
+            old_key = self._paths.get(key[0])
+            if old_key is not None:
+                self._remove(old_key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (dataset, nbytes)
+            self._paths[key[0]] = key
+            self.total_bytes += nbytes
+            self._evict()
+
+    def discard(self, path):
+        with self._lock:
+            key = self._paths.get(os.path.abspath(path))
+            if key is not None:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "mb": self.total_bytes / (1024 * 1024),
+                    "max_mb": self.max_bytes / (1024 * 1024), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        del self._paths[key[0]]
+        self.total_bytes -= nbytes
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+
+# Shared by every ExcelLoader in the process (main window, batch worker thread, compare)
+dataset_cache = DatasetCache()
@@ -0,0 +1,307 @@
+"""
+Small condition language for "Expr" rules.
+
+Examples:
+    stVehicle.u16Speed > 30
+    stDmsResult.u8ICC_AoIStat in {2, 3, 4}
+    20 <= stVehicle.u16Speed < 40 & stDmsResult.u8ICC_AoIStat != 7
+    stVehicle.u16Speed in 20..40              (inclusive range)
+    abs(stA.s16Angle - stB.s16Angle) <= 5
+    bit(stOmsResult.u8Flags, 3) | !bit(stOmsResult.u8Flags, 0)
+
+Topics are dotted names (or `back-quoted` for anything else). Operators, lowest
+binding first: | (or), & (and), ! (not), comparisons / in / not in, + -, * /.
+An expression is parsed once and compiled into a tree of closures that work on
+whole NumPy arrays, so evaluation never loops over frames in Python.
+"""
+import re
+import functools
+import numpy as np
+
+COMPILED_CACHE_SIZE = 256
+
+class ExpressionError(ValueError):
+    pass
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>0[xX][0-9a-fA-F]+|\d+\.\d+|\d+)
+      | (?P<str>'[^']*'|"[^"]*")
+      | (?P<quoted>`[^`]+`)
+      | (?P<name>[A-Za-z_]\w*(?:\.\w+)*)
+      | (?P<op>\.\.|==|!=|<=|>=|[<>(){},&|!+\-*/])
+    )""", re.VERBOSE)
+
+_KEYWORD_OPS = {"and": "&", "or": "|", "not": "!", "in": "in"}
+
+_CMP = {
+    "==": np.equal, "!=": np.not_equal,
+    "<": np.less, "<=": np.less_equal,
+    ">": np.greater, ">=": np.greater_equal,
+}
+
+_ARITH = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise ExpressionError(f"Unexpected character at {pos}: '{text[pos:pos + 10]}'")
+        pos = m.end()
+        kind = m.lastgroup
+        val = m.group(kind)
+        if kind == "num":
+            val = int(val, 16) if val.lower().startswith("0x") else (float(val) if "." in val else int(val))
+        elif kind == "str":
+            val = val[1:-1]
+        elif kind == "quoted":
+            kind, val = "name", val[1:-1]
+        elif kind == "name" and val.lower() in _KEYWORD_OPS:
+            kind, val = "op", _KEYWORD_OPS[val.lower()]
+        tokens.append((kind, val))
+    tokens.append(("end", None))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser. Every parse_* method returns a closure fn(get) -> array/scalar."""
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.topics = []
+
+    def peek(self, value=None):
+        kind, val = self.tokens[self.pos]
+        if value is None:
+            return kind, val
+        return kind == "op" and val == value
+
+    def take(self, value=None):
+        kind, val = self.tokens[self.pos]
+        if value is not None and not (kind == "op" and val == value):
+            raise ExpressionError(f"Expected '{value}' but found '{val if val is not None else 'end'}'")
+        self.pos += 1
+        return kind, val
+
+    def parse(self):
+        fn = self.parse_or()
+        if self.peek()[0] != "end":
+            raise ExpressionError(f"Unexpected '{self.peek()[1]}'")
+        return fn
+
+    def parse_or(self):
+        left = self.parse_and()
+        while self.peek("|"):
+            self.take()
+            left = _logical(np.logical_or, "|", left, self.parse_and())
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.peek("&"):
+            self.take()
+            left = _logical(np.logical_and, "&", left, self.parse_not())
+        return left
+
+    def parse_not(self):
+        if self.peek("!"):
+            self.take()
+            operand = self.parse_not()
+            return lambda get: np.logical_not(_as_condition(operand(get)))
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_additive()
+
+        if self.peek("in") or (self.peek("!") and self.tokens[self.pos + 1] == ("op", "in")):
+            negate = self.peek("!")
+            if negate:
+                self.take()
+            self.take("in")
+            test = self.parse_membership(left)
+            if negate:
+                return lambda get: np.logical_not(test(get))
+            return test
+
+        # Chained comparisons: a < b <= c  ->  (a < b) & (b <= c)
+        result = None
+        while self.peek()[0] == "op" and self.peek()[1] in _CMP:
+            op = self.take()[1]
+            right = self.parse_additive()
+            cmp = _comparison(_CMP[op], left, right)
+            result = cmp if result is None else _logical(np.logical_and, "&", result, cmp)
+            left = right
+        return left if result is None else result
+
+    def parse_membership(self, operand):
+        if self.peek("{"):
+            self.take()
+            values = [self.parse_literal()]
+            while self.peek(","):
+                self.take()
+                values.append(self.parse_literal())
+            self.take("}")
+            return lambda get: np.isin(operand(get), values)
+
+        low = self.parse_literal()
+        self.take("..")
+        high = self.parse_literal()
+        if low > high:
+            raise ExpressionError(f"Empty range {low}..{high}")
+        return lambda get: _range_test(operand(get), low, high)
+
+    def parse_literal(self):
+        sign = 1
+        if self.peek("-"):
+            self.take()
+            sign = -1
+        kind, val = self.take()
+        if kind == "num":
+            return sign * val
+        if kind == "str" and sign == 1:
+            return val
+        raise ExpressionError(f"Expected a constant but found '{val}'")
+
+    def parse_additive(self):
+        left = self.parse_term()
+        while self.peek("+") or self.peek("-"):
+            op = self.take()[1]
+            left = _arithmetic(_ARITH[op], left, self.parse_term())
+        return left
+
+    def parse_term(self):
+        left = self.parse_unary()
+        while self.peek("*") or self.peek("/"):
+            op = self.take()[1]
+            left = _arithmetic(_ARITH[op], left, self.parse_unary())
+        return left
+
+    def parse_unary(self):
+        if self.peek("-"):
+            self.take()
+            operand = self.parse_unary()
+            return lambda get: np.negative(operand(get))
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, val = self.take()
+        if kind in ("num", "str"):
+            return lambda get: val
+        if kind == "op" and val == "(":
+            inner = self.parse_or()
+            self.take(")")
+            return inner
+        if kind == "name":
+            if self.peek("("):
+                return self.parse_call(val)
+            if val not in self.topics:
+                self.topics.append(val)
+            return lambda get: get(val)
+        raise ExpressionError(f"Unexpected '{val if val is not None else 'end'}'")
+
+    def parse_call(self, name):
+        self.take("(")
+        args = [self.parse_or()]
+        while self.peek(","):
+            self.take()
+            args.append(self.parse_or())
+        self.take(")")
+
+        if name == "abs" and len(args) == 1:
+            arg = args[0]
+            return lambda get: np.abs(arg(get))
+        if name == "bit" and len(args) == 2:
+            value, bit = args
+            return lambda get: _bit_test(value(get), bit(get))
+        raise ExpressionError(f"Unknown function '{name}' with {len(args)} argument(s)")
+
+
+def _as_numeric(data):
+    """Object/string columns holding numbers are converted so comparisons are numeric."""
+    if data.dtype.kind in "OUT":
+        try:
+            return data.astype(np.float64)
+        except (ValueError, TypeError):
+            return data
+    return data
+
+def _as_condition(value):
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return value
+    return value != 0
+
+def _logical(ufunc, symbol, left, right):
+    def fn(get):
+        a, b = np.asarray(left(get)), np.asarray(right(get))
+        if a.dtype != bool or b.dtype != bool:
+            raise ExpressionError(f"'{symbol}' combines conditions; use bit(x, n) to test flags")
+        return ufunc(a, b)
+    return fn
+
+def _comparison(ufunc, left, right):
+    def fn(get):
+        return ufunc(left(get), right(get))
+    return fn
+
+def _arithmetic(ufunc, left, right):
+    def fn(get):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ufunc(left(get), right(get))
+    return fn
+
+def _range_test(values, low, high):
+    return np.logical_and(values >= low, values <= high)
+
+def _bit_test(values, bit):
+    values = np.asarray(values)
+    if values.dtype.kind == "f" and not np.isfinite(values).all():
+        raise ExpressionError("bit() needs integer values, the topic has missing or infinite values")
+    if values.dtype.kind not in "iu":
+        values = values.astype(np.int64)
+    return (np.right_shift(values, int(bit)) & 1).astype(bool)
+
+
+class CompiledExpression:
+    def __init__(self, text):
+        self.text = text
+        parser = _Parser(text)
+        self._fn = parser.parse()
+        self.topics = parser.topics
+        if not self.topics:
+            raise ExpressionError("Expression does not reference any topic")
+
+    def evaluate(self, data_loader, lo, hi):
+        """Returns a bool array telling whether the expression holds on frames [lo, hi)."""
+        columns = {}
+
+        def get(topic):
+            if topic not in columns:
+                data = data_loader.get_data_for_topic(topic)
+                if len(data) == 0:
+                    raise ExpressionError(f"Topic '{topic}' not found")
+                columns[topic] = _as_numeric(np.asarray(data[lo:hi]))
+            return columns[topic]
+
+        try:
+            result = _as_condition(self._fn(get))
+        except ExpressionError:
+            raise
+        except (TypeError, ValueError) as e:
+            # e.g. text compared with a number: report it on the rule instead of failing the check
+            raise ExpressionError(f"Type mismatch in '{self.text}': {e}")
+        return np.broadcast_to(result, (max(hi - lo, 0),))
+
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_expression(text):
+    """
+    Parses and compiles an expression. The most recently used COMPILED_CACHE_SIZE
+    texts stay compiled, so long-running processes don't keep every expression.
+    """
+    return CompiledExpression(text)
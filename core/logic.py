@@ -1,9 +1,147 @@
+import fnmatch
+import numpy as np
+from core.expression import compile_expression, ExpressionError
+
+# Frames compared per step in verdict-only mode, so a rule can stop at its
+# first failure without comparing the rest of its window.
+VERDICT_CHUNK = 4096
+
+def _values_equal(data, target):
+    """Element-wise (data == target) as a bool array."""
+    data = np.asarray(data)
+    result = data == target
+    if not isinstance(result, np.ndarray):
+        # Comparison was not broadcast (e.g. mixed types), compare per value
+        result = np.array([val == target for val in data], dtype=bool)
+    return result.astype(bool, copy=False)
+
+def _find_frames(mask_fn, length, verdict_only):
+    """
+    Returns offsets in [0, length) where mask_fn(lo, hi) is True.
+    In verdict-only mode the window is scanned in chunks and only the first hit is returned.
+    """
+    if not verdict_only:
+        return np.flatnonzero(mask_fn(0, length))
+    for lo in range(0, length, VERDICT_CHUNK):
+        hi = min(lo + VERDICT_CHUNK, length)
+        hits = np.flatnonzero(mask_fn(lo, hi))
+        if len(hits) > 0:
+            return hits[:1]
+    return np.array([], dtype=np.int64)
+
+def _true_runs(mask):
+    """Returns (starts, lengths) of the consecutive True runs in a bool array."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts = edges[0::2]
+    return starts, edges[1::2] - starts
+
+def _find_long_runs(mask_fn, length, time_step, limit, verdict_only):
+    """
+    Returns offsets covered by True runs of mask_fn(lo, hi) lasting longer than 'limit' seconds.
+    In verdict-only mode the scan is chunked and stops at the first such run (its start is returned).
+    """
+    if not verdict_only:
+        starts, lengths = _true_runs(mask_fn(0, length))
+        too_long = lengths * time_step > limit
+        if not too_long.any():
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(s, s + n) for s, n in zip(starts[too_long], lengths[too_long])])
+
+    carry = 0 # Length of the run still open at the end of the previous chunk
+    for lo in range(0, length, VERDICT_CHUNK):
+        mask = mask_fn(lo, min(lo + VERDICT_CHUNK, length))
+        starts, lengths = _true_runs(mask)
+        if len(starts) == 0:
+            carry = 0
+            continue
+        if starts[0] == 0:
+            lengths[0] += carry
+        too_long = np.flatnonzero(lengths * time_step > limit)
+        if len(too_long) > 0:
+            run_start = lo + starts[too_long[0]] - (carry if (too_long[0] == 0 and starts[0] == 0) else 0)
+            return np.array([run_start])
+        carry = lengths[-1] if mask[-1] else 0
+    return np.array([], dtype=np.int64)
+
+def _window_segments(segments, start_idx, end_idx):
+    """
+    Clips a run-length index (starts, lengths, values) to frames [start_idx, end_idx].
+    Returns (starts, lengths, values) with starts as offsets from start_idx.
+    """
+    starts, lengths, values = segments
+    first = np.searchsorted(starts, start_idx, side='right') - 1
+    last = np.searchsorted(starts, end_idx, side='right')
+    seg_starts = np.maximum(starts[first:last], start_idx)
+    seg_ends = np.minimum(starts[first:last] + lengths[first:last], end_idx + 1)
+    return seg_starts - start_idx, seg_ends - seg_starts, values[first:last]
+
+def _segment_frames(starts, lengths):
+    """Expands segments into the frame offsets they cover."""
+    if len(starts) == 0:
+        return np.array([], dtype=np.int64)
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+def _find_segments(starts, lengths, bad, verdict_only):
+    """Segment counterpart of _find_frames: offsets covered by the 'bad' segments."""
+    if verdict_only:
+        return starts[bad][:1]
+    return _segment_frames(starts[bad], lengths[bad])
+
+def _find_long_segment_runs(starts, lengths, bad, time_step, limit, verdict_only):
+    """
+    Segment counterpart of _find_long_runs: consecutive 'bad' segments form one run,
+    runs lasting longer than 'limit' seconds are returned as frame offsets.
+    """
+    run_idx, run_count = _true_runs(bad)
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    run_lengths = bounds[run_idx + run_count] - bounds[run_idx]
+    too_long = run_lengths * time_step > limit
+    if verdict_only:
+        return starts[run_idx[too_long]][:1]
+    return _segment_frames(starts[run_idx[too_long]], run_lengths[too_long])
+
+def fail_intervals(fail_frames):
+    """Merges a sorted list of failing frames into inclusive (start_frame, end_frame) runs."""
+    frames = np.asarray(fail_frames, dtype=np.int64)
+    if len(frames) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(frames) > 1)
+    starts = np.concatenate(([frames[0]], frames[breaks + 1]))
+    ends = np.concatenate((frames[breaks], [frames[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _coerce_target(data, value):
+    """Numeric columns compare against float(value), anything else as-is."""
+    try:
+        if data.dtype.kind in 'iuf':
+            return float(value)
+    except:
+        pass
+    return value
+
+def _is_pattern(topic):
+    return isinstance(topic, str) and any(c in topic for c in "*?[")
+
+def _rising_edges(active):
+    """Frames where a bool signal becomes True (frame 0 counts if already True)."""
+    return np.flatnonzero(active & ~np.concatenate(([False], active[:-1])))
+
 class RuleType:
     MUST = "Must"
     SHOULD_NOT = "ShouldNot"
     EXIST = "Exist"
     MUST_OR = "Must (OR)"
     MAYBE = "Maybe"
+    EXPR = "Expr"
+    IMPLIES = "Implies"
+
+RULE_TYPES = (RuleType.MUST, RuleType.SHOULD_NOT, RuleType.EXIST, RuleType.MUST_OR, RuleType.MAYBE,
+              RuleType.EXPR, RuleType.IMPLIES)
+
+# Rule types that only compare topic values against targets and can be
+# evaluated over run-length segments instead of frames
+SEGMENT_RULES = (RuleType.MUST, RuleType.SHOULD_NOT, RuleType.EXIST, RuleType.MUST_OR, RuleType.MAYBE)
 
 class Rule:
     def __init__(self, start_time, end_time, topic, target_value, rule_type, tolerance=0.0):
@@ -24,6 +162,41 @@ class Rule:
             "tolerance": self.tolerance
         }
 
+    def get_topics(self, available_topics=None):
+        """
+        Topic names this rule reads (for EXPR, the topics referenced by the expression).
+        If available_topics is given, glob patterns (IMPLIES responses) are expanded against it.
+        """
+        if self.rule_type == RuleType.EXPR:
+            try:
+                return list(compile_expression(self.topic).topics)
+            except ExpressionError:
+                return []
+        topics = list(self.topic) if isinstance(self.topic, list) else [self.topic]
+        if available_topics is not None:
+            expanded = []
+            for t in topics:
+                expanded.extend(fnmatch.filter(available_topics, t) if _is_pattern(t) else [t])
+            return expanded
+        return topics
+
+    def describe(self):
+        if self.rule_type == RuleType.IMPLIES:
+            trig, resp = self.topic
+            trig_val, resp_val = self.target_value
+            return (f"{self.rule_type} {trig} == {trig_val} -> {resp} == {resp_val} within {self.tolerance}s "
+                    f"({self.start_time:.1f}s-{self.end_time:.1f}s)")
+        if self.rule_type == RuleType.EXPR:
+            tol_desc = f", tol={self.tolerance}s" if self.tolerance > 0 else ""
+            return f"{self.rule_type} {self.topic} ({self.start_time:.1f}s-{self.end_time:.1f}s{tol_desc})"
+        if self.rule_type == RuleType.MUST_OR:
+            topic_desc = " | ".join(self.topic) if isinstance(self.topic, list) else str(self.topic)
+            val_desc = " | ".join(map(str, self.target_value)) if isinstance(self.target_value, list) else str(self.target_value)
+            return f"{self.rule_type} {topic_desc} == {val_desc} ({self.start_time:.1f}s-{self.end_time:.1f}s)"
+        elif self.rule_type == RuleType.MAYBE:
+            return f"{self.rule_type} {self.topic} == {self.target_value} ({self.start_time:.1f}s-{self.end_time:.1f}s, tol={self.tolerance}s)"
+        return f"{self.rule_type} {self.topic} == {self.target_value} ({self.start_time:.1f}s-{self.end_time:.1f}s)"
+
     @staticmethod
     def from_dict(data):
         return Rule(
@@ -35,6 +208,44 @@ class Rule:
             data.get("tolerance", 0.0)
         )
 
+def missing_topics(rules, available_topics):
+    """
+    Topics the rules need that are not in available_topics (e.g. a probe_file header),
+    without duplicates. These are the topics check_rules would report as not found:
+    the first topic of a rule (of a MUST_OR list, missing alternatives are skipped),
+    every topic of an EXPR, and the trigger and response (pattern) of an IMPLIES.
+    """
+    available = set(available_topics)
+    missing = []
+    for rule in rules:
+        if rule.rule_type == RuleType.EXPR:
+            needed = rule.get_topics() # An invalid expression is reported by check_rules
+        elif rule.rule_type == RuleType.IMPLIES:
+            needed = list(rule.topic)
+        else:
+            needed = rule.get_topics()[:1]
+        for t in needed:
+            found = fnmatch.filter(available, t) if _is_pattern(t) else t in available
+            if not found and t not in missing:
+                missing.append(t)
+    return missing
+
+def macro_rules(macro):
+    """Rules of a master-config macro (saved 'rules' list or a legacy single-rule macro)."""
+    rules_data = macro.get('rules', [])
+    # Support legacy single-rule macros
+    if not rules_data and 'topic' in macro:
+        rules_data = [macro]
+
+    rules = []
+    for r_data in rules_data:
+        # Unify keys (support both legacy/code-defined and saved-to-json formats)
+        start = r_data.get('start') if 'start' in r_data else r_data.get('start_time')
+        end = r_data.get('end') if 'end' in r_data else r_data.get('end_time')
+        value = r_data.get('value') if 'value' in r_data else r_data.get('target_value')
+        rules.append(Rule(start, end, r_data['topic'], value, r_data['rule_type'], r_data.get('tolerance', 0.0)))
+    return rules
+
 class InspectorLogic:
     def __init__(self):
         self.rules = []
@@ -51,6 +262,7 @@ class InspectorLogic:
         self.master_config_path = None
         self.master_config_data = {"macros": [], "files": {}}
         self.macros = []
+        self._config_index = None # (key, ConfigIndex) for master_config_data["patterns"]
 
     def get_macros(self):
         return self.macros
@@ -75,6 +287,8 @@ class InspectorLogic:
                 "macros": self.macros,
                 "files": self.master_config_data.get("files", {})
             }
+            if "patterns" in self.master_config_data:
+                full_data["patterns"] = self.master_config_data["patterns"]
             with open(self.master_config_path, 'w', encoding='utf-8') as f:
                 json.dump(full_data, f, indent=4, ensure_ascii=False)
         except Exception as e:
@@ -97,14 +311,45 @@ class InspectorLogic:
     def get_rules(self):
         return self.rules
 
-    def check_rules(self, data_loader):
+    def check_rules(self, data_loader, verdict_only=False, fail_fast=False, optimize=True, plan=None):
+        """
+        Evaluates all rules against the loaded data.
+
+        verdict_only: Only decide PASS/FAIL per rule. Rules stop scanning at their
+                      first disqualifying frame/segment, 'fail_frames' stays empty
+                      and 'rule_desc' is only formatted for failing rules.
+        fail_fast: Stop after the first failing rule (later rules are not reported).
+        optimize: Evaluate duplicate rules once and rules with overlapping windows
+                  together (see core.rule_optimizer); results are the same, per rule.
+        plan: optimize_rules(self.rules) computed beforehand, e.g. shared by the
+              recordings of a batch with the same rules (see batch_processor.PlanCache).
+        """
+        if optimize and len(self.rules) > 1:
+            if plan is None:
+                from core.rule_optimizer import optimize_rules
+                plan = optimize_rules(self.rules)
+            if not plan.is_trivial():
+                return plan.evaluate(lambda rules, v: self._evaluate_rules(rules, data_loader, v, False),
+                                     data_loader, verdict_only, fail_fast)
+        return self._evaluate_rules(self.rules, data_loader, verdict_only, fail_fast)
+
+    def _evaluate_rules(self, rules, data_loader, verdict_only, fail_fast):
         results = []
         time_axis = data_loader.get_time_axis()
+        get_segments = getattr(data_loader, "get_segments", None)
         
-        for i, rule in enumerate(self.rules):
+        for i, rule in enumerate(rules):
             # Determine a reference topic to gauge data length and indices
-            # For MUST_OR, rule.topic is a list
-            ref_topic = rule.topic[0] if isinstance(rule.topic, list) else rule.topic
+            # For MUST_OR, rule.topic is a list; for EXPR it is the expression text
+            if rule.rule_type == RuleType.EXPR:
+                try:
+                    expression = compile_expression(rule.topic)
+                except ExpressionError as e:
+                    results.append({"rule_index": i, "status": "ERROR", "msg": f"Invalid expression: {e}"})
+                    continue
+                ref_topic = expression.topics[0]
+            else:
+                ref_topic = rule.topic[0] if isinstance(rule.topic, list) else rule.topic
             topic_data = data_loader.get_data_for_topic(ref_topic)
             
             if len(topic_data) == 0:
@@ -120,7 +365,7 @@ class InspectorLogic:
             
             # If start > end after clamping, might be empty range
             if start_idx > end_idx:
-                 slice_data = [] # empty
+                 slice_data = topic_data[0:0] # empty
             else:
                  slice_data = topic_data[start_idx : end_idx+1]
             
@@ -134,30 +379,50 @@ class InspectorLogic:
             except:
                 pass
 
-            if rule.rule_type == RuleType.MUST:
-                mismatch_indices = [idx + start_idx for idx, val in enumerate(slice_data) if val != target]
-                if mismatch_indices:
+            # Slow-changing topics are evaluated per run of identical values (see ExcelLoader.get_segments)
+            segments = None
+            if get_segments is not None and len(slice_data) > 0 and rule.rule_type in SEGMENT_RULES:
+                segments = get_segments(ref_topic)
+
+            if segments is not None and rule.rule_type != RuleType.MUST_OR:
+                seg_starts, seg_lengths, seg_values = _window_segments(segments, start_idx, end_idx)
+                equal = _values_equal(seg_values, target)
+                if rule.rule_type == RuleType.MUST:
+                    mismatch = _find_segments(seg_starts, seg_lengths, ~equal, verdict_only)
+                elif rule.rule_type == RuleType.SHOULD_NOT:
+                    mismatch = _find_segments(seg_starts, seg_lengths, equal, verdict_only)
+                elif rule.rule_type == RuleType.EXIST:
+                    mismatch = [] if equal.any() else [0]
+                elif rule.rule_type == RuleType.MAYBE:
+                    mismatch = _find_long_segment_runs(seg_starts, seg_lengths, ~equal, data_loader.time_step,
+                                                        rule.tolerance + 1e-6, verdict_only)
+                if len(mismatch) > 0:
                     status = "FAIL"
-                    fail_frames = mismatch_indices
+                    fail_frames = mismatch
+
+            elif rule.rule_type == RuleType.MUST:
+                mismatch = _find_frames(lambda lo, hi: ~_values_equal(slice_data[lo:hi], target),
+                                        len(slice_data), verdict_only)
+                if len(mismatch) > 0:
+                    status = "FAIL"
+                    fail_frames = mismatch
                     
             elif rule.rule_type == RuleType.SHOULD_NOT:
-                match_indices = [idx + start_idx for idx, val in enumerate(slice_data) if val == target]
-                if match_indices:
+                match = _find_frames(lambda lo, hi: _values_equal(slice_data[lo:hi], target),
+                                     len(slice_data), verdict_only)
+                if len(match) > 0:
                     status = "FAIL"
-                    fail_frames = match_indices
+                    fail_frames = match
 
             elif rule.rule_type == RuleType.EXIST:
-                # EXIST: At least one value must match target
-                found = False
-                for val in slice_data:
-                    if val == target:
-                        found = True
-                        break
+                # EXIST: At least one value must match target (first match is enough)
+                found = _find_frames(lambda lo, hi: _values_equal(slice_data[lo:hi], target),
+                                     len(slice_data), True)
                 
-                if not found:
+                if len(found) == 0:
                     status = "FAIL"
                     # For exist, the whole range is a failure really, but we need to return something
-                    fail_frames = [start_idx] # Just marking start as fail point
+                    fail_frames = [0] # Just marking start as fail point
             
             elif rule.rule_type == RuleType.MUST_OR:
                 # topic and target_value are expected to be lists of equal length
@@ -172,7 +437,6 @@ class InspectorLogic:
                     
                     t_data = data_loader.get_data_for_topic(t_name)
                     if len(t_data) == 0:
-                        topic_eval_params.append(None)
                         continue
                         
                     processed_t_val = t_val
@@ -182,73 +446,121 @@ class InspectorLogic:
                     except: pass
                     
                     topic_eval_params.append({
+                        "topic": t_name,
                         "data": t_data,
                         "target": processed_t_val
                     })
-                
-                mismatch_indices = []
-                for frame_offset in range(len(slice_data)):
+
+                or_segments = None
+                if segments is not None:
+                    or_segments = [get_segments(p["topic"]) for p in topic_eval_params]
+                    if any(seg is None for seg in or_segments) or \
+                            any(len(p["data"]) != len(topic_data) for p in topic_eval_params):
+                        or_segments = None
+
+                if or_segments is not None:
+                    # Merge the segment boundaries of all topics inside the window
+                    window_starts = [_window_segments(seg, start_idx, end_idx)[0] for seg in or_segments]
+                    seg_starts = np.unique(np.concatenate([[0]] + window_starts)).astype(np.int64)
+                    seg_lengths = np.diff(np.append(seg_starts, len(slice_data)))
+                    frame_match = np.zeros(len(seg_starts), dtype=bool)
+                    for seg, params in zip(or_segments, topic_eval_params):
+                        idx = np.searchsorted(seg[0], seg_starts + start_idx, side='right') - 1
+                        frame_match |= _values_equal(seg[2], params["target"])[idx]
+                    mismatch = _find_segments(seg_starts, seg_lengths, ~frame_match, verdict_only)
+                    if len(mismatch) > 0:
+                        status = "FAIL"
+                        fail_frames = mismatch
+
+                def or_mismatch(lo, hi):
                     # At each frame, check if ANY (topic[i] == target[i])
-                    frame_match = False
-                    global_idx = frame_offset + start_idx
-                    
+                    frame_match = np.zeros(hi - lo, dtype=bool)
                     for params in topic_eval_params:
-                        if params:
-                            t_data = params["data"]
-                            if global_idx < len(t_data) and t_data[global_idx] == params["target"]:
-                                frame_match = True
-                                break
-                    
-                    if not frame_match:
-                        mismatch_indices.append(global_idx)
+                        t_slice = params["data"][start_idx + lo : start_idx + hi]
+                        frame_match[:len(t_slice)] |= _values_equal(t_slice, params["target"])
+                    return ~frame_match
                 
-                if mismatch_indices:
-                    status = "FAIL"
-                    fail_frames = mismatch_indices
+                if or_segments is None:
+                    mismatch = _find_frames(or_mismatch, len(slice_data), verdict_only)
+                    if len(mismatch) > 0:
+                        status = "FAIL"
+                        fail_frames = mismatch
 
             elif rule.rule_type == RuleType.MAYBE:
                 # Same as MUST but allows deviations up to duration 'tolerance'
-                # Find segments where val != target
-                mismatch_indices = []
-                
-                # Identify continuous mismatch segments
-                current_segment = []
-                for idx, val in enumerate(slice_data):
-                    if val != target:
-                        current_segment.append(idx + start_idx)
+                # Mismatch segments longer than 'tolerance' seconds fail the rule
+                mismatch = _find_long_runs(lambda lo, hi: ~_values_equal(slice_data[lo:hi], target),
+                                           len(slice_data), data_loader.time_step,
+                                           rule.tolerance + 1e-6, verdict_only) # Add small epsilon
+                if len(mismatch) > 0:
+                    status = "FAIL"
+                    fail_frames = mismatch
+
+            elif rule.rule_type == RuleType.EXPR:
+                # Expression must hold on every frame; violations up to 'tolerance' seconds are allowed
+                violated = lambda lo, hi: ~expression.evaluate(data_loader, start_idx + lo, start_idx + hi)
+                try:
+                    if rule.tolerance > 0:
+                        mismatch = _find_long_runs(violated, len(slice_data), data_loader.time_step,
+                                                   rule.tolerance + 1e-6, verdict_only)
                     else:
-                        if current_segment:
-                            # Check duration of this mismatch segment
-                            duration = len(current_segment) * data_loader.time_step
-                            if duration > rule.tolerance + 1e-6: # Add small epsilon
-                                mismatch_indices.extend(current_segment)
-                            current_segment = []
-                
-                # Check the last segment
-                if current_segment:
-                    duration = len(current_segment) * data_loader.time_step
-                    if duration > rule.tolerance + 1e-6:
-                        mismatch_indices.extend(current_segment)
-                
-                if mismatch_indices:
+                        mismatch = _find_frames(violated, len(slice_data), verdict_only)
+                except ExpressionError as e:
+                    results.append({"rule_index": i, "status": "ERROR", "msg": str(e)})
+                    continue
+                if len(mismatch) > 0:
                     status = "FAIL"
-                    fail_frames = mismatch_indices
+                    fail_frames = mismatch
 
-            if rule.rule_type == RuleType.MUST_OR:
-                topic_desc = " | ".join(rule.topic) if isinstance(rule.topic, list) else str(rule.topic)
-                val_desc = " | ".join(map(str, rule.target_value)) if isinstance(rule.target_value, list) else str(rule.target_value)
-                rule_desc = f"{rule.rule_type} {topic_desc} == {val_desc} ({rule.start_time:.1f}s-{rule.end_time:.1f}s)"
-            elif rule.rule_type == RuleType.MAYBE:
-                rule_desc = f"{rule.rule_type} {rule.topic} == {rule.target_value} ({rule.start_time:.1f}s-{rule.end_time:.1f}s, tol={rule.tolerance}s)"
-            else:
-                rule_desc = f"{rule.rule_type} {rule.topic} == {rule.target_value} ({rule.start_time:.1f}s-{rule.end_time:.1f}s)"
+            elif rule.rule_type == RuleType.IMPLIES:
+                # Each time the trigger becomes its value inside the window, the response
+                # must already hold or become its value within 'tolerance' seconds.
+                trig_topic, resp_pattern = rule.topic
+                trig_val, resp_val = rule.target_value
+                resp_topics = fnmatch.filter(data_loader.get_topics(), resp_pattern) if _is_pattern(resp_pattern) else [resp_pattern]
+                resp_data = [data_loader.get_data_for_topic(t) for t in resp_topics]
+                if not resp_topics or any(len(d) == 0 for d in resp_data):
+                    results.append({"rule_index": i, "status": "ERROR", "msg": f"Topic '{resp_pattern}' not found"})
+                    continue
+
+                triggers = _rising_edges(_values_equal(topic_data, _coerce_target(topic_data, trig_val)))
+                triggers = triggers[(triggers >= start_idx) & (triggers <= end_idx)]
+
+                # Response events: rising edges of any matching topic, merged and sorted
+                resp_active = [_values_equal(d, _coerce_target(d, resp_val)) for d in resp_data]
+                responses = np.unique(np.concatenate([_rising_edges(a) for a in resp_active]))
+                already = np.zeros(len(triggers), dtype=bool)
+                for a in resp_active:
+                    already |= a[triggers]
+
+                # Binary search: first response event at or after each trigger
+                window = int(round(rule.tolerance / fs))
+                pos = np.searchsorted(responses, triggers, side='left')
+                found = pos < len(responses)
+                in_time = np.zeros(len(triggers), dtype=bool)
+                in_time[found] = responses[pos[found]] <= triggers[found] + window
+
+                missed = triggers[~(already | in_time)]
+                if len(missed) > 0:
+                    status = "FAIL"
+                    fail_frames = missed - start_idx
 
-            results.append({
+            if len(fail_frames) > 0:
+                fail_frames = (np.asarray(fail_frames) + start_idx).tolist()
+
+            entry = {
                 "rule_index": i, 
                 "status": status, 
-                "fail_frames": fail_frames,
-                "rule_desc": rule_desc
-            })
+                "fail_frames": [] if verdict_only else fail_frames,
+                "rule_desc": rule.describe() if (status == "FAIL" or not verdict_only) else ""
+            }
+            if rule.rule_type == RuleType.IMPLIES and not verdict_only:
+                # Reactions are reviewed by trigger time rather than frame number
+                entry["fail_times"] = [float(time_axis[f]) for f in fail_frames]
+            results.append(entry)
+
+            if fail_fast and status == "FAIL":
+                break
             
         return results
 
@@ -256,6 +568,7 @@ class InspectorLogic:
         """Loads the master JSON file containing all configurations."""
         import os
         import json
+        self._config_index = None
         if not os.path.exists(path):
             self.master_config_data = {"macros": [], "files": {}}
             self.macros = []
@@ -279,10 +592,38 @@ class InspectorLogic:
         except Exception as e:
             raise Exception(f"Failed to load master config: {e}")
 
-    def get_config_for_file(self, file_stem):
-        """Retrieves config dict for a specific file stem from master data."""
+    def get_config_for_file(self, file_stem, rel_path=None):
+        """
+        Retrieves config dict for a specific file stem from master data: its "files"
+        entry, else the best matching "patterns" entry (see core.config_index; path
+        patterns need rel_path, the path relative to the batch folder or the folder
+        opened in the GUI).
+        """
         files_data = self.master_config_data.get("files", {})
-        return files_data.get(file_stem, None)
+        config = files_data.get(file_stem, None)
+        if config is not None:
+            return config
+        index = self.config_index()
+        return index.lookup(file_stem, rel_path) if index is not None else None
+
+    def config_index(self):
+        """
+        Compiled index of master_config_data["patterns"] (None without patterns).
+        Rebuilt when the patterns list is replaced or changes length; call
+        refresh_config_index() after editing an entry in place.
+        """
+        patterns = self.master_config_data.get("patterns")
+        if not patterns:
+            return None
+        files_data = self.master_config_data.get("files", {})
+        key = (id(patterns), len(patterns), id(files_data))
+        if self._config_index is None or self._config_index[0] != key:
+            from core.config_index import ConfigIndex
+            self._config_index = (key, ConfigIndex(patterns, files_data))
+        return self._config_index[1]
+
+    def refresh_config_index(self):
+        self._config_index = None
 
     def update_master_config(self, file_stem):
         """Updates the master data with current rules/metadata for file_stem and saves to disk."""
@@ -311,14 +652,17 @@ class InspectorLogic:
         except Exception as e:
             raise Exception(f"Failed to save master config: {e}")
 
-    def load_config_from_dict(self, data):
-        """Loads rules and metadata from a dictionary entry."""
+    def load_config_from_dict(self, data, rules=None):
+        """
+        Loads rules and metadata from a dictionary entry.
+        rules: the entry's rules already parsed (e.g. shared through a PlanCache); used as is.
+        """
         if not data:
             return
 
         if isinstance(data, list):
             # Old Format Support (Just list of rules)
-            self.rules = [Rule.from_dict(item) for item in data]
+            self.rules = rules if rules is not None else [Rule.from_dict(item) for item in data]
             # Reset metadata to defaults
             self.metadata = {
                 "vehicle": "", "sw_ver": "", "test_date": "",
@@ -337,7 +681,7 @@ class InspectorLogic:
                     self.metadata[k] = v
                     
             rules_data = data.get("rules", [])
-            self.rules = [Rule.from_dict(item) for item in rules_data]
+            self.rules = rules if rules is not None else [Rule.from_dict(item) for item in rules_data]
 
     def load_rules_from_json(self, file_path):
         """Legacy: Load from single JSON file."""
@@ -0,0 +1,107 @@
+import os
+import csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core.data_loader import ExcelLoader
+from core.logic import InspectorLogic, macro_rules
+
+
+def _macro_status(statuses):
+    if "ERROR" in statuses:
+        return "ERROR"
+    if "FAIL" in statuses:
+        return "FAIL"
+    return "PASS"
+
+
+def sweep_file(file_path, macros):
+    """
+    Loads one recording and evaluates the rules of every macro against it in a
+    single check_rules pass. Returns (statuses, details): one PASS/FAIL/ERROR per
+    macro (in order) and an error message if the file could not be checked.
+    """
+    logic = InspectorLogic()
+    spans = []
+    for macro in macros:
+        try:
+            rules = macro_rules(macro)
+        except (KeyError, TypeError, ValueError):
+            spans.append(None) # Malformed macro
+            continue
+        spans.append((len(logic.rules), len(logic.rules) + len(rules)))
+        logic.rules.extend(rules)
+
+    try:
+        loader = ExcelLoader()
+        loader.load_file(file_path)
+        results = logic.check_rules(loader, verdict_only=True)
+    except Exception as e:
+        return ["ERROR"] * len(macros), str(e)
+
+    rule_status = [None] * len(logic.rules)
+    for r in results:
+        rule_status[r['rule_index']] = r['status']
+    statuses = [_macro_status(rule_status[span[0]:span[1]]) if span is not None else "ERROR"
+                for span in spans]
+    return statuses, ""
+
+
+def run_macro_sweep(folder_path, macros, progress_callback=None, max_workers=None):
+    """
+    Evaluates every macro against every recording in folder_path.
+    Each file is loaded once (in a worker process) and all macros are checked in one pass.
+
+    Returns {"macros": [names], "rows": [{"file", "statuses": [...], "details"}]},
+    rows sorted by relative file path; statuses are aligned with "macros".
+    progress_callback: function(current, total, row)
+    max_workers: process pool size (default: CPU count); 1 runs in this process.
+    """
+    data_files = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            if file.lower().endswith(('.xlsx', '.xls', '.csv')):
+                data_files.append(os.path.join(root, file))
+
+    total = len(data_files)
+    rows = []
+
+    def collect(file_path, statuses, details):
+        row = {"file": os.path.relpath(file_path, folder_path), "statuses": statuses, "details": details}
+        rows.append(row)
+        if progress_callback:
+            progress_callback(len(rows), total, row)
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or total <= 1:
+        for file_path in data_files:
+            collect(file_path, *sweep_file(file_path, macros))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, total)) as pool:
+            futures = {pool.submit(sweep_file, path, macros): path for path in data_files}
+            for future in as_completed(futures):
+                try:
+                    statuses, details = future.result()
+                except Exception as e:
+                    statuses, details = ["ERROR"] * len(macros), str(e)
+                collect(futures[future], statuses, details)
+
+    rows.sort(key=lambda r: r["file"])
+    return {"macros": [m.get("name", "") for m in macros], "rows": rows}
+
+
+def macro_pass_counts(sweep):
+    """Per macro: number of files it PASSED, FAILED and ERRORED on."""
+    counts = []
+    for j, name in enumerate(sweep["macros"]):
+        statuses = [row["statuses"][j] for row in sweep["rows"]]
+        counts.append({"macro": name, "PASS": statuses.count("PASS"),
+                       "FAIL": statuses.count("FAIL"), "ERROR": statuses.count("ERROR")})
+    return counts
+
+
+def export_sweep_csv(sweep, path):
+    """Writes the files x macros matrix (one row per file, one column per macro)."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["file"] + sweep["macros"] + ["details"])
+        for row in sweep["rows"]:
+            writer.writerow([row["file"]] + row["statuses"] + [row["details"]])
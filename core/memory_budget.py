@@ -0,0 +1,153 @@
+"""
+Memory accounting for parallel batches.
+
+Parsing a recording costs far more memory than the file takes on disk (an
+xlsx cell goes through XML text and Python objects before it ends up in an
+array), and the cost follows the number of cells rather than the file size.
+MemoryModel estimates the peak of loading one recording from its schema
+(probe_file: topics x frames), falling back to the file size when the frame
+count is unknown, and corrects the estimates per file type with the peaks
+measured while the batch runs (measure_peak).
+
+RSS is read from /proc on Linux and with GetProcessMemoryInfo on Windows;
+elsewhere the peak comes from getrusage, which can't be reset, so only loads
+that raise the process peak are measured there.
+"""
+import os
+import sys
+import threading
+
+# Peak bytes of loading one cell, by file type (measured with ExcelLoader.load_bytes)
+PEAK_BYTES_PER_CELL = {".csv": 24, ".xlsx": 220, ".xls": 300}
+# Cells per byte on disk, for files whose frame count isn't known before loading
+DISK_BYTES_PER_CELL = {".csv": 8, ".xlsx": 10, ".xls": 12}
+# Fixed overhead of loading any recording
+BASE_BYTES = 8 * 1024 * 1024
+# Assumed RSS of an idle parse worker (interpreter + pandas) until it has been measured
+WORKER_BASELINE_BYTES = 100 * 1024 * 1024
+# Weight of a new measurement in the per type correction factor
+LEARNING_RATE = 0.3
+
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    def _memory_counters():
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ok = ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                      ctypes.byref(counters), counters.cb)
+        return counters if ok else None
+
+
+def _proc_status(key):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if it can't be read."""
+    if sys.platform == "win32":
+        counters = _memory_counters()
+        return counters.WorkingSetSize if counters else None
+    return _proc_status("VmRSS:")
+
+
+def peak_rss():
+    """Highest resident set size of this process (since the last reset_peak_rss) in bytes, or None."""
+    if sys.platform == "win32":
+        counters = _memory_counters()
+        return counters.PeakWorkingSetSize if counters else None
+    peak = _proc_status("VmHWM:")
+    if peak is None:
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024 # bytes on macOS, KB elsewhere
+    return peak
+
+
+def reset_peak_rss():
+    """Resets the peak of peak_rss to the current RSS. Returns False where that isn't possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_peak(fn, *args):
+    """
+    Calls fn(*args). Returns (result, rss_before, peak_used): peak_used is how
+    far RSS rose above rss_before during the call, or None if it can't be told.
+    """
+    reset_peak_rss()
+    before = current_rss()
+    peak_before = peak_rss()
+    result = fn(*args)
+    peak_after = peak_rss()
+    if before is None or peak_after is None or peak_before is None or peak_after <= peak_before:
+        return result, before, None
+    return result, before, peak_after - before
+
+
+class MemoryModel:
+    """Peak memory estimates for loading recordings, corrected by measured peaks."""
+    def __init__(self, loader=None):
+        self.loader = loader
+        self.factors = {} # ext -> measured / estimated
+        self._lock = threading.Lock()
+
+    def base_estimate(self, file_path):
+        """Uncorrected estimate in bytes: file content + cells x per cell peak."""
+        ext = os.path.splitext(file_path)[1].lower()
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return BASE_BYTES
+        cells = None
+        if self.loader is not None:
+            try:
+                probe = self.loader.probe_file(file_path)
+                if probe["n_frames"] is not None:
+                    cells = probe["n_frames"] * max(len(probe["topics"]), 1)
+            except Exception:
+                pass # Unreadable header: loading will report it, estimate from the size
+        if cells is None:
+            cells = size / DISK_BYTES_PER_CELL.get(ext, 10)
+        return int(BASE_BYTES + size + cells * PEAK_BYTES_PER_CELL.get(ext, 220))
+
+    def estimate(self, file_path):
+        """(base_estimate, corrected estimate) in bytes."""
+        base = self.base_estimate(file_path)
+        ext = os.path.splitext(file_path)[1].lower()
+        with self._lock:
+            factor = self.factors.get(ext, 1.0)
+        return base, int(base * factor)
+
+    def observe(self, file_path, base_estimate, measured):
+        """Folds a measured peak (bytes) for a file with the given base_estimate into the correction."""
+        if not measured or base_estimate <= 0:
+            return
+        ext = os.path.splitext(file_path)[1].lower()
+        ratio = measured / base_estimate
+        with self._lock:
+            old = self.factors.get(ext)
+            self.factors[ext] = ratio if old is None else old + LEARNING_RATE * (ratio - old)
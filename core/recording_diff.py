@@ -0,0 +1,109 @@
+import numpy as np
+
+# Numeric topics are compared this many columns at a time, which keeps the
+# temporary 2D arrays small for 600-topic recordings.
+BLOCK_TOPICS = 64
+
+
+def align_indices(base_time, other_time, offset=0.0):
+    """
+    For each base timestamp, the index of the other recording's sample at or
+    before (t + offset), or -1 if the other recording has not started yet.
+    A microsecond of slack keeps float rounding from selecting the previous sample.
+    """
+    return np.searchsorted(other_time, np.asarray(base_time) + offset + 1e-6, side='right') - 1
+
+
+def _column_runs(differ):
+    """
+    Consecutive True runs of every column of a 2D bool array at once.
+    Returns a list (one entry per column) of (starts, ends) inclusive row indices.
+    """
+    n_rows, n_cols = differ.shape
+    padded = np.zeros((n_cols, n_rows + 2), dtype=np.int8)
+    padded[:, 1:-1] = differ.T
+    edges = np.diff(padded, axis=1)
+    start_cols, starts = np.nonzero(edges == 1)   # Sorted by column, then row
+    end_cols, ends = np.nonzero(edges == -1)
+    splits = np.cumsum(np.bincount(start_cols, minlength=n_cols))[:-1]
+    return list(zip(np.split(starts, splits), np.split(ends - 1, splits)))
+
+
+def diff_recordings(base, other, topics=None, offset=0.0):
+    """
+    Compares two loaded recordings (ExcelLoader) frame by frame on base's time axis.
+    'other' is sampled at (t + offset) with zero-order hold. Only frames covered by
+    both recordings are compared.
+
+    Returns per-topic dicts ranked by how much they diverge:
+        {"topic", "diverge_frames", "diverge_ratio", "intervals": [(start_s, end_s), ...], "first_time"}
+    Topics that are identical over the compared range are omitted.
+    """
+    base_time = np.asarray(base.get_time_axis(), dtype=np.float64)
+    other_time = np.asarray(other.get_time_axis(), dtype=np.float64)
+    if len(base_time) == 0 or len(other_time) == 0:
+        return []
+
+    idx = align_indices(base_time, other_time, offset)
+    covered = np.flatnonzero((idx >= 0) & (base_time + offset <= other_time[-1] + other.time_step / 2))
+    if len(covered) == 0:
+        return []
+    lo, hi = int(covered[0]), int(covered[-1]) + 1  # Covered frames form one contiguous range
+    other_idx = idx[lo:hi]
+    times = base_time[lo:hi]
+    n_frames = hi - lo
+
+    other_topics = set(other.get_topics())
+    shared = [t for t in (topics if topics is not None else base.get_topics()) if t in other_topics]
+
+    numeric, generic = [], []
+    for t in shared:
+        kinds = (np.asarray(base.get_data_for_topic(t)[:1]).dtype.kind,
+                 np.asarray(other.get_data_for_topic(t)[:1]).dtype.kind)
+        (numeric if all(k in 'iufb' for k in kinds) else generic).append(t)
+
+    diffs = []
+
+    def collect(block, differ):
+        counts = differ.sum(axis=0)
+        for j, (starts, ends) in enumerate(_column_runs(differ)):
+            if counts[j] == 0:
+                continue
+            diffs.append({
+                "topic": block[j],
+                "diverge_frames": int(counts[j]),
+                "diverge_ratio": int(counts[j]) / n_frames,
+                "intervals": list(zip(times[starts].tolist(), times[ends].tolist())),
+                "first_time": float(times[starts[0]])
+            })
+
+    for b in range(0, len(numeric), BLOCK_TOPICS):
+        block = numeric[b:b + BLOCK_TOPICS]
+        a = np.column_stack([base.get_data_for_topic(t)[lo:hi] for t in block]).astype(np.float64)
+        o = np.column_stack([other.get_data_for_topic(t) for t in block]).astype(np.float64)[other_idx]
+        differ = (a != o) & ~(np.isnan(a) & np.isnan(o))
+        collect(block, differ)
+
+    import pandas as pd # Already imported by the loaders; kept out of module import (startup)
+    for t in generic:
+        a = np.asarray(base.get_data_for_topic(t)[lo:hi], dtype=object)
+        o = np.asarray(other.get_data_for_topic(t), dtype=object)[other_idx]
+        # Missing on both sides is no divergence; only present values are compared
+        missing_a, missing_o = pd.isna(a), pd.isna(o)
+        differ = missing_a != missing_o
+        present = ~missing_a & ~missing_o
+        differ[present] = np.asarray(a[present] != o[present], dtype=bool)
+        collect([t], differ.reshape(-1, 1))
+
+    diffs.sort(key=lambda d: (-d["diverge_frames"], -len(d["intervals"]), d["topic"]))
+    return diffs
+
+
+def diff_many(base, others, topics=None, offsets=None):
+    """
+    Compares several recordings against one base recording.
+    others: dict label -> loader. Returns dict label -> ranked diff list.
+    """
+    offsets = offsets or {}
+    return {label: diff_recordings(base, loader, topics, offsets.get(label, 0.0))
+            for label, loader in others.items()}
@@ -0,0 +1,249 @@
+"""
+Streaming sinks for batch results. Each result entry is appended and flushed
+as soon as its file is checked, so a crashed or cancelled batch keeps
+everything written up to that point, and memory use does not grow with the
+number of files.
+
+  CsvResultSink       one row per file with the RESULT_FIELDS summary columns
+  JsonlResultSink     one JSON object per line with the full result entry
+  ColumnarResultSink  a directory with one file per field (one JSON value per
+                      line), so single columns can be read without the rest
+
+Sinks opened with resume=True keep what is already there (dropping a last
+record that was only partly written) and report the files it covers through
+completed_files(); BatchProcessor.run_batch(..., result_sink=sink, resume=True)
+then skips those files.
+Data is flushed to the OS after every result; pass fsync=True to also force
+it to disk (slower, but survives power loss).
+"""
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+
+# Summary columns of a result entry, as in the batch results CSV export
+RESULT_FIELDS = ["file", "status", "fail_count", "details", "vehicle", "sw_ver", "test_date",
+                 "categories", "tc_number", "note"]
+
+
+def _truncate_partial_line(path, terminator=b"\n"):
+    """Cuts a file back to its last complete line. Returns the kept size."""
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        # Walk back in blocks to the last line terminator
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            # Read a little past pos so a terminator split between two blocks is found
+            block = f.read(min(size, pos + len(terminator) - 1) - start)
+            idx = block.rfind(terminator)
+            if idx >= 0:
+                keep = start + idx + len(terminator)
+                if keep < size:
+                    f.truncate(keep)
+                return keep
+            pos = start
+        f.truncate(0)
+        return 0
+
+
+def _truncate_partial_csv_record(path):
+    """
+    Cuts a CSV file back to its last complete record. Returns the kept size.
+    The csv module decides where records end, so line breaks inside quoted
+    fields (e.g. multi-line 'details') are not taken for record ends.
+    """
+    consumed = 0
+    line_complete = True
+
+    def lines(f):
+        nonlocal consumed, line_complete
+        for line in f:
+            consumed += len(line)
+            line_complete = line.endswith(b"\n")
+            yield line.decode('utf-8', errors='replace')
+
+    keep = 0
+    with open(path, 'rb') as f:
+        try:
+            for _ in csv.reader(lines(f)):
+                if line_complete:
+                    keep = consumed
+        except csv.Error:
+            pass # A record cut inside a quoted field
+    if keep < os.path.getsize(path):
+        with open(path, 'rb+') as f:
+            f.truncate(keep)
+    return keep
+
+
+class ResultSink(ABC):
+    """Base class: write(entry) appends one result; use as a context manager or call close()."""
+    def __init__(self, path, resume=False, fsync=False):
+        self.path = path
+        self.resume = resume
+        self.fsync = fsync
+        self._completed = set()
+        self.open()
+
+    @abstractmethod
+    def open(self):
+        """Opens (or, with resume, reopens) the output; called by __init__."""
+
+    @abstractmethod
+    def write(self, entry):
+        """Appends one result entry and flushes it."""
+
+    @abstractmethod
+    def close(self):
+        """Closes the output."""
+
+    def completed_files(self):
+        """'file' values of the results that were in the sink when it was resumed."""
+        return set(self._completed)
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvResultSink(ResultSink):
+    def open(self):
+        exists = self.resume and os.path.exists(self.path) and _truncate_partial_csv_record(self.path) > 0
+        if exists:
+            with open(self.path, 'r', newline='', encoding='utf-8') as f:
+                self._completed = {row["file"] for row in csv.DictReader(f)}
+        self.file = open(self.path, 'a' if exists else 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        if not exists:
+            self.writer.writeheader()
+            self._sync(self.file)
+
+    def write(self, entry):
+        self.writer.writerow(entry)
+        self._sync(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlResultSink(ResultSink):
+    def open(self):
+        exists = self.resume and os.path.exists(self.path) and _truncate_partial_line(self.path) > 0
+        if exists:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._completed = {json.loads(line)["file"] for line in f if line.strip()}
+        self.file = open(self.path, 'a' if exists else 'w', encoding='utf-8')
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._sync(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+class ColumnarResultSink(ResultSink):
+    """path is a directory; fields: columns to keep (default RESULT_FIELDS + duration + rule_results)."""
+    def __init__(self, path, resume=False, fsync=False, fields=None):
+        self.fields = list(fields or RESULT_FIELDS + ["duration", "rule_results"])
+        super().__init__(path, resume, fsync)
+
+    def _column_path(self, field):
+        return os.path.join(self.path, field + ".col")
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        schema_path = os.path.join(self.path, "columns.json")
+        rows = 0
+        if self.resume and os.path.exists(schema_path):
+            with open(schema_path, encoding='utf-8') as f:
+                self.fields = json.load(f)
+            # A crash can leave columns one row apart; keep the rows every column has
+            counts = []
+            for field in self.fields:
+                path = self._column_path(field)
+                if not os.path.exists(path):
+                    counts.append(0)
+                    continue
+                _truncate_partial_line(path)
+                with open(path, 'rb') as f:
+                    counts.append(sum(1 for _ in f))
+            rows = min(counts) if counts else 0
+            for field in self.fields:
+                self._truncate_rows(self._column_path(field), rows)
+            self._completed = set(read_column(self.path, "file"))
+        else:
+            with open(schema_path, 'w', encoding='utf-8') as f:
+                json.dump(self.fields, f)
+        mode = 'a' if rows else 'w'
+        self.files = [open(self._column_path(field), mode, encoding='utf-8') for field in self.fields]
+
+    @staticmethod
+    def _truncate_rows(path, rows):
+        if not os.path.exists(path):
+            open(path, 'w').close()
+            return
+        with open(path, 'rb+') as f:
+            for _ in range(rows):
+                if not f.readline():
+                    break
+            f.truncate()
+
+    def write(self, entry):
+        for field, f in zip(self.fields, self.files):
+            f.write(json.dumps(entry.get(field), ensure_ascii=False) + "\n")
+        for f in self.files:
+            self._sync(f)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def read_column(path, field):
+    """Values of one field of a columnar sink directory, in write order."""
+    with open(os.path.join(path, field + ".col"), encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_results(path):
+    """Yields the entries of a sink written by open_sink(path) (CSV values are strings)."""
+    if os.path.isdir(path):
+        with open(os.path.join(path, "columns.json"), encoding='utf-8') as f:
+            fields = json.load(f)
+        files = [open(os.path.join(path, field + ".col"), encoding='utf-8') for field in fields]
+        try:
+            for lines in zip(*files):
+                yield {field: json.loads(line) for field, line in zip(fields, lines)}
+        finally:
+            for f in files:
+                f.close()
+    elif path.lower().endswith(".csv"):
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def open_sink(path, resume=False, fsync=False):
+    """Sink by path: *.csv -> CSV, *.jsonl / *.json -> JSONL, anything else -> columnar directory."""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return CsvResultSink(path, resume, fsync)
+    if lower.endswith((".jsonl", ".json")):
+        return JsonlResultSink(path, resume, fsync)
+    return ColumnarResultSink(path, resume, fsync)
@@ -0,0 +1,359 @@
+import os
+import json
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    folder TEXT,
+    config_hash TEXT,
+    file_count INTEGER,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rules (
+    rule_id INTEGER PRIMARY KEY,
+    rule_hash TEXT UNIQUE NOT NULL,
+    rule TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_results (
+    run_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    fail_count INTEGER,
+    vehicle TEXT,
+    sw_ver TEXT,
+    test_date TEXT,
+    categories TEXT,
+    tc_number TEXT,
+    config_hash TEXT,
+    duration REAL,
+    details TEXT,
+    PRIMARY KEY (run_id, file_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rule_results (
+    run_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    rule_index INTEGER NOT NULL,
+    rule_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    intervals TEXT,
+    PRIMARY KEY (run_id, file_id, rule_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_folder ON runs(folder, run_id);
+CREATE INDEX IF NOT EXISTS idx_file_results_file ON file_results(file_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_file_results_sw_ver ON file_results(sw_ver, run_id);
+CREATE INDEX IF NOT EXISTS idx_rule_results_file_rule ON rule_results(file_id, rule_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_rule_results_rule ON rule_results(rule_id, run_id, status);
+"""
+
+# PRAGMA user_version of the current layout (1: rules keyed by hash, normalized run folders)
+SCHEMA_VERSION = 1
+
+_RUN_COLUMNS = ["run_id", "started_at", "finished_at", "folder", "config_hash", "file_count", "duration"]
+
+# Columns of file_results that trends can be grouped by
+TREND_FIELDS = ["vehicle", "sw_ver", "test_date", "categories", "tc_number", "config_hash"]
+
+
+class ResultsStore:
+    """
+    Append-only SQLite history of batch runs: one row per run, per file and per
+    rule outcome, with failing time intervals when the batch collected them
+    (run_batch(collect_intervals=True), "Record fail intervals" in the batch dialog).
+    File paths and rules are interned into lookup tables so the large tables only
+    hold integers, and all queries are served by indexes.
+
+    File paths are relative to the batch folder, so the same path in two folders
+    is a different recording: the per-file queries take an optional 'folder'
+    that limits them to the runs over that folder. Rules are identified by their
+    hash (result "rule_hash", see batch_processor.check_file); the description is
+    kept for display.
+    """
+
+    def __init__(self, path, flush_every=200):
+        self.path = path
+        self.flush_every = flush_every
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.conn.executescript(_SCHEMA)
+        self._file_ids = {}
+        self._rule_ids = {}
+        self._pending_files = []
+        self._pending_rules = []
+        self._run_started = {}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.conn:
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(rules)")]
+            if columns and "rule_hash" not in columns:
+                # Rules used to be keyed by their description; keep those rows apart from hashes
+                self.conn.execute("ALTER TABLE rules RENAME TO rules_v0")
+                self.conn.execute("CREATE TABLE rules (rule_id INTEGER PRIMARY KEY, "
+                                  "rule_hash TEXT UNIQUE NOT NULL, rule TEXT NOT NULL)")
+                self.conn.execute("INSERT INTO rules SELECT rule_id, 'describe:' || rule, rule FROM rules_v0")
+                self.conn.execute("DROP TABLE rules_v0")
+            if self.conn.execute("SELECT name FROM sqlite_master WHERE name = 'runs'").fetchone():
+                folders = [row[0] for row in self.conn.execute("SELECT DISTINCT folder FROM runs")]
+                self.conn.executemany("UPDATE runs SET folder = ? WHERE folder = ?",
+                                      [(_folder_key(f), f) for f in folders if _folder_key(f) != f])
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # --- Recording ---
+
+    def begin_run(self, folder, config_hash=""):
+        started = time.time()
+        cur = self.conn.execute(
+            "INSERT INTO runs (started_at, folder, config_hash) VALUES (?, ?, ?)",
+            (started, _folder_key(folder), config_hash))
+        self.conn.commit()
+        self._run_started[cur.lastrowid] = started
+        return cur.lastrowid
+
+    def add_result(self, run_id, result):
+        """Buffers one batch result entry; rows are written every 'flush_every' results."""
+        file_id = self._intern("files", "file_id", "path", result["file"], self._file_ids)
+        self._pending_files.append((
+            run_id, file_id, result["status"], result.get("fail_count", 0),
+            result.get("vehicle", ""), result.get("sw_ver", ""), result.get("test_date", ""),
+            result.get("categories", ""), result.get("tc_number", ""),
+            result.get("config_hash", ""), result.get("duration", 0.0), result.get("details", "")
+        ))
+        for r in result.get("rule_results", []):
+            rule_id = self._intern_rule(r.get("rule_hash") or "describe:" + r["rule"], r["rule"])
+            intervals = json.dumps(r["intervals"]) if r.get("intervals") else None
+            self._pending_rules.append((run_id, file_id, r["rule_index"], rule_id, r["status"], intervals))
+
+        if len(self._pending_files) >= self.flush_every:
+            self.flush()
+
+    def finish_run(self, run_id, file_count):
+        self.flush()
+        finished = time.time()
+        started = self._run_started.pop(run_id, finished)
+        self.conn.execute(
+            "UPDATE runs SET finished_at = ?, file_count = ?, duration = ? WHERE run_id = ?",
+            (finished, file_count, finished - started, run_id))
+        self.conn.commit()
+
+    def flush(self):
+        if not self._pending_files and not self._pending_rules:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending_files)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rule_results VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending_rules)
+        self._pending_files = []
+        self._pending_rules = []
+
+    def _intern(self, table, id_col, value_col, value, cache):
+        key = cache.get(value)
+        if key is None:
+            self.conn.execute(f"INSERT OR IGNORE INTO {table} ({value_col}) VALUES (?)", (value,))
+            key = self.conn.execute(f"SELECT {id_col} FROM {table} WHERE {value_col} = ?", (value,)).fetchone()[0]
+            cache[value] = key
+        return key
+
+    def _intern_rule(self, rule_hash, description):
+        key = self._rule_ids.get(rule_hash)
+        if key is None:
+            self.conn.execute("INSERT OR IGNORE INTO rules (rule_hash, rule) VALUES (?, ?)", (rule_hash, description))
+            key = self.conn.execute("SELECT rule_id FROM rules WHERE rule_hash = ?", (rule_hash,)).fetchone()[0]
+            self._rule_ids[rule_hash] = key
+        return key
+
+    # --- Queries ---
+
+    def runs(self, limit=None, folder=None):
+        """Most recent runs first (only those over 'folder' if given)."""
+        where, params = _folder_filter("runs", folder)
+        sql = f"SELECT {', '.join(_RUN_COLUMNS)} FROM runs WHERE {where} ORDER BY run_id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(zip(_RUN_COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def latest_run_id(self):
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def file_history(self, file, folder=None):
+        """Status of one file in every run that checked it (over 'folder' if given), oldest first."""
+        where, params = _folder_filter("r", folder)
+        sql = f"""
+            SELECT fr.run_id, r.started_at, fr.status, fr.fail_count, fr.sw_ver, fr.duration
+            FROM file_results fr
+            JOIN files f ON f.file_id = fr.file_id
+            JOIN runs r ON r.run_id = fr.run_id
+            WHERE f.path = ? AND {where}
+            ORDER BY fr.run_id
+        """
+        cols = ["run_id", "started_at", "status", "fail_count", "sw_ver", "duration"]
+        return [dict(zip(cols, row)) for row in self.conn.execute(sql, (file,) + params)]
+
+    def rule_history(self, file, rule_hash, folder=None):
+        """Outcome of one rule (by hash) on one file in every run (over 'folder' if given), oldest first."""
+        where, params = _folder_filter("r", folder)
+        sql = f"""
+            SELECT rr.run_id, r.started_at, rr.status, rr.intervals
+            FROM rule_results rr
+            JOIN runs r ON r.run_id = rr.run_id
+            WHERE rr.file_id = (SELECT file_id FROM files WHERE path = ?)
+              AND rr.rule_id = (SELECT rule_id FROM rules WHERE rule_hash = ?)
+              AND {where}
+            ORDER BY rr.run_id
+        """
+        return [{"run_id": run_id, "started_at": started, "status": status,
+                 "intervals": json.loads(intervals) if intervals else []}
+                for run_id, started, status, intervals in self.conn.execute(sql, (file, rule_hash) + params)]
+
+    def failing_since(self, file, rule_hash, folder=None):
+        """
+        Run in which the current failure streak of a rule (by hash) on 'file'
+        started (the first FAIL after the last PASS), or None if it is not failing.
+        """
+        where, params = _folder_filter("r", folder)
+        sql = f"""
+            WITH ids AS (
+                SELECT (SELECT file_id FROM files WHERE path = ?) AS file_id,
+                       (SELECT rule_id FROM rules WHERE rule_hash = ?) AS rule_id
+            ),
+            history AS (
+                SELECT rr.run_id, rr.status FROM rule_results rr, ids
+                JOIN runs r ON r.run_id = rr.run_id
+                WHERE rr.file_id = ids.file_id AND rr.rule_id = ids.rule_id AND {where}
+            )
+            SELECT MIN(run_id) FROM history
+            WHERE status = 'FAIL'
+              AND run_id > COALESCE((SELECT MAX(run_id) FROM history WHERE status = 'PASS'), 0)
+        """
+        run_id = self.conn.execute(sql, (file, rule_hash) + params).fetchone()[0]
+        if run_id is None:
+            return None
+        return self.get_run(run_id)
+
+    def last_file_results(self, folder=None):
+        """
+        Latest result of every file (in the runs over 'folder' if given):
+        {file: {"run_id", "started_at", "status", "duration"}}.
+        """
+        where, params = _folder_filter("r", folder)
+        sql = f"""
+            SELECT f.path, fr.run_id, r.started_at, fr.status, fr.duration
+            FROM file_results fr
+            JOIN (SELECT fr.file_id, MAX(fr.run_id) AS run_id
+                  FROM file_results fr JOIN runs r ON r.run_id = fr.run_id
+                  WHERE {where} GROUP BY fr.file_id) last
+              ON last.file_id = fr.file_id AND last.run_id = fr.run_id
+            JOIN files f ON f.file_id = fr.file_id
+            JOIN runs r ON r.run_id = fr.run_id
+        """
+        return {path: {"run_id": run_id, "started_at": started, "status": status, "duration": duration}
+                for path, run_id, started, status, duration in self.conn.execute(sql, params)}
+
+    def get_run(self, run_id):
+        row = self.conn.execute(f"SELECT {', '.join(_RUN_COLUMNS)} FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(zip(_RUN_COLUMNS, row)) if row else None
+
+    def newly_failing(self, since_run_id, run_id=None):
+        """
+        (file, rule) pairs that FAIL in 'run_id' (default: latest run) but
+        PASSED in 'since_run_id'.
+        """
+        if run_id is None:
+            run_id = self.latest_run_id()
+        sql = """
+            SELECT f.path, ru.rule, ru.rule_hash
+            FROM rule_results cur
+            JOIN rule_results old
+              ON old.file_id = cur.file_id AND old.rule_id = cur.rule_id
+             AND old.run_id = ? AND old.status = 'PASS'
+            JOIN files f ON f.file_id = cur.file_id
+            JOIN rules ru ON ru.rule_id = cur.rule_id
+            WHERE cur.run_id = ? AND cur.status = 'FAIL'
+            ORDER BY f.path, cur.rule_index
+        """
+        return [{"file": path, "rule": rule, "rule_hash": rule_hash}
+                for path, rule, rule_hash in self.conn.execute(sql, (since_run_id, run_id))]
+
+    def newly_failing_files(self, since_run_id, run_id=None):
+        """Files that FAIL in 'run_id' (default: latest run) but PASSED in 'since_run_id'."""
+        if run_id is None:
+            run_id = self.latest_run_id()
+        sql = """
+            SELECT f.path
+            FROM file_results cur
+            JOIN file_results old
+              ON old.file_id = cur.file_id AND old.run_id = ? AND old.status = 'PASS'
+            JOIN files f ON f.file_id = cur.file_id
+            WHERE cur.run_id = ? AND cur.status = 'FAIL'
+            ORDER BY f.path
+        """
+        return [row[0] for row in self.conn.execute(sql, (since_run_id, run_id))]
+
+    def pass_rate_trend(self, field=None, since=None):
+        """
+        Pass rate per run (optionally also per value of 'field', e.g. "sw_ver").
+        'since' limits to runs started at or after that epoch time.
+        """
+        if field is not None and field not in TREND_FIELDS:
+            raise ValueError(f"Unknown trend field '{field}'")
+        group_col = f", fr.{field}" if field else ""
+        sql = f"""
+            SELECT fr.run_id, r.started_at{group_col},
+                   SUM(fr.status = 'PASS'), SUM(fr.status = 'FAIL'),
+                   SUM(fr.status IN ('PASS', 'FAIL', 'ERROR', 'MISSING_TOPICS')), COUNT(*)
+            FROM file_results fr
+            JOIN runs r ON r.run_id = fr.run_id
+            WHERE r.started_at >= ?
+            GROUP BY fr.run_id{group_col}
+            ORDER BY fr.run_id{group_col}
+        """
+        trend = []
+        for row in self.conn.execute(sql, (since or 0,)):
+            if field:
+                run_id, started, value, passed, failed, checked, total = row
+            else:
+                run_id, started, passed, failed, checked, total = row
+            entry = {"run_id": run_id, "started_at": started, "PASS": passed, "FAIL": failed,
+                     "total": total, "pass_rate": passed / checked if checked else 0.0}
+            if field:
+                entry[field] = value
+            trend.append(entry)
+        return trend
+
+
+def _folder_key(folder):
+    """Runs are filed under the absolute, case-normalized batch folder."""
+    return os.path.normcase(os.path.abspath(folder)) if folder else (folder or "")
+
+
+def _folder_filter(alias, folder):
+    """(SQL condition, params) limiting runs (table alias) to a batch folder; None matches all."""
+    if folder is None:
+        return "1", ()
+    return f"{alias}.folder = ?", (_folder_key(folder),)
@@ -0,0 +1,196 @@
+"""
+Rule-set optimizer: turns a rule list into the distinct checks it actually
+needs, so evaluation cost follows the checks rather than how the list was
+authored (macros applied twice, windows dragged next to each other...).
+
+  - Rules are normalized: MUST_OR alternatives are deduplicated and sorted
+    (the first one stays first, check_rules reads the window from it), and the
+    tolerance of rule types that ignore it is dropped.
+  - Identical rules are evaluated once.
+  - Rules whose verdict is decided frame by frame (MUST, SHOULD_NOT, MUST_OR,
+    EXPR without tolerance) or trigger by trigger (IMPLIES) and that differ
+    only in overlapping or adjacent windows are merged into one unit over the
+    covering window. The unit's failing frames are clipped back to each rule's
+    own window; a unit that passes passes all its rules.
+  - A MUST_OR unit passes without evaluation when a unit with the same first
+    alternative, a subset of its alternatives and a covering window passed.
+
+EXIST and MAYBE (and EXPR with a tolerance) depend on the window as a whole
+and are only deduplicated. RulePlan.evaluate returns check_rules results for
+the original rules, in their order and with their indices.
+"""
+import json
+from core.logic import Rule, RuleType
+
+# Windows closer than this (seconds) are merged; the gap is evaluated but belongs to no rule
+MERGE_GAP = 0.1
+# Verdict decided per frame (or per trigger), so results over a covering window can be split
+_MERGEABLE = (RuleType.MUST, RuleType.SHOULD_NOT, RuleType.MUST_OR, RuleType.IMPLIES)
+# Rule types that use 'tolerance'
+_TOLERANCE_RULES = (RuleType.MAYBE, RuleType.EXPR, RuleType.IMPLIES)
+
+
+def _key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _or_alternatives(rule):
+    """Normalized (topic, target) pairs of a MUST_OR rule, or None if it can't be normalized."""
+    topics = rule.topic if isinstance(rule.topic, list) else [rule.topic]
+    targets = rule.target_value if isinstance(rule.target_value, list) else [rule.target_value]
+    if not topics or not targets:
+        return None
+    pairs = [(t, targets[j] if j < len(targets) else targets[-1]) for j, t in enumerate(topics)]
+    rest = {}
+    for pair in pairs[1:]:
+        if _key(pair) != _key(pairs[0]):
+            rest.setdefault(_key(pair), pair)
+    return [pairs[0]] + [rest[k] for k in sorted(rest)]
+
+
+def _frame_range(rule, time_step, n_frames):
+    """Frames of the rule window, clamped as in check_rules."""
+    start_idx = max(0, min(int(rule.start_time / time_step), n_frames - 1))
+    end_idx = max(0, min(int(rule.end_time / time_step), n_frames - 1))
+    return start_idx, end_idx
+
+
+class _Unit:
+    """One evaluation: rule (normalized, possibly over a merged window) and the original rule indices."""
+    __slots__ = ("rule", "members", "merged", "alternatives")
+
+    def __init__(self, rule, members, merged, alternatives=None):
+        self.rule = rule
+        self.members = members
+        self.merged = merged # Members have different windows: results are clipped per member
+        self.alternatives = alternatives # MUST_OR: set of alternative keys
+
+    def implied_by(self, other):
+        """other passed and its verdict implies this unit passes (MUST_OR only)."""
+        return (self.alternatives is not None and other.alternatives is not None
+                and _key(self.rule.topic[0]) == _key(other.rule.topic[0])
+                and _key(self.rule.target_value[0]) == _key(other.rule.target_value[0])
+                and other.alternatives <= self.alternatives
+                and other.rule.start_time <= self.rule.start_time
+                and self.rule.end_time <= other.rule.end_time)
+
+
+class RulePlan:
+    """Evaluation units of a rule list, see optimize_rules."""
+    def __init__(self, rules, units):
+        self.rules = rules
+        self.units = units
+
+    def is_trivial(self):
+        """Nothing to gain: every unit is a single rule."""
+        return len(self.units) == len(self.rules)
+
+    def evaluate(self, evaluate_rules, data_loader, verdict_only=False, fail_fast=False):
+        """
+        check_rules results for the original rules.
+        evaluate_rules(rules, verdict_only): check_rules over a rule list (without fail_fast).
+        """
+        n_frames = len(data_loader.get_time_axis())
+        results = [None] * len(self.rules)
+        limit = len(self.rules) # With fail_fast: index of the first failing rule
+        passed_or = []
+        if fail_fast:
+            units = self.units # In rule order, so the first failure is found first
+        else:
+            # Narrow OR rules first, their passing can spare wider ones
+            units = sorted(self.units, key=lambda u: (len(u.alternatives) if u.alternatives else 0, u.members[0]))
+
+        for unit in units:
+            if unit.members[0] > limit:
+                break
+            if any(unit.implied_by(other) for other in passed_or):
+                result = {"status": "PASS", "fail_frames": [], "fail_times": []}
+            else:
+                result = evaluate_rules([unit.rule], verdict_only)[0]
+                if result["status"] == "FAIL" and unit.merged and verdict_only:
+                    # Which of the merged rules failed needs the failing frames
+                    result = evaluate_rules([unit.rule], False)[0]
+            if unit.alternatives is not None and result["status"] == "PASS":
+                passed_or.append(unit)
+            for index in unit.members:
+                results[index] = self._member_result(index, unit, result, verdict_only,
+                                                     data_loader.time_step, n_frames)
+                if fail_fast and results[index]["status"] == "FAIL":
+                    limit = min(limit, index)
+        return results[:limit + 1] if fail_fast else results
+
+    def _member_result(self, index, unit, result, verdict_only, time_step, n_frames):
+        rule = self.rules[index]
+        if result["status"] == "ERROR":
+            return {"rule_index": index, "status": "ERROR", "msg": result["msg"]}
+        frames = result.get("fail_frames", [])
+        times = result.get("fail_times")
+        status = result["status"]
+        if unit.merged:
+            lo, hi = _frame_range(rule, time_step, n_frames)
+            keep = [k for k, f in enumerate(frames) if lo <= f <= hi]
+            frames = [frames[k] for k in keep]
+            if times is not None:
+                times = [times[k] for k in keep]
+            status = "FAIL" if frames else "PASS"
+        entry = {
+            "rule_index": index,
+            "status": status,
+            "fail_frames": [] if verdict_only else frames,
+            "rule_desc": rule.describe() if (status == "FAIL" or not verdict_only) else ""
+        }
+        if rule.rule_type == RuleType.IMPLIES and not verdict_only:
+            entry["fail_times"] = times or []
+        return entry
+
+
+def _normalized(rule):
+    """(normalized copy of rule, MUST_OR alternative keys or None)."""
+    topic, target, alternatives = rule.topic, rule.target_value, None
+    if rule.rule_type == RuleType.MUST_OR:
+        pairs = _or_alternatives(rule)
+        if pairs is not None:
+            topic = [t for t, _ in pairs]
+            target = [v for _, v in pairs]
+            alternatives = frozenset(_key(pair) for pair in pairs)
+    tolerance = rule.tolerance if rule.rule_type in _TOLERANCE_RULES else 0.0
+    return Rule(rule.start_time, rule.end_time, topic, target, rule.rule_type, tolerance), alternatives
+
+
+def optimize_rules(rules):
+    """Builds the RulePlan of a rule list (see module docstring)."""
+    groups = {} # check key -> [(normalized rule, index)]
+    alternatives = {}
+    for index, rule in enumerate(rules):
+        normalized, alts = _normalized(rule)
+        mergeable = (rule.rule_type in _MERGEABLE or (rule.rule_type == RuleType.EXPR and rule.tolerance <= 0)) \
+            and normalized.start_time <= normalized.end_time
+        key = (normalized.rule_type, _key(normalized.topic), _key(normalized.target_value), normalized.tolerance)
+        if not mergeable:
+            key += (normalized.start_time, normalized.end_time)
+        groups.setdefault((mergeable, key), []).append((normalized, index))
+        alternatives[key] = alts
+
+    units = []
+    for (mergeable, key), members in groups.items():
+        if not mergeable:
+            units.append(_Unit(members[0][0], [index for _, index in members], False, alternatives[key]))
+            continue
+        # Sweep the windows in start order, merging those that overlap or nearly touch
+        members.sort(key=lambda m: (m[0].start_time, m[0].end_time))
+        cluster = [members[0]]
+        end = members[0][0].end_time
+        for member in members[1:] + [None]:
+            if member is not None and member[0].start_time <= end + MERGE_GAP:
+                cluster.append(member)
+                end = max(end, member[0].end_time)
+                continue
+            first = cluster[0][0]
+            windows = {(r.start_time, r.end_time) for r, _ in cluster}
+            unit_rule = Rule(first.start_time, end, first.topic, first.target_value, first.rule_type, first.tolerance)
+            units.append(_Unit(unit_rule, sorted(index for _, index in cluster), len(windows) > 1, alternatives[key]))
+            if member is not None:
+                cluster = [member]
+                end = member[0].end_time
+    units.sort(key=lambda u: u.members[0])
+    return RulePlan(rules, units)
@@ -0,0 +1,312 @@
+"""
+Local HTTP/JSON validation service, so scripts can validate recordings without
+the GUI or a copy of the master config:
+
+    python -m core.service --master master_config.json --port 8765 --workers 2
+
+Endpoints (JSON in, JSON out):
+  POST   /jobs          queue a validation; body:
+                          "path": recording path readable by the service, or
+                          "upload": {"name": "rec.csv", "content": <base64>}
+                          "config": master config stem (default: the file stem; "path"
+                                    patterns match the requested path or upload name), or
+                          "rules": [rule dicts] (+ optional "metadata") inline
+                          "fail_fast", "collect_intervals": as in BatchProcessor.run_batch
+                        -> 202 {"job_id", "status", ...}; 429 when the queue is full
+  GET    /jobs          status of all known jobs
+  GET    /jobs/<id>     status of one job, with its "result" (a batch result entry)
+                        once done; ?wait=<seconds> blocks until it finishes or times out
+  DELETE /jobs/<id>     cancel a job that has not started yet
+  GET    /health        worker and queue counts
+
+Jobs run on a bounded process pool; the HTTP server handles each client in its own thread.
+"""
+import argparse
+import base64
+import binascii
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from core.batch_processor import check_file
+from core.expression import compile_expression
+from core.logic import InspectorLogic, Rule, RuleType, RULE_TYPES
+
+DATA_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+class ServiceError(Exception):
+    """A request the service rejects; 'status' is the HTTP status code to answer with."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ValidationService:
+    """
+    Queues validation jobs on a process pool and keeps their state.
+    master_config_path: master config used for "config" stems (reloaded when the file changes).
+    max_workers: pool size. max_pending: jobs queued or running before new ones get 429.
+    max_finished: finished jobs kept for status queries (oldest are dropped).
+    """
+    def __init__(self, master_config_path=None, max_workers=2, max_pending=32, max_finished=1000):
+        self.master_config_path = master_config_path
+        self.logic = InspectorLogic()
+        self._master_mtime = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+        self.upload_dir = tempfile.mkdtemp(prefix="sils_uploads_")
+        self.jobs = {} # job_id -> job dict, in submission order
+        self._lock = threading.Lock()
+
+    def _config_for(self, stem, rel_path=None):
+        if not self.master_config_path:
+            return None
+        with self._lock:
+            mtime = os.stat(self.master_config_path).st_mtime_ns if os.path.exists(self.master_config_path) else None
+            if mtime != self._master_mtime:
+                self.logic.load_master_config(self.master_config_path)
+                self._master_mtime = mtime
+            return self.logic.get_config_for_file(stem, rel_path)
+
+    def submit(self, request):
+        """Validates a POST /jobs body and queues the job. Returns the job status."""
+        if not isinstance(request, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = None
+
+        if ("path" in request) == ("upload" in request):
+            raise ServiceError(400, "Give exactly one of 'path' or 'upload'")
+        if "upload" in request:
+            upload = request["upload"]
+            rel_path = str(upload.get("name", "")).replace("\\", "/").lstrip("/") if isinstance(upload, dict) else ""
+            name = os.path.basename(rel_path)
+            if not name.lower().endswith(DATA_EXTENSIONS):
+                raise ServiceError(400, f"Upload name must end with one of {', '.join(DATA_EXTENSIONS)}")
+            try:
+                content = base64.b64decode(upload.get("content", ""), validate=True)
+            except (binascii.Error, TypeError, ValueError):
+                raise ServiceError(400, "Upload content must be base64")
+            job_dir = os.path.join(self.upload_dir, job_id)
+            os.makedirs(job_dir)
+            file_path = os.path.join(job_dir, name)
+            with open(file_path, 'wb') as f:
+                f.write(content)
+        else:
+            file_path = str(request["path"])
+            if not os.path.isfile(file_path):
+                raise ServiceError(400, f"Recording not found: {file_path}")
+            name = os.path.basename(file_path)
+            rel_path = file_path
+
+        try:
+            if "rules" in request:
+                rules = request["rules"]
+                if not isinstance(rules, list):
+                    raise ServiceError(400, "'rules' must be a list of rule objects")
+                try:
+                    for r in rules:
+                        rule = Rule.from_dict(r)
+                        if rule.rule_type not in RULE_TYPES:
+                            raise ServiceError(400, f"Unknown rule_type: {rule.rule_type!r}")
+                        if rule.rule_type == RuleType.EXPR:
+                            compile_expression(rule.topic)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    raise ServiceError(400, f"Invalid rule: {e}")
+                config_data = {"rules": rules, "metadata": request.get("metadata", {})}
+            elif request.get("config"):
+                config_data = self._config_for(str(request["config"]))
+            else:
+                config_data = self._config_for(os.path.splitext(name)[0], rel_path)
+
+            with self._lock:
+                pending = sum(1 for job in self.jobs.values() if not job["future"].done())
+                if pending >= self.max_pending:
+                    raise ServiceError(429, f"Queue is full ({pending} jobs pending), retry later")
+                future = self.pool.submit(check_file, file_path, config_data, name,
+                                          bool(request.get("fail_fast", False)),
+                                          bool(request.get("collect_intervals", False)))
+                job = {"job_id": job_id, "file": name, "submitted": time.time(), "future": future}
+                self.jobs[job_id] = job
+                self._drop_finished()
+        except Exception:
+            if job_dir:
+                shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        if job_dir:
+            future.add_done_callback(lambda f: shutil.rmtree(job_dir, ignore_errors=True))
+        return self.status(job_id)
+
+    def _drop_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["future"].done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def _job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise ServiceError(404, f"Unknown job: {job_id}")
+        return job
+
+    def status(self, job_id, wait=0.0):
+        """Status dict of a job; waits up to 'wait' seconds for it to finish."""
+        job = self._job(job_id)
+        future = job["future"]
+        if wait > 0:
+            wait_futures([future], timeout=wait)
+        view = {"job_id": job_id, "file": job["file"], "submitted": job["submitted"]}
+        if future.cancelled():
+            view["status"] = "cancelled"
+        elif future.done():
+            error = future.exception()
+            if error is not None:
+                view["status"] = "error"
+                view["error"] = str(error) or type(error).__name__
+            else:
+                view["status"] = "done"
+                view["result"] = future.result()
+        else:
+            view["status"] = "running" if future.running() else "queued"
+        return view
+
+    def list_jobs(self):
+        with self._lock:
+            job_ids = list(self.jobs)
+        return [{k: v for k, v in self.status(job_id).items() if k != "result"} for job_id in job_ids]
+
+    def cancel(self, job_id):
+        if not self._job(job_id)["future"].cancel():
+            raise ServiceError(409, "Job has already started")
+        return self.status(job_id)
+
+    def health(self):
+        with self._lock:
+            pending = sum(1 for job in self.jobs.values() if not job["future"].done())
+        return {"status": "ok", "workers": self.max_workers, "pending": pending, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    max_body_bytes = 512 * 1024 * 1024
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, handler):
+        try:
+            status, payload = handler()
+        except ServiceError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._send(status, payload)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        return parts, parse_qs(url.query)
+
+    def do_GET(self):
+        def handle():
+            parts, query = self._route()
+            service = self.server.service
+            if parts == ["health"]:
+                return 200, service.health()
+            if parts == ["jobs"]:
+                return 200, {"jobs": service.list_jobs()}
+            if len(parts) == 2 and parts[0] == "jobs":
+                try:
+                    wait = float(query.get("wait", ["0"])[0])
+                except ValueError:
+                    raise ServiceError(400, "'wait' must be a number of seconds")
+                return 200, service.status(parts[1], wait=min(max(wait, 0.0), 300.0))
+            raise ServiceError(404, f"Not found: {self.path}")
+        self._dispatch(handle)
+
+    def do_POST(self):
+        def handle():
+            parts, _ = self._route()
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > self.max_body_bytes:
+                self.close_connection = True
+                raise ServiceError(413, "Request body too large")
+            body = self.rfile.read(length)
+            if parts != ["jobs"]:
+                raise ServiceError(404, f"Not found: {self.path}")
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError as e:
+                raise ServiceError(400, f"Invalid JSON: {e}")
+            return 202, self.server.service.submit(request)
+        self._dispatch(handle)
+
+    def do_DELETE(self):
+        def handle():
+            parts, _ = self._route()
+            if len(parts) == 2 and parts[0] == "jobs":
+                return 200, self.server.service.cancel(parts[1])
+            raise ServiceError(404, f"Not found: {self.path}")
+        self._dispatch(handle)
+
+
+def make_server(service, host="127.0.0.1", port=8765, verbose=False):
+    """HTTP server bound to host:port (port 0 picks a free one, see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m core.service", description="Local recording validation service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--master", help="master config JSON used for 'config' stems")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--max-pending", type=int, default=32)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = ValidationService(args.master, max_workers=args.workers, max_pending=args.max_pending)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,315 @@
+"""
+Distributed batch mode: a coordinator puts the recordings of a folder into an
+SQLite work queue on a shared filesystem, and any number of worker processes on
+any number of hosts claim files, validate them with the per-file batch logic
+(check_file) and store the result entries back in the queue.
+
+A claim is a lease: a worker keeps renewing the leases of the files it is
+checking; if it crashes, its leases run out and the files are handed to
+another worker (up to max_attempts claims per file, then reported as ERROR).
+The master config is copied into the queue when the folder is enqueued, so
+workers only need access to the queue file and the recordings.
+
+    python -m core.work_queue enqueue queue.db <folder> --master master_config.json
+    python -m core.work_queue work queue.db [--root <folder as mounted here>]   (on every node)
+    python -m core.work_queue status queue.db
+    python -m core.work_queue collect queue.db history.db   (into a ResultsStore)
+
+The queue uses SQLite's default rollback journal (WAL needs shared memory and
+does not work across hosts) and short write transactions.
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from core.batch_processor import PlanCache, check_file, config_hash, new_result_entry
+from core.logic import InspectorLogic
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rel_path TEXT UNIQUE NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(state, lease_until);
+"""
+
+STATES = ["pending", "leased", "done", "failed"]
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue of recordings with leases.
+    lease_seconds: how long a claim lasts without renewal.
+    max_attempts: claims per file before it is given up as failed.
+    """
+    def __init__(self, path, lease_seconds=120.0, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock() # The lease renewal thread shares the connection
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, fn):
+        """Runs fn(conn) in an immediate (write-locked) transaction."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    # --- Coordinator ---
+
+    def enqueue_folder(self, folder_path, inspector_logic, fail_fast=False, collect_intervals=False):
+        """
+        Adds every recording under folder_path (paths stored relative to it) and
+        snapshots the master config and batch options. Files already queued are
+        kept as they are, so enqueuing again only adds new files. Returns the number added.
+        """
+        rel_paths = []
+        for root, dirs, files in os.walk(folder_path):
+            for file in files:
+                if file.lower().endswith(('.xlsx', '.xls', '.csv')):
+                    rel_paths.append(os.path.relpath(os.path.join(root, file), folder_path))
+        rel_paths.sort()
+        meta = {
+            "folder": os.path.abspath(folder_path),
+            "master_config": json.dumps(inspector_logic.master_config_data),
+            "config_hash": config_hash(inspector_logic.master_config_data),
+            "fail_fast": json.dumps(bool(fail_fast)),
+            "collect_intervals": json.dumps(bool(collect_intervals)),
+        }
+
+        def enqueue(conn):
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+            before = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            conn.executemany("INSERT OR IGNORE INTO tasks (rel_path) VALUES (?)", [(p,) for p in rel_paths])
+            return conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - before
+        return self._write(enqueue)
+
+    def meta(self):
+        with self._lock:
+            return dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def counts(self):
+        """Number of files per state (see STATES)."""
+        with self._lock:
+            rows = dict(self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        return {state: rows.get(state, 0) for state in STATES}
+
+    def results(self):
+        """Result entries of finished files (done or failed), in queue order."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT result FROM tasks WHERE state IN ('done', 'failed') ORDER BY task_id").fetchall()
+        return [json.loads(result) for (result,) in rows]
+
+    def collect(self, results_store):
+        """Copies the finished results into a ResultsStore as one run. Returns its run_id."""
+        meta = self.meta()
+        run_id = results_store.begin_run(meta.get("folder", ""), meta.get("config_hash", ""))
+        results = self.results()
+        for entry in results:
+            results_store.add_result(run_id, entry)
+        results_store.finish_run(run_id, len(results))
+        return run_id
+
+    # --- Workers ---
+
+    def claim(self, worker_id, limit=1):
+        """
+        Leases up to 'limit' files that are pending or whose lease expired.
+        Files that used up max_attempts are marked failed instead.
+        Returns [(task_id, rel_path)].
+        """
+        def claim(conn):
+            now = time.time()
+            expired = conn.execute(
+                "SELECT task_id, rel_path, attempts FROM tasks WHERE state = 'leased' AND lease_until < ?",
+                (now,)).fetchall()
+            for task_id, rel_path, attempts in expired:
+                if attempts >= self.max_attempts:
+                    entry = _error_entry(rel_path, f"Gave up after {attempts} attempts (worker lease expired)")
+                    conn.execute("UPDATE tasks SET state = 'failed', worker = NULL, result = ?, finished_at = ? "
+                                 "WHERE task_id = ?", (json.dumps(entry), now, task_id))
+
+            rows = conn.execute(
+                "SELECT task_id, rel_path FROM tasks "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY task_id LIMIT ?", (now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE task_id = ?", [(worker_id, now + self.lease_seconds, task_id) for task_id, _ in rows])
+            return rows
+        return self._write(claim)
+
+    def renew(self, worker_id, task_ids):
+        """Extends the leases this worker still holds on task_ids."""
+        if not task_ids:
+            return
+        until = time.time() + self.lease_seconds
+        self._write(lambda conn: conn.executemany(
+            "UPDATE tasks SET lease_until = ? WHERE task_id = ? AND worker = ? AND state = 'leased'",
+            [(until, task_id, worker_id) for task_id in task_ids]))
+
+    def complete(self, worker_id, task_id, entry):
+        """
+        Stores the result of a leased file. Returns False if the lease was lost
+        (expired and claimed by another worker), in which case the result is dropped.
+        """
+        def complete(conn):
+            cur = conn.execute(
+                "UPDATE tasks SET state = 'done', result = ?, finished_at = ?, lease_until = NULL "
+                "WHERE task_id = ? AND worker = ? AND state = 'leased'",
+                (json.dumps(entry), time.time(), task_id, worker_id))
+            return cur.rowcount == 1
+        return self._write(complete)
+
+    def unfinished(self):
+        """Number of files still pending or leased."""
+        counts = self.counts()
+        return counts["pending"] + counts["leased"]
+
+
+def _error_entry(rel_path, details):
+    entry = new_result_entry(rel_path)
+    entry.update(status="ERROR", details=details)
+    return entry
+
+
+class _LeaseKeeper(threading.Thread):
+    """Renews the worker's current leases at a third of the lease time."""
+    def __init__(self, queue, worker_id):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.worker_id = worker_id
+        self.task_ids = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.renew(self.worker_id, list(self.task_ids))
+            except sqlite3.Error:
+                pass # Retried on the next tick; the lease is not lost yet
+
+
+def run_worker(queue_path, worker_id=None, root=None, batch_size=1, poll_interval=2.0,
+               lease_seconds=120.0, max_attempts=3, stop_when_done=True):
+    """
+    Claims, checks and reports files until the queue has no unfinished files
+    (or forever if stop_when_done is False; files leased by others are waited for,
+    since their lease may still expire).
+    root: folder the recordings are found under on this host (default: the enqueued folder).
+    Returns the number of files this worker completed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    completed = 0
+    with WorkQueue(queue_path, lease_seconds, max_attempts) as queue:
+        meta = queue.meta()
+        folder = root or meta["folder"]
+        logic = InspectorLogic()
+        logic.master_config_data = json.loads(meta.get("master_config", "{}"))
+        fail_fast = json.loads(meta.get("fail_fast", "false"))
+        collect_intervals = json.loads(meta.get("collect_intervals", "false"))
+        plan_cache = PlanCache()
+
+        keeper = _LeaseKeeper(queue, worker_id)
+        keeper.start()
+        try:
+            while True:
+                claimed = queue.claim(worker_id, batch_size)
+                if not claimed:
+                    if stop_when_done and queue.unfinished() == 0:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                keeper.task_ids = [task_id for task_id, _ in claimed]
+                for task_id, rel_path in claimed:
+                    stem = os.path.splitext(os.path.basename(rel_path))[0]
+                    entry = check_file(os.path.join(folder, rel_path), logic.get_config_for_file(stem, rel_path),
+                                       rel_path, fail_fast, collect_intervals, plan_cache=plan_cache)
+                    entry["worker"] = worker_id
+                    if queue.complete(worker_id, task_id, entry):
+                        completed += 1
+                    keeper.task_ids = [t for t in keeper.task_ids if t != task_id]
+        finally:
+            keeper.stopped.set()
+            keeper.join()
+    return completed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m core.work_queue", description="Distributed batch work queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("enqueue", help="queue the recordings of a folder")
+    p.add_argument("queue")
+    p.add_argument("folder")
+    p.add_argument("--master", required=True, help="master config JSON")
+    p.add_argument("--fail-fast", action="store_true")
+    p.add_argument("--collect-intervals", action="store_true")
+    p = sub.add_parser("work", help="check queued files until none are left")
+    p.add_argument("queue")
+    p.add_argument("--root", help="folder the recordings are mounted at on this host")
+    p.add_argument("--worker-id")
+    p.add_argument("--batch-size", type=int, default=1)
+    p.add_argument("--lease", type=float, default=120.0, help="lease seconds")
+    p.add_argument("--forever", action="store_true", help="keep polling when the queue is empty")
+    p = sub.add_parser("status", help="files per state")
+    p.add_argument("queue")
+    p = sub.add_parser("collect", help="copy finished results into a results history database")
+    p.add_argument("queue")
+    p.add_argument("history")
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        logic = InspectorLogic()
+        logic.load_master_config(args.master)
+        with WorkQueue(args.queue) as queue:
+            added = queue.enqueue_folder(args.folder, logic, args.fail_fast, args.collect_intervals)
+            print(f"Queued {added} new file(s); {queue.counts()}")
+    elif args.command == "work":
+        done = run_worker(args.queue, args.worker_id, args.root, args.batch_size,
+                          lease_seconds=args.lease, stop_when_done=not args.forever)
+        print(f"Completed {done} file(s)")
+    elif args.command == "status":
+        with WorkQueue(args.queue) as queue:
+            print(queue.counts())
+    elif args.command == "collect":
+        from core.results_store import ResultsStore
+        with WorkQueue(args.queue) as queue, ResultsStore(args.history) as store:
+            run_id = queue.collect(store)
+            print(f"Stored {len(queue.results())} result(s) as run {run_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
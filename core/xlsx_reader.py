@@ -0,0 +1,388 @@
+"""
+Streaming .xlsx reader that fills typed NumPy columns directly.
+
+pd.read_excel goes through openpyxl, which builds a cell object per value and
+then an object DataFrame before inferring dtypes. Recordings are plain grids of
+numbers with a header row, so this reader instead decompresses the first
+worksheet in chunks, extracts cells with one regular expression per chunk and
+writes them straight into preallocated 2D buffers (value + cell kind). Columns
+then get the dtype pandas would have inferred (int64 / float64 / bool / object).
+
+Anything it does not model exactly (date-formatted cells, error cells, numbers
+or booleans stored as text, missing or duplicate headers, unusual cell markup)
+raises XlsxUnsupported, and the
+caller falls back to pd.read_excel.
+"""
+import re
+import html
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+import numpy as np
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# <c r="B12" s="1" t="s"><v>3</v></c>, optionally with a formula or an inline string
+_CELL_RE = re.compile(
+    rb'<c r="([A-Z]+)(\d+)"((?: [\w:]+="[^"]*")*) ?'
+    rb'(?:/>|>(?:<f[^>]*/>|<f[^>]*>[^<]*</f>)?(?:<v>([^<]*)</v>)?(?:<is>(.*?)</is>)?</c>)',
+    re.DOTALL)
+_ATTR_RE = re.compile(rb'([\w:]+)="([^"]*)"')
+_INLINE_TEXT_RE = re.compile(rb'<t[^>]*>([^<]*)</t>')
+_DIMENSION_RE = re.compile(rb'<dimension ref="[A-Z]*\d*:?([A-Z]+)(\d+)"')
+
+# Cell kinds stored next to the value buffer
+_EMPTY, _NUMBER, _SHARED, _TEXT, _BOOL = 0, 1, 2, 3, 4
+
+# Strings pd.read_excel and pd.read_csv turn into NaN by default
+NA_STRINGS = frozenset(["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+                        "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+                        "nan", "null"])
+
+# Strings pandas turns into booleans
+BOOL_STRINGS = frozenset(["True", "TRUE", "true", "False", "FALSE", "false"])
+
+# Built-in number formats that openpyxl reads as dates/times
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+_DATE_TOKEN_RE = re.compile(r'(\[[^\]]*\]|"[^"]*"|\\.)')
+
+
+class XlsxUnsupported(Exception):
+    """The workbook uses something this reader does not handle; use pd.read_excel."""
+
+
+def _column_index(letters):
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ch - 64)
+    return idx - 1
+
+
+def _first_sheet_path(zf):
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheet = workbook.find(f"{_NS}sheets/{_NS}sheet")
+    if sheet is None:
+        raise XlsxUnsupported("workbook has no sheets")
+    rel_id = sheet.get(f"{_REL_NS}id")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise XlsxUnsupported("first sheet not found in workbook relationships")
+
+
+def _shared_strings(zf, limit=None):
+    """The shared string table, or only its first 'limit' entries."""
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings = []
+    for _, elem in ET.iterparse(zf.open("xl/sharedStrings.xml")):
+        if elem.tag == f"{_NS}si":
+            # Plain <t> or rich-text runs <r><t>; phonetic runs (<rPh>) are not part of the value
+            parts = [t.text or "" for t in elem.findall(f"{_NS}t")]
+            parts += [t.text or "" for t in elem.findall(f"{_NS}r/{_NS}t")]
+            strings.append("".join(parts))
+            elem.clear()
+            if limit is not None and len(strings) >= limit:
+                break
+    return strings
+
+
+def _date_styles(zf):
+    """Indexes into cellXfs whose number format openpyxl would turn into dates."""
+    if "xl/styles.xml" not in zf.namelist():
+        return set()
+    styles = ET.fromstring(zf.read("xl/styles.xml"))
+    date_formats = set(_BUILTIN_DATE_FORMATS)
+    for fmt in styles.iter(f"{_NS}numFmt"):
+        code = _DATE_TOKEN_RE.sub("", fmt.get("formatCode", "")).lower()
+        if any(token in code for token in ("d", "m", "y", "h", "s")) and "general" not in code:
+            date_formats.add(int(fmt.get("numFmtId")))
+    cell_xfs = styles.find(f"{_NS}cellXfs")
+    if cell_xfs is None:
+        return set()
+    return {i for i, xf in enumerate(cell_xfs.findall(f"{_NS}xf"))
+            if int(xf.get("numFmtId", 0)) in date_formats}
+
+
+class _Buffers:
+    """Preallocated (rows x columns) value and kind buffers, grown by doubling if needed."""
+
+    def __init__(self, n_rows, n_cols):
+        self.values = np.full((max(n_rows, 1), max(n_cols, 1)), np.nan)
+        self.kinds = np.zeros(self.values.shape, dtype=np.int8)
+
+    def ensure(self, n_rows, n_cols):
+        rows, cols = self.values.shape
+        if n_rows <= rows and n_cols <= cols:
+            return
+        shape = (max(rows, n_rows if n_rows <= rows else max(n_rows, rows * 2)),
+                 max(cols, n_cols))
+        values = np.full(shape, np.nan)
+        kinds = np.zeros(shape, dtype=np.int8)
+        values[:rows, :cols] = self.values
+        kinds[:rows, :cols] = self.kinds
+        self.values, self.kinds = values, kinds
+
+
+class _SheetParser:
+    def __init__(self, date_styles, n_rows_hint, n_cols_hint):
+        self.date_styles = date_styles
+        self.attr_cache = {}
+        self.col_cache = {}
+        self.header = {} # column index -> header cell (kind, raw value)
+        self.texts = [] # Inline/formula strings; their index is stored in the value buffer
+        self.text_index = {} # raw cell bytes -> index into texts (as bytes)
+        self.buffers = _Buffers(n_rows_hint, n_cols_hint)
+        self.n_rows = 0
+        self.n_cols = 0
+
+    def _column(self, letters):
+        idx = self.col_cache[letters] = _column_index(letters)
+        return idx
+
+    def _attrs(self, raw):
+        parsed = self.attr_cache.get(raw)
+        if parsed is None:
+            attrs = dict(_ATTR_RE.findall(raw))
+            style = int(attrs.get(b"s", 0))
+            cell_type = attrs.get(b"t", b"n")
+            if cell_type in (b"e", b"d"):
+                raise XlsxUnsupported("error or ISO date cells")
+            if cell_type == b"n" and style in self.date_styles:
+                raise XlsxUnsupported("date formatted cells")
+            parsed = {b"n": _NUMBER, b"s": _SHARED, b"b": _BOOL,
+                      b"str": _TEXT, b"inlineStr": _TEXT}.get(cell_type)
+            if parsed is None:
+                raise XlsxUnsupported(f"cell type {cell_type!r}")
+            self.attr_cache[raw] = parsed
+        return parsed
+
+    def feed(self, chunk):
+        cells = _CELL_RE.findall(chunk)
+        if len(cells) != chunk.count(b"<c ") + chunk.count(b"<c>"):
+            raise XlsxUnsupported("unrecognised cell markup")
+        if not cells:
+            return
+        letters, rows, attrs, values, inline = zip(*cells)
+
+        # Few distinct column letters and attribute strings exist, so dict lookups beat sorting
+        col_cache, attr_cache = self.col_cache, self.attr_cache
+        cols = np.array([col_cache[l] if l in col_cache else self._column(l) for l in letters], dtype=np.int64)
+        kinds = np.array([attr_cache[a] if a in attr_cache else self._attrs(a) for a in attrs], dtype=np.int8)
+        rows = np.array(rows).astype(np.int64)
+
+        values = list(values)
+        text_index = self.text_index
+        for i in np.flatnonzero(kinds == _TEXT):
+            raw = inline[i] or values[i]
+            idx = text_index.get(raw)
+            if idx is None:
+                text = b"".join(_INLINE_TEXT_RE.findall(raw)) if inline[i] else raw
+                self.texts.append(html.unescape(text.decode("utf-8")))
+                idx = text_index[raw] = b"%d" % (len(self.texts) - 1)
+            values[i] = idx
+        # Booleans are stored as 0/1, shared strings as their table index
+        values = np.array(values)
+        has_value = values != b""
+        header = rows == 1
+        for i in np.flatnonzero(header & has_value):
+            self.header[int(cols[i])] = (int(kinds[i]), values[i])
+
+        keep = ~header & has_value
+        if not keep.any():
+            return
+        rows, cols, kinds = rows[keep] - 2, cols[keep], kinds[keep]
+        self.n_rows = max(self.n_rows, int(rows.max()) + 1)
+        self.n_cols = max(self.n_cols, int(cols.max()) + 1)
+        self.buffers.ensure(self.n_rows, self.n_cols)
+        self.buffers.values[rows, cols] = values[keep].astype(np.float64)
+        self.buffers.kinds[rows, cols] = kinds
+
+
+def _parsed_by_pandas(text):
+    """pandas infers a number or boolean from text like this."""
+    if text in BOOL_STRINGS:
+        return True
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _filled_rows(values, kinds, shared, texts):
+    """Row count without the trailing rows whose cells are all blank or "" (openpyxl trims those)."""
+    filled = kinds != _EMPTY
+    for kind, table in ((_SHARED, shared), (_TEXT, texts)):
+        empty = [i for i, text in enumerate(table) if text == ""]
+        cells = kinds == kind
+        if empty and cells.any():
+            filled[cells] = ~np.isin(values[cells], empty)
+    rows = np.flatnonzero(filled.any(axis=1))
+    return int(rows[-1]) + 1 if len(rows) else 0
+
+
+def _convert_column(values, kinds, shared, texts):
+    """One column's value/kind buffers -> the array pd.read_excel would produce."""
+    n = len(values)
+    if n and (kinds == _NUMBER).all():
+        if np.array_equal(values, np.floor(values)) and np.isfinite(values).all():
+            return values.astype(np.int64)
+        return values.copy()
+
+    strings = (kinds == _SHARED) | (kinds == _TEXT)
+    if strings.any():
+        shared_arr = np.array(shared, dtype=object)
+        text_arr = np.array(texts, dtype=object)
+        strs = np.empty(n, dtype=object)
+        is_shared = kinds == _SHARED
+        strs[is_shared] = shared_arr[values[is_shared].astype(np.int64)]
+        is_text = kinds == _TEXT
+        strs[is_text] = text_arr[values[is_text].astype(np.int64)]
+        na = strings & np.isin(strs, list(NA_STRINGS))
+        kinds = np.where(na, _EMPTY, kinds)
+        strings &= ~na
+        if any(_parsed_by_pandas(text) for text in set(strs[strings].tolist())):
+            raise XlsxUnsupported("numbers or booleans stored as text")
+
+    present = kinds != _EMPTY
+    kinds_present = set(np.unique(kinds[present]).tolist())
+    if not kinds_present or kinds_present == {_NUMBER}:
+        out = values.copy()
+        out[~present] = np.nan
+        return out
+    if _BOOL in kinds_present:
+        if kinds_present == {_BOOL} and present.all():
+            return values.astype(bool)
+        # pandas coerces booleans mixed with numbers/blanks in ways not worth mirroring
+        raise XlsxUnsupported("boolean column with other values")
+
+    # Mixed or string columns stay object, holding what openpyxl/pandas would
+    out = np.full(n, np.nan, dtype=object)
+    numbers = kinds == _NUMBER
+    if numbers.any():
+        nums = values[numbers]
+        out[numbers] = [int(v) if v.is_integer() else v for v in nums.tolist()]
+    if strings.any():
+        out[strings] = strs[strings]
+    return out
+
+
+def read_xlsx(file_path, columns=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Reads the first worksheet of an .xlsx file with row 1 as header.
+    columns: optional iterable of header names; only those columns are converted.
+    Returns an ordered dict {header: np.ndarray}.
+    Raises XlsxUnsupported for workbooks that need pd.read_excel.
+    """
+    try:
+        zf = zipfile.ZipFile(file_path)
+    except zipfile.BadZipFile as e:
+        raise XlsxUnsupported(str(e))
+
+    with zf:
+        sheet_path = _first_sheet_path(zf)
+        shared = _shared_strings(zf)
+        date_styles = _date_styles(zf)
+
+        parser = None
+        pending = b""
+        with zf.open(sheet_path) as sheet:
+            while True:
+                data = sheet.read(chunk_bytes)
+                buf = pending + data
+                # Only hand complete rows to the parser
+                cut = len(buf) if not data else buf.rfind(b"</row>")
+                if parser is None:
+                    dim = _DIMENSION_RE.search(buf[:4096])
+                    n_rows, n_cols = (int(dim.group(2)) - 1, _column_index(dim.group(1)) + 1) if dim else (1024, 64)
+                    parser = _SheetParser(date_styles, n_rows, n_cols)
+                if cut < 0:
+                    pending = buf
+                else:
+                    parser.feed(buf[:cut])
+                    pending = buf[cut:]
+                if not data:
+                    break
+
+    header = parser.header
+    n_cols = max([parser.n_cols] + [c + 1 for c in header])
+    names = []
+    for c in range(n_cols):
+        cell = header.get(c)
+        if cell is None or cell[0] not in (_SHARED, _TEXT):
+            raise XlsxUnsupported("missing or non-text header")
+        kind, raw = cell
+        names.append(shared[int(raw)] if kind == _SHARED else parser.texts[int(raw)])
+    if len(set(names)) != len(names) or any(name in NA_STRINGS for name in names):
+        raise XlsxUnsupported("duplicate or empty header names")
+
+    wanted = None if columns is None else set(columns)
+    result = {}
+    parser.buffers.ensure(parser.n_rows, n_cols)
+    values, kinds = parser.buffers.values, parser.buffers.kinds
+    n_rows = _filled_rows(values[:parser.n_rows, :n_cols], kinds[:parser.n_rows, :n_cols], shared, parser.texts)
+    for c, name in enumerate(names):
+        if wanted is not None and name not in wanted:
+            continue
+        result[name] = _convert_column(values[:n_rows, c], kinds[:n_rows, c], shared, parser.texts)
+    return result
+
+
+def read_xlsx_header(file_path):
+    """
+    Header names of the first worksheet and its frame count (rows below the
+    header according to the sheet's <dimension>, None if it has none).
+    Only the start of the sheet and the shared strings it uses are read.
+    """
+    try:
+        zf = zipfile.ZipFile(file_path)
+    except zipfile.BadZipFile as e:
+        raise XlsxUnsupported(str(e))
+
+    with zf:
+        sheet_path = _first_sheet_path(zf)
+        buf = b""
+        with zf.open(sheet_path) as sheet:
+            while b"</row>" not in buf:
+                data = sheet.read(64 * 1024)
+                if not data:
+                    break
+                buf += data
+        end = buf.find(b"</row>")
+        if end < 0:
+            return [], 0
+
+        dim = _DIMENSION_RE.search(buf[:4096])
+        n_frames = int(dim.group(2)) - 1 if dim else None
+
+        row = buf[:end]
+        cells = _CELL_RE.findall(row)
+        if any(r != b"1" for _, r, _, _, _ in cells):
+            raise XlsxUnsupported("header is not in row 1")
+        shared_idx = []
+        names = []
+        for letters, _, attrs, value, inline in cells:
+            cell_type = dict(_ATTR_RE.findall(attrs)).get(b"t", b"n")
+            if cell_type == b"s":
+                shared_idx.append(len(names))
+                names.append(int(value))
+            elif cell_type == b"inlineStr":
+                names.append(html.unescape(b"".join(_INLINE_TEXT_RE.findall(inline)).decode("utf-8")))
+            elif cell_type == b"str":
+                names.append(html.unescape(value.decode("utf-8")))
+            else:
+                raise XlsxUnsupported("non-text header")
+        if shared_idx:
+            shared = _shared_strings(zf, limit=max(names[i] for i in shared_idx) + 1)
+            for i in shared_idx:
+                names[i] = shared[names[i]]
+    return names, n_frames
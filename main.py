@@ -1,14 +1,65 @@
 import sys
-from PyQt6.QtWidgets import QApplication
-from ui.main_window import MainWindow
-from ui.styles import STYLESHEET
+import time
+
+# Heavy packages that should only be imported on first use, not at startup
+LAZY_MODULES = ["pandas", "openpyxl", "pyqtgraph", "ui.batch_dialog", "ui.macro_dialog", "ui.macro_sweep_dialog",
+                "ui.or_rule_dialog", "ui.implies_rule_dialog", "ui.diff_dialog"]
+
+
+class StartupProfiler:
+    """Collects wall time and newly imported module counts for each startup stage."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.last_modules = len(sys.modules)
+        self.stages = []
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last, len(sys.modules) - self.last_modules))
+        self.last = now
+        self.last_modules = len(sys.modules)
+
+    def report(self):
+        lines = ["Startup profile:"]
+        for stage, seconds, modules in self.stages:
+            lines.append(f"  {stage:<28} {seconds * 1000:8.1f} ms  (+{modules} modules)")
+        lines.append(f"  {'total':<28} {(self.last - self.start) * 1000:8.1f} ms")
+        loaded = [m for m in LAZY_MODULES if m in sys.modules]
+        lines.append(f"  loaded before first paint: {', '.join(loaded) if loaded else 'none of ' + ', '.join(LAZY_MODULES)}")
+        return "\n".join(lines)
+
 
 def main():
+    profile = "--profile-startup" in sys.argv
+    if profile:
+        sys.argv.remove("--profile-startup")
+    profiler = StartupProfiler()
+
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer
+    profiler.mark("import PyQt6")
+    from ui.main_window import MainWindow
+    from ui.styles import STYLESHEET
+    profiler.mark("import ui.main_window")
+
     app = QApplication(sys.argv)
     app.setStyleSheet(STYLESHEET)
-    
+    profiler.mark("QApplication")
+
     window = MainWindow()
+    profiler.mark("MainWindow()")
     window.show()
+    profiler.mark("show()")
+
+    if profile:
+        # Runs after the first pass of the event loop, i.e. once the window has been painted
+        def finish():
+            profiler.mark("first paint")
+            print(profiler.report())
+            app.quit()
+        QTimer.singleShot(0, finish)
+
     sys.exit(app.exec())
 
 if __name__ == "__main__":
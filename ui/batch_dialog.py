@@ -1,8 +1,13 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, 
                              QLabel, QFileDialog, QTableWidget, QTableWidgetItem, 
-                             QProgressBar, QHeaderView, QMessageBox)
+                             QProgressBar, QHeaderView, QMessageBox, QTabWidget,
+                             QWidget, QComboBox, QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from core.batch_processor import BatchProcessor
+from core.batch_analytics import BatchAnalytics, STATUSES
+from core.results_store import ResultsStore
+from core.result_sinks import open_sink, RESULT_FIELDS
+from core.batch_scheduler import ORDER_WALK, ORDER_COST, ORDER_FEEDBACK
 import os
 import csv
 
@@ -10,17 +15,45 @@ import csv
 
 class BatchWorker(QThread):
     progress = pyqtSignal(int, int, dict) # changed str to dict for result_entry
+    failed = pyqtSignal(str) # Emitted before 'finished' when the batch could not complete
     finished = pyqtSignal(list)
     
-    def __init__(self, folder, logic):
+    def __init__(self, folder, logic, history_path=None, sink_path=None, resume=False, order=ORDER_WALK,
+                 collect_intervals=False):
         super().__init__()
         self.folder = folder
         self.logic = logic
+        self.history_path = history_path
+        self.sink_path = sink_path
+        self.resume = resume
+        self.order = order
+        self.collect_intervals = collect_intervals
+        # The in-process engine: the pipelined one forks a process pool, which a Qt
+        # process with running threads must not do
         self.processor = BatchProcessor()
         
     def run(self):
-        results = self.processor.run_batch(self.folder, self.logic, self.emit_progress)
-        self.finished.emit(results)
+        # 'finished' is always emitted, so the dialog never stays stuck with Run disabled
+        results = []
+        store = sink = None
+        try:
+            # SQLite connections belong to the thread that opens them
+            store = ResultsStore(self.history_path) if self.history_path else None
+            sink = open_sink(self.sink_path, resume=self.resume) if self.sink_path else None
+            results = self.processor.run_batch(self.folder, self.logic, self.emit_progress,
+                                               collect_intervals=self.collect_intervals,
+                                               results_store=store, result_sink=sink, resume=self.resume,
+                                               order=self.order)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            for resource in (store, sink):
+                try:
+                    if resource is not None:
+                        resource.close()
+                except Exception as e:
+                    self.failed.emit(f"Closing {self.history_path if resource is store else self.sink_path}: {e}")
+            self.finished.emit(results)
         
     def emit_progress(self, current, total, result):
         self.progress.emit(current, total, result)
@@ -46,6 +79,30 @@ class BatchResultDialog(QDialog):
         top_layout.addWidget(select_btn)
         top_layout.addWidget(self.folder_label)
         top_layout.addStretch()
+        self.history_check = QCheckBox("Save to history")
+        self.history_check.setToolTip("Append results to <master config>_history.sqlite next to the master config")
+        self.history_check.setChecked(True)
+        top_layout.addWidget(self.history_check)
+        self.intervals_check = QCheckBox("Record fail intervals")
+        self.intervals_check.setToolTip("Evaluate every frame so the history keeps the time intervals "
+                                        "each rule failed in (slower than verdicts only)")
+        self.history_check.toggled.connect(self.intervals_check.setEnabled)
+        top_layout.addWidget(self.intervals_check)
+        self.order_combo = QComboBox()
+        # Display name -> batch_scheduler order
+        self.order_options = {
+            "Folder order": ORDER_WALK,
+            "Largest first": ORDER_COST,
+            "Failing / changed first": ORDER_FEEDBACK,
+        }
+        self.order_combo.addItems(list(self.order_options.keys()))
+        self.order_combo.setToolTip("Largest first shortens the run; failing / changed first "
+                                    "(uses the history) shows regressions early")
+        top_layout.addWidget(self.order_combo)
+        self.stream_check = QCheckBox("Stream to file")
+        self.stream_check.setToolTip("Write each result to a CSV/JSONL file as soon as it is checked; "
+                                     "an existing file can be resumed")
+        top_layout.addWidget(self.stream_check)
         top_layout.addWidget(self.run_btn)
         
         self.layout.addLayout(top_layout)
@@ -68,7 +125,12 @@ class BatchResultDialog(QDialog):
         self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Fixed)
         self.table.setColumnWidth(4, 80)
-        self.layout.addWidget(self.table)
+        
+        self.tabs = QTabWidget()
+        self.tabs.addTab(self.table, "Files")
+        self.tabs.addTab(self._create_summary_tab(), "Summary")
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self.layout.addWidget(self.tabs)
         
         # Export Button
         export_layout = QHBoxLayout()
@@ -77,11 +139,51 @@ class BatchResultDialog(QDialog):
         self.export_btn.clicked.connect(self.export_results)
         self.export_btn.setEnabled(False)
         export_layout.addWidget(self.export_btn)
+        self.export_summary_btn = QPushButton("Export Summary (CSV)")
+        self.export_summary_btn.clicked.connect(self.export_summary)
+        self.export_summary_btn.setEnabled(False)
+        export_layout.addWidget(self.export_summary_btn)
         self.layout.addLayout(export_layout)
         
         self.current_results = []
+        self.run_errors = []
         self.selected_folder = None
         self.file_row_map = {} # Map filename to row index
+        self.analytics = BatchAnalytics()
+        
+    def _create_summary_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        
+        group_layout = QHBoxLayout()
+        group_layout.addWidget(QLabel("Group by:"))
+        self.group_combo = QComboBox()
+        # Display name -> result fields
+        self.group_options = {
+            "SW Version": ["sw_ver"],
+            "Vehicle": ["vehicle"],
+            "Category": ["categories"],
+            "TC Number": ["tc_number"],
+            "Test Date": ["test_date"],
+            "Vehicle + SW Version": ["vehicle", "sw_ver"],
+            "SW Version + Category": ["sw_ver", "categories"],
+        }
+        self.group_combo.addItems(list(self.group_options.keys()))
+        self.group_combo.currentIndexChanged.connect(self.refresh_summary)
+        group_layout.addWidget(self.group_combo)
+        group_layout.addStretch()
+        layout.addLayout(group_layout)
+        
+        self.summary_table = QTableWidget()
+        self.summary_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        layout.addWidget(self.summary_table, 1)
+        
+        layout.addWidget(QLabel("Rule failures:"))
+        self.rule_fail_table = QTableWidget()
+        self.rule_fail_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.rule_fail_table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.rule_fail_table, 1)
+        return tab
         
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
@@ -121,13 +223,46 @@ class BatchResultDialog(QDialog):
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.status_label.setText("Starting...")
+        self.analytics.clear()
+        self.export_summary_btn.setEnabled(False)
         
         # Pass inspector logic from main window
-        self.worker = BatchWorker(self.selected_folder, self.parent().inspector_logic)
+        self.history_path = self.get_history_path() if self.history_check.isChecked() else None
+        sink_path, resume = None, False
+        if self.stream_check.isChecked():
+            sink_path, resume = self._choose_sink()
+            if sink_path is None:
+                self.run_btn.setEnabled(True)
+                self.progress_bar.setVisible(False)
+                self.status_label.setText("")
+                return
+        collect_intervals = self.history_path is not None and self.intervals_check.isChecked()
+        self.worker = BatchWorker(self.selected_folder, self.parent().inspector_logic, self.history_path,
+                                  sink_path, resume, self.order_options[self.order_combo.currentText()],
+                                  collect_intervals)
+        self.run_errors = []
         self.worker.progress.connect(self.update_progress)
+        self.worker.failed.connect(self.run_errors.append)
         self.worker.finished.connect(self.on_finished)
         self.worker.start()
         
+    def _choose_sink(self):
+        """Asks for the streaming output file. Returns (path, resume) or (None, False) if cancelled."""
+        file_name, _ = QFileDialog.getSaveFileName(self, "Stream Results To", "batch_results.csv",
+                                                   "CSV Files (*.csv);;JSON Lines (*.jsonl)",
+                                                   options=QFileDialog.Option.DontConfirmOverwrite)
+        if not file_name:
+            return None, False
+        if os.path.exists(file_name) and os.path.getsize(file_name) > 0:
+            answer = QMessageBox.question(
+                self, "Resume", "The file already has results.\n\n"
+                "Yes: resume (skip the files already in it)\nNo: overwrite it",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
+            if answer == QMessageBox.StandardButton.Cancel:
+                return None, False
+            return file_name, answer == QMessageBox.StandardButton.Yes
+        return file_name, False
+
     def update_progress(self, current, total, result):
         self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(current)
@@ -137,6 +272,11 @@ class BatchResultDialog(QDialog):
         if result['file'] in self.file_row_map:
             row = self.file_row_map[result['file']]
             self._update_table_row(row, result)
+        
+        # Aggregates are updated per result; the table only while it is visible
+        self.analytics.add(result)
+        if self.tabs.currentIndex() == 1 and (current % 25 == 0 or current == total):
+            self.refresh_summary()
             
     def _update_table_row(self, row, res):
         status_item = QTableWidgetItem(res['status'])
@@ -144,8 +284,10 @@ class BatchResultDialog(QDialog):
             status_item.setForeground(Qt.GlobalColor.green)
         elif res['status'] == 'FAIL':
             status_item.setForeground(Qt.GlobalColor.red)
-        elif res['status'] == 'NO_CONFIG':
+        elif res['status'] in ('NO_CONFIG', 'EMPTY_RULES'):
             status_item.setForeground(Qt.GlobalColor.darkYellow)
+        elif res['status'] == 'MISSING_TOPICS':
+            status_item.setForeground(Qt.GlobalColor.darkRed)
             
         self.table.setItem(row, 1, status_item)
         self.table.setItem(row, 2, QTableWidgetItem(str(res['fail_count'])))
@@ -159,8 +301,14 @@ class BatchResultDialog(QDialog):
         self.current_results = results # This should match what we updated incrementally
         self.run_btn.setEnabled(True)
         self.progress_bar.setVisible(False)
-        self.status_label.setText(f"Completed. Processed {len(results)} files.")
+        if self.run_errors:
+            self.status_label.setText(f"Batch failed: {self.run_errors[0]}")
+            QMessageBox.critical(self, "Batch Failed", "\n".join(self.run_errors))
+        else:
+            self.status_label.setText(f"Completed. Processed {len(results)} files.{self._history_note()}")
         self.export_btn.setEnabled(True)
+        self.export_summary_btn.setEnabled(True)
+        self.refresh_summary()
         
         # Final pass just in case (optional, since we updated incrementally)
         # self.populate_table(results) 
@@ -179,24 +327,87 @@ class BatchResultDialog(QDialog):
         if file_name:
             try:
                 with open(file_name, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=[
-                        "file", "status", "fail_count", "details", 
-                        "vehicle", "sw_ver", "test_date",
-                        "categories", "tc_number", "note"
-                    ])
+                    writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction='ignore')
                     writer.writeheader()
                     writer.writerows(self.current_results)
                 QMessageBox.information(self, "Success", "Results exported successfully.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save: {e}")
 
+    def get_history_path(self):
+        master_path = self.parent().inspector_logic.master_config_path
+        if not master_path:
+            return None
+        return os.path.splitext(master_path)[0] + "_history.sqlite"
+
+    def _history_note(self):
+        """Short regression summary against the previous recorded run."""
+        if not self.history_path:
+            return ""
+        try:
+            with ResultsStore(self.history_path) as store:
+                # Only runs over the same folder check the same recordings
+                runs = store.runs(limit=2, folder=self.selected_folder)
+                if len(runs) < 2:
+                    return " Saved to history."
+                newly = store.newly_failing_files(runs[1]["run_id"], runs[0]["run_id"])
+            return f" Saved to history; {len(newly)} file(s) newly failing since the previous run."
+        except Exception as e:
+            return f" History unavailable: {e}"
+
+    def on_tab_changed(self, index):
+        if index == 1:
+            self.refresh_summary()
+
+    def current_group_fields(self):
+        return self.group_options[self.group_combo.currentText()]
+
+    def refresh_summary(self):
+        fields = self.current_group_fields()
+        labels = {"sw_ver": "SW Version", "vehicle": "Vehicle", "categories": "Category",
+                  "tc_number": "TC Number", "test_date": "Test Date"}
+        
+        summary = self.analytics.summary(fields)
+        columns = fields + ["total"] + STATUSES + ["pass_rate"]
+        self.summary_table.setColumnCount(len(columns))
+        self.summary_table.setHorizontalHeaderLabels([labels.get(c, c) for c in columns])
+        self.summary_table.setRowCount(len(summary))
+        for i, entry in enumerate(summary):
+            for j, col in enumerate(columns):
+                val = entry[col]
+                text = f"{val * 100:.1f}%" if col == "pass_rate" else (str(val) if val != "" else "(none)")
+                self.summary_table.setItem(i, j, QTableWidgetItem(text))
+        
+        failures = self.analytics.rule_failures(fields)
+        columns = fields + ["failures", "fail_share", "rule"]
+        self.rule_fail_table.setColumnCount(len(columns))
+        self.rule_fail_table.setHorizontalHeaderLabels([labels.get(c, c) for c in columns])
+        self.rule_fail_table.setRowCount(len(failures))
+        for i, entry in enumerate(failures):
+            for j, col in enumerate(columns):
+                val = entry[col]
+                text = f"{val * 100:.1f}%" if col == "fail_share" else (str(val) if val != "" else "(none)")
+                self.rule_fail_table.setItem(i, j, QTableWidgetItem(text))
+
+    def export_summary(self):
+        if self.analytics.count == 0:
+            return
+            
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save Summary CSV", "batch_summary.csv", "CSV Files (*.csv)")
+        if file_name:
+            try:
+                self.analytics.export_csv(file_name, self.current_group_fields())
+                QMessageBox.information(self, "Success", "Summary exported successfully.")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save: {e}")
+
     def inspect_file_action(self, res):
         if not self.selected_folder:
             return
         
         full_path = os.path.join(self.selected_folder, res['file'])
         if os.path.exists(full_path):
-            self.parent().inspect_from_batch(full_path)
+            self.parent().inspect_from_batch(full_path, self.selected_folder)
             # self.accept() # Removed to keep dialog open
         else:
             QMessageBox.warning(self, "Error", f"File not found: {full_path}")
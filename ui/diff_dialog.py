@@ -0,0 +1,60 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt6.QtCore import Qt
+
+class DiffDialog(QDialog):
+    """
+    Shows ranked topic divergences between the current recording and one or
+    more other recordings. Double-clicking a row plots the topic and shades
+    its divergent intervals on the timeline.
+    """
+    def __init__(self, base_name, diffs, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Recording Diff - {base_name}")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout(self)
+        n_topics = sum(len(d) for d in diffs.values())
+        layout.addWidget(QLabel(f"Base: {base_name}. {n_topics} divergent topic(s) in {len(diffs)} recording(s). "
+                                "Double-click a row to show it on the timeline."))
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Recording", "Topic", "Divergent", "Intervals", "First (s)"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.cellDoubleClicked.connect(self.on_row_activated)
+        layout.addWidget(self.table)
+
+        self.rows = []
+        for label, topic_diffs in diffs.items():
+            for d in topic_diffs:
+                self.rows.append((label, d))
+
+        self.table.setRowCount(len(self.rows))
+        for i, (label, d) in enumerate(self.rows):
+            self.table.setItem(i, 0, QTableWidgetItem(label))
+            self.table.setItem(i, 1, QTableWidgetItem(d["topic"]))
+            self.table.setItem(i, 2, QTableWidgetItem(f"{d['diverge_ratio'] * 100:.2f}% ({d['diverge_frames']} fr)"))
+            self.table.setItem(i, 3, QTableWidgetItem(str(len(d["intervals"]))))
+            self.table.setItem(i, 4, QTableWidgetItem(f"{d['first_time']:.3f}"))
+
+        btn_layout = QHBoxLayout()
+        clear_btn = QPushButton("Clear Overlay")
+        clear_btn.clicked.connect(self.clear_overlay)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btn_layout.addStretch()
+        btn_layout.addWidget(clear_btn)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def on_row_activated(self, row, col):
+        if 0 <= row < len(self.rows):
+            label, d = self.rows[row]
+            self.parent().show_diff_overlay(d["topic"], d["intervals"])
+
+    def clear_overlay(self):
+        self.parent().timeline.set_highlight_intervals([])
@@ -0,0 +1,69 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton,
+                             QLabel, QComboBox, QCompleter, QLineEdit, QDoubleSpinBox)
+from PyQt6.QtCore import Qt
+
+class ImpliesRuleDialog(QDialog):
+    def __init__(self, available_topics, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Create Implies Rule")
+        self.resize(500, 220)
+        self.available_topics = available_topics
+
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel("Each time the trigger becomes its value in the selected range,\n"
+                                "the response must become its value within the given time.\n"
+                                "The response topic may be a pattern, e.g. stOmsResult.*PopUpReq"))
+
+        grid = QGridLayout()
+        grid.addWidget(QLabel("Trigger Topic:"), 0, 0)
+        self.trigger_combo = self._topic_combo()
+        grid.addWidget(self.trigger_combo, 0, 1)
+        grid.addWidget(QLabel("Value:"), 0, 2)
+        self.trigger_value = QLineEdit()
+        self.trigger_value.setFixedWidth(80)
+        grid.addWidget(self.trigger_value, 0, 3)
+
+        grid.addWidget(QLabel("Response Topic:"), 1, 0)
+        self.response_combo = self._topic_combo()
+        grid.addWidget(self.response_combo, 1, 1)
+        grid.addWidget(QLabel("Value:"), 1, 2)
+        self.response_value = QLineEdit()
+        self.response_value.setFixedWidth(80)
+        grid.addWidget(self.response_value, 1, 3)
+
+        grid.addWidget(QLabel("Within (s):"), 2, 0)
+        self.within_spin = QDoubleSpinBox()
+        self.within_spin.setRange(0.0, 600.0)
+        self.within_spin.setDecimals(3)
+        self.within_spin.setValue(2.0)
+        grid.addWidget(self.within_spin, 2, 1)
+        layout.addLayout(grid)
+
+        # Bottom Buttons
+        bottom_btns = QHBoxLayout()
+        ok_btn = QPushButton("Create Rule")
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        bottom_btns.addStretch()
+        bottom_btns.addWidget(ok_btn)
+        bottom_btns.addWidget(cancel_btn)
+        layout.addLayout(bottom_btns)
+
+    def _topic_combo(self):
+        combo = QComboBox()
+        combo.setEditable(True)
+        combo.addItems(self.available_topics)
+        combo.setCurrentIndex(-1)
+        combo.completer().setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        combo.completer().setFilterMode(Qt.MatchFlag.MatchContains)
+        return combo
+
+    def get_rule_params(self):
+        """Returns ([trigger, response], [trigger_value, response_value], within) or None if incomplete."""
+        topics = [self.trigger_combo.currentText().strip(), self.response_combo.currentText().strip()]
+        values = [self.trigger_value.text().strip(), self.response_value.text().strip()]
+        if not all(topics) or not all(values):
+            return None
+        return topics, values, self.within_spin.value()
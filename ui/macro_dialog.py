@@ -26,11 +26,16 @@ class MacroDialog(QDialog):
         add_btn = QPushButton("Add Current Rules as Macro")
         add_btn.clicked.connect(self.on_add_current)
         
+        sweep_btn = QPushButton("Sweep Folder...")
+        sweep_btn.setToolTip("Evaluate every macro against every recording in a folder")
+        sweep_btn.clicked.connect(self.open_sweep)
+        
         close_btn = QPushButton("Close")
         close_btn.clicked.connect(self.reject)
         
         btn_layout.addWidget(apply_btn)
         btn_layout.addWidget(add_btn)
+        btn_layout.addWidget(sweep_btn)
         btn_layout.addWidget(close_btn)
         self.layout.addLayout(btn_layout)
         
@@ -64,3 +69,8 @@ class MacroDialog(QDialog):
         self.new_macro_info = {"name": name, "description": desc}
         self.add_requested = True
         self.accept()
+
+    def open_sweep(self):
+        from ui.macro_sweep_dialog import MacroSweepDialog
+        dlg = MacroSweepDialog(self.macros, self)
+        dlg.exec()
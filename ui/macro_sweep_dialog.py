@@ -0,0 +1,153 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QFileDialog, QTableWidget, QTableWidgetItem, QProgressBar,
+                             QHeaderView, QMessageBox)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtGui import QColor
+from core.macro_sweep import run_macro_sweep, macro_pass_counts, export_sweep_csv
+import os
+
+STATUS_COLORS = {"PASS": QColor(200, 240, 200), "FAIL": QColor(250, 200, 200), "ERROR": QColor(250, 230, 170)}
+
+
+class MacroSweepWorker(QThread):
+    progress = pyqtSignal(int, int, dict)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, folder, macros):
+        super().__init__()
+        self.folder = folder
+        self.macros = macros
+
+    def run(self):
+        sweep = run_macro_sweep(self.folder, self.macros, self.emit_progress)
+        self.finished.emit(sweep)
+
+    def emit_progress(self, current, total, row):
+        self.progress.emit(current, total, row)
+
+
+class MacroSweepDialog(QDialog):
+    """
+    Evaluates every macro against every recording of a folder and shows the
+    files x macros PASS/FAIL/ERROR matrix. Double-clicking a row inspects the file.
+    """
+    def __init__(self, macros, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Macro Sweep")
+        self.resize(900, 600)
+        self.macros = macros
+        self.selected_folder = None
+        self.sweep = None
+
+        layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        select_btn = QPushButton("Select Folder")
+        select_btn.clicked.connect(self.select_folder)
+        self.folder_label = QLabel("No folder selected")
+        self.run_btn = QPushButton("Run Sweep")
+        self.run_btn.clicked.connect(self.run_sweep)
+        self.run_btn.setEnabled(False)
+        top_layout.addWidget(select_btn)
+        top_layout.addWidget(self.folder_label)
+        top_layout.addStretch()
+        top_layout.addWidget(self.run_btn)
+        layout.addLayout(top_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        self.status_label = QLabel(f"{len(macros)} macro(s). Double-click a row to inspect the file.")
+        layout.addWidget(self.status_label)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(macros) + 1)
+        self.table.setHorizontalHeaderLabels(["File"] + [m.get("name", "") for m in macros])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.cellDoubleClicked.connect(self.on_row_activated)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        self.export_btn = QPushButton("Export Matrix (CSV)")
+        self.export_btn.clicked.connect(self.export_matrix)
+        self.export_btn.setEnabled(False)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.export_btn)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder")
+        if folder:
+            self.selected_folder = folder
+            self.folder_label.setText(folder)
+            self.run_btn.setEnabled(bool(self.macros))
+
+    def run_sweep(self):
+        if not self.selected_folder:
+            return
+        self.run_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.table.setRowCount(0)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Starting...")
+
+        self.worker = MacroSweepWorker(self.selected_folder, self.macros)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.finished.connect(self.on_finished)
+        self.worker.start()
+
+    def update_progress(self, current, total, row):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(current)
+        self.status_label.setText(f"Processing: {row['file']} ({current}/{total})")
+
+    def on_finished(self, sweep):
+        self.sweep = sweep
+        self.run_btn.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.export_btn.setEnabled(bool(sweep["rows"]))
+
+        rows = sweep["rows"]
+        self.table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            file_item = QTableWidgetItem(row["file"])
+            if row["details"]:
+                file_item.setToolTip(row["details"])
+            self.table.setItem(i, 0, file_item)
+            for j, status in enumerate(row["statuses"]):
+                item = QTableWidgetItem(status)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                item.setBackground(STATUS_COLORS.get(status, QColor(255, 255, 255)))
+                self.table.setItem(i, j + 1, item)
+
+        summary = ", ".join(f"{c['macro']}: {c['PASS']}/{len(rows)}" for c in macro_pass_counts(sweep))
+        self.status_label.setText(f"Completed {len(rows)} file(s). Passing per macro: {summary}")
+
+    def on_row_activated(self, row, col):
+        if self.sweep is None or not (0 <= row < len(self.sweep["rows"])):
+            return
+        full_path = os.path.join(self.selected_folder, self.sweep["rows"][row]["file"])
+        main_window = self.parent()
+        # Opened from the macro dialog; inspection is done by the main window
+        while main_window is not None and not hasattr(main_window, "inspect_from_batch"):
+            main_window = main_window.parent()
+        if main_window is not None:
+            main_window.inspect_from_batch(full_path)
+
+    def export_matrix(self):
+        if not self.sweep:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save CSV", "macro_sweep.csv", "CSV Files (*.csv)")
+        if file_name:
+            try:
+                export_sweep_csv(self.sweep, file_name)
+                QMessageBox.information(self, "Success", "Matrix exported successfully.")
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save: {e}")
@@ -3,17 +3,17 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QMessageBox, QFrame, QSplitter, QLineEdit, QRadioButton, 
                              QButtonGroup, QTableWidget, QTableWidgetItem, QHeaderView,
                              QCompleter, QSlider, QDoubleSpinBox, QGroupBox, QDateEdit,
-                             QPlainTextEdit, QSpinBox, QScrollArea)
+                             QPlainTextEdit, QSpinBox, QScrollArea, QInputDialog)
 from PyQt6.QtGui import QAction, QKeySequence, QShortcut
 from PyQt6.QtCore import Qt, QDate
 from core.data_loader import ExcelLoader
-from core.logic import InspectorLogic, Rule, RuleType
+from core.logic import InspectorLogic, Rule, RuleType, RULE_TYPES, macro_rules, fail_intervals
+from core.expression import compile_expression, ExpressionError
+from core.recording_diff import diff_many
 import os
 
 from ui.widgets import TimelineWidget
-from ui.batch_dialog import BatchResultDialog
-from ui.macro_dialog import MacroDialog
-from ui.or_rule_dialog import ORRuleDialog
+# Dialogs (and the batch/analytics/history modules behind them) are imported when first opened
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -23,6 +23,7 @@ class MainWindow(QMainWindow):
         self.data_loader = ExcelLoader()
         self.selected_topics = []
         self.current_excel_path = None
+        self.current_folder = None # Folder the file was opened from; "path" config patterns match relative to it
         self.file_list = [] # List of absolute paths
         self.current_file_index = -1
         self.file_list = [] # List of absolute paths
@@ -87,6 +88,12 @@ class MainWindow(QMainWindow):
         save_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         save_btn.clicked.connect(self.save_config)
         
+        # Compare Recordings Button
+        compare_btn = QPushButton("Compare")
+        compare_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        compare_btn.setToolTip("Diff the current recording against other recordings (e.g. another SW version)")
+        compare_btn.clicked.connect(self.open_compare_dialog)
+        
         # Batch Run Button
         batch_btn = QPushButton("Batch Run")
         batch_btn.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -100,6 +107,7 @@ class MainWindow(QMainWindow):
         top_bar.addWidget(self.next_btn)
         top_bar.addWidget(self.file_label)
         top_bar.addStretch()
+        top_bar.addWidget(compare_btn)
         top_bar.addWidget(batch_btn)
         top_bar.addWidget(save_btn)
         
@@ -396,6 +404,18 @@ class MainWindow(QMainWindow):
         or_rule_btn.clicked.connect(self.open_or_rule_dialog)
         type_layout.addWidget(or_rule_btn)
         
+        # Expression Rule Button
+        expr_rule_btn = QPushButton("Add Expr Rule")
+        expr_rule_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        expr_rule_btn.clicked.connect(self.open_expr_rule_dialog)
+        type_layout.addWidget(expr_rule_btn)
+        
+        # Implies (trigger -> response) Rule Button
+        implies_rule_btn = QPushButton("Add Implies Rule")
+        implies_rule_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        implies_rule_btn.clicked.connect(self.open_implies_rule_dialog)
+        type_layout.addWidget(implies_rule_btn)
+        
         # Macro Setup Button
         macro_btn = QPushButton("Macro Setup")
         macro_btn.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -474,6 +494,7 @@ class MainWindow(QMainWindow):
     def open_or_rule_dialog(self):
         # Collect all available topics from data_loader
         topics = self.data_loader.get_topics() if self.data_loader else []
+        from ui.or_rule_dialog import ORRuleDialog
         dlg = ORRuleDialog(topics, self)
         if dlg.exec():
             conditions = dlg.get_conditions()
@@ -495,6 +516,49 @@ class MainWindow(QMainWindow):
             
             QMessageBox.information(self, "Success", f"OR Rule with {len(conditions)} conditions added.")
 
+    def open_expr_rule_dialog(self):
+        text, ok = QInputDialog.getText(
+            self, "Create Expr Rule",
+            "Condition that must hold in the selected range, e.g.\n"
+            "  topic > 30    topic in {2, 3, 4}    10 <= topic < 20\n"
+            "  abs(a - b) <= 5    bit(flags, 3) & other != 7"
+        )
+        if not ok or not text.strip():
+            return
+
+        try:
+            expression = compile_expression(text.strip())
+        except ExpressionError as e:
+            QMessageBox.warning(self, "Invalid Expression", str(e))
+            return
+
+        start, end = self.timeline.get_selected_range()
+        rule = Rule(start, end, expression.text, "", RuleType.EXPR)
+        self.inspector_logic.add_rule(rule)
+        self.refresh_rules_table()
+
+        for t in expression.topics:
+            self.add_topic_to_table(t)
+
+    def open_implies_rule_dialog(self):
+        topics = self.data_loader.get_topics() if self.data_loader else []
+        from ui.implies_rule_dialog import ImpliesRuleDialog
+        dlg = ImpliesRuleDialog(topics, self)
+        if dlg.exec():
+            params = dlg.get_rule_params()
+            if not params:
+                QMessageBox.warning(self, "Input Error", "Please fill in both topics and values.")
+                return
+
+            topics_list, values_list, within = params
+            start, end = self.timeline.get_selected_range()
+            rule = Rule(start, end, topics_list, values_list, RuleType.IMPLIES, within)
+            self.inspector_logic.add_rule(rule)
+            self.refresh_rules_table()
+
+            for t in rule.get_topics(topics):
+                self.add_topic_to_table(t)
+
     def on_rule_changed(self, row, col):
         # ["Start", "End", "Topic", "Cond", "Value", "Tol(s)"]
         # Attributes: start_time, end_time, topic, rule_type, target_value, tolerance
@@ -511,16 +575,18 @@ class MainWindow(QMainWindow):
             elif col == 1:
                 updates['end_time'] = float(val)
             elif col == 2:
-                if rule.rule_type == RuleType.MUST_OR:
+                if rule.rule_type in (RuleType.MUST_OR, RuleType.IMPLIES):
                     updates['topic'] = [t.strip() for t in val.split('|')]
+                elif rule.rule_type == RuleType.EXPR:
+                    updates['topic'] = compile_expression(val.strip()).text # Raises on syntax errors
                 else:
                     updates['topic'] = val
             elif col == 3:
                 # Basic validation for Rule Type
-                if val in [RuleType.MUST, RuleType.SHOULD_NOT, RuleType.EXIST, RuleType.MUST_OR, RuleType.MAYBE]:
+                if val in RULE_TYPES:
                     updates['rule_type'] = val
             elif col == 4:
-                if rule.rule_type == RuleType.MUST_OR:
+                if rule.rule_type in (RuleType.MUST_OR, RuleType.IMPLIES):
                     updates['target_value'] = [v.strip() for v in val.split('|')]
                 else:
                     updates['target_value'] = val
@@ -530,8 +596,7 @@ class MainWindow(QMainWindow):
             if updates:
                 self.inspector_logic.update_rule(row, **updates)
                 if 'topic' in updates:
-                    ts = updates['topic'] if isinstance(updates['topic'], list) else [updates['topic']]
-                    for t in ts:
+                    for t in rule.get_topics(self.data_loader.get_topics()):
                         self.add_topic_to_table(t)
         except Exception as e:
             # Revert or warn? For now just print/ignore to avoid annoying popups on partial edit
@@ -555,15 +620,10 @@ class MainWindow(QMainWindow):
         # 1. Sync Timeline Range
         self.timeline.set_selected_range(rule.start_time, rule.end_time)
 
-        # 2. Add topic(s) to visualization
-        topic_item = self.rules_table.item(row, 2) # Topic is col 2
-        if topic_item:
-            topic_str = topic_item.text()
-            # If it's an OR rule, it displays as "A | B"
-            topics = [t.strip() for t in topic_str.split('|')]
-            for t in topics:
-                if t and t not in self.selected_topics:
-                    self.add_topic_to_table(t)
+        # 2. Add topic(s) to visualization (OR rules and expressions read several)
+        for t in rule.get_topics(self.data_loader.get_topics()):
+            if t and t not in self.selected_topics:
+                self.add_topic_to_table(t)
 
     def refresh_rules_table(self):
         self.rules_table.blockSignals(True)
@@ -575,7 +635,7 @@ class MainWindow(QMainWindow):
             
             # Topic Display
             from core.logic import RuleType
-            if r.rule_type == RuleType.MUST_OR:
+            if r.rule_type in (RuleType.MUST_OR, RuleType.IMPLIES):
                 topic_str = " | ".join(r.topic) if isinstance(r.topic, list) else str(r.topic)
                 val_str = " | ".join(map(str, r.target_value)) if isinstance(r.target_value, list) else str(r.target_value)
             else:
@@ -610,19 +670,42 @@ class MainWindow(QMainWindow):
 
     def run_evaluation(self):
         results = self.inspector_logic.check_rules(self.data_loader)
+        self.timeline.set_failure_intervals(self._failure_intervals(results))
         
         msg = ""
         fail_count = 0
         for res in results:
             if res['status'] == 'FAIL':
                 fail_count += 1
-                msg += f"FAIL: {res['rule_desc']} at frames {res['fail_frames'][:5]}...\n"
+                if 'fail_times' in res:
+                    times = ", ".join(f"{t:.2f}s" for t in res['fail_times'][:5])
+                    msg += f"FAIL: {res['rule_desc']} for triggers at {times}...\n"
+                else:
+                    msg += f"FAIL: {res['rule_desc']} at frames {res['fail_frames'][:5]}...\n"
         
         if fail_count == 0:
             QMessageBox.information(self, "Result", "All rules PASSED!")
         else:
             QMessageBox.warning(self, "Result", f"{fail_count} rules FAILED.\n\n{msg}")
 
+    def _failure_intervals(self, results):
+        """(rule_index, [(start_s, end_s), ...]) of the failing frames of each failed rule."""
+        time_axis = self.data_loader.get_time_axis()
+        fs = self.data_loader.time_step
+        rule_intervals = []
+        for res in results:
+            if res['status'] != 'FAIL':
+                continue
+            rule = self.inspector_logic.rules[res['rule_index']]
+            if rule.rule_type == RuleType.EXIST:
+                # Nothing matched anywhere in the window
+                intervals = [(rule.start_time, rule.end_time)]
+            else:
+                intervals = [(time_axis[start], time_axis[end] + fs)
+                             for start, end in fail_intervals(res['fail_frames'])]
+            rule_intervals.append((res['rule_index'], intervals))
+        return rule_intervals
+
     def open_master_config_dialog(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Master Config", "", "JSON Files (*.json)")
         if file_name:
@@ -637,6 +720,7 @@ class MainWindow(QMainWindow):
 
     def open_macro_dialog(self):
         macros = self.inspector_logic.get_macros()
+        from ui.macro_dialog import MacroDialog
         dlg = MacroDialog(macros, self)
         if dlg.exec():
             if dlg.add_requested:
@@ -657,30 +741,12 @@ class MainWindow(QMainWindow):
             macro = dlg.selected_macro
             if macro:
                 try:
-                    rules_to_add = macro.get('rules', [])
-                    # Support legacy single-rule macros
-                    if not rules_to_add and 'topic' in macro:
-                        rules_to_add = [macro]
-
-                    for r_data in rules_to_add:
-                        # Unify keys (support both legacy/code-defined and saved-to-json formats)
-                        start = r_data.get('start') if 'start' in r_data else r_data.get('start_time')
-                        end = r_data.get('end') if 'end' in r_data else r_data.get('end_time')
-                        value = r_data.get('value') if 'value' in r_data else r_data.get('target_value')
-                        
-                        rule = Rule(
-                            start,
-                            end,
-                            r_data['topic'],
-                            value,
-                            r_data['rule_type'],
-                            r_data.get('tolerance', 0.0)
-                        )
+                    rules_to_add = macro_rules(macro)
+                    for rule in rules_to_add:
                         self.inspector_logic.add_rule(rule)
                         
                         # Fix: Handle list of topics for OR rules
-                        ts = r_data['topic'] if isinstance(r_data['topic'], list) else [r_data['topic']]
-                        for t in ts:
+                        for t in rule.get_topics(self.data_loader.get_topics()):
                             self.add_topic_to_table(t)
                     
                     self.refresh_rules_table()
@@ -726,6 +792,7 @@ class MainWindow(QMainWindow):
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Excel File", "", "Excel/CSV Files (*.xlsx *.xls *.csv)")
         if file_name:
             # Single file mode - Reset list
+            self.current_folder = None
             self.file_list = [file_name]
             self.current_file_index = 0
             self._update_file_dropdown_ui()
@@ -749,6 +816,7 @@ class MainWindow(QMainWindow):
             return
 
         # Sort alphabetically
+        self.current_folder = folder_path
         self.file_list = sorted(excel_files)
         
         # Populate Dropdown
@@ -901,19 +969,53 @@ class MainWindow(QMainWindow):
 
     def open_batch_dialog(self):
         if self.batch_dialog is None:
+            from ui.batch_dialog import BatchResultDialog
             self.batch_dialog = BatchResultDialog(self)
         
         self.batch_dialog.show()
         self.batch_dialog.raise_()
         self.batch_dialog.activateWindow()
 
-    def inspect_from_batch(self, file_path):
+    def open_compare_dialog(self):
+        if not self.current_excel_path:
+            QMessageBox.warning(self, "Error", "Load the base recording first.")
+            return
+            
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Select Recordings to Compare", 
+                                                     os.path.dirname(self.current_excel_path),
+                                                     "Excel/CSV Files (*.xlsx *.xls *.csv)")
+        if not file_names:
+            return
+            
+        try:
+            others = {}
+            for path in file_names:
+                loader = ExcelLoader()
+                loader.load_file(path)
+                others[os.path.basename(path)] = loader
+            diffs = diff_many(self.data_loader, others)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to compare recordings: {e}")
+            return
+            
+        from ui.diff_dialog import DiffDialog
+        self.diff_dialog = DiffDialog(os.path.basename(self.current_excel_path), diffs, self)
+        self.diff_dialog.show()
+
+    def show_diff_overlay(self, topic, intervals):
+        if topic not in self.selected_topics:
+            self.add_topic_to_table(topic)
+        self.timeline.set_highlight_intervals(intervals)
+
+    def inspect_from_batch(self, file_path, folder=None):
         """
-        Called from BatchResultDialog to inspect a specific file.
+        Called from BatchResultDialog to inspect a specific file of the batch folder.
         """
         if not os.path.exists(file_path):
             QMessageBox.warning(self, "Error", f"File does not exist: {file_path}")
             return
+        if folder is not None:
+            self.current_folder = folder
             
         self._load_file_from_path(file_path)
 
@@ -944,6 +1046,7 @@ class MainWindow(QMainWindow):
             time_axis = self.data_loader.get_time_axis()
             self.timeline.set_fs(self.data_loader.time_step)
             self.timeline.set_time_axis(time_axis)
+            self.timeline.set_failure_intervals([]) # Results belong to the previous file
             
             # Load Config from Master if available
             self._load_config_for_current_excel()
@@ -954,12 +1057,23 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load file: {str(e)}")
 
+    def _current_rel_path(self):
+        """Path of the current file relative to its folder, as batch config lookups use it."""
+        if self.current_folder:
+            try:
+                rel_path = os.path.relpath(self.current_excel_path, self.current_folder)
+            except ValueError: # Another drive
+                rel_path = os.pardir
+            if not rel_path.startswith(os.pardir):
+                return rel_path
+        return os.path.basename(self.current_excel_path)
+
     def _load_config_for_current_excel(self):
         if not self.current_excel_path:
             return
             
         file_stem = os.path.splitext(os.path.basename(self.current_excel_path))[0]
-        config_data = self.inspector_logic.get_config_for_file(file_stem)
+        config_data = self.inspector_logic.get_config_for_file(file_stem, self._current_rel_path())
         
         if config_data:
             try:
@@ -989,10 +1103,7 @@ class MainWindow(QMainWindow):
                 # We can infer topics from rules
                 all_topics = []
                 for r in self.inspector_logic.rules:
-                    if isinstance(r.topic, list):
-                        all_topics.extend(r.topic)
-                    else:
-                        all_topics.append(r.topic)
+                    all_topics.extend(r.get_topics(self.data_loader.get_topics()))
                 
                 for topic in set(all_topics):
                     self.add_topic_to_table(topic)
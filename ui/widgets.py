@@ -1,7 +1,84 @@
-import pyqtgraph as pg
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-                             QSlider, QDoubleSpinBox)
-from PyQt6.QtCore import pyqtSignal, Qt
+                             QSlider, QDoubleSpinBox, QGraphicsObject)
+from PyQt6.QtCore import pyqtSignal, Qt, QRectF
+from PyQt6.QtGui import QColor, QBrush, QPen
+import numpy as np
+
+# Band colors for failing rules (rule index modulo palette length)
+FAILURE_COLORS = [(220, 40, 40, 60), (40, 90, 220, 60), (30, 160, 60, 60), (170, 50, 200, 60),
+                  (230, 150, 0, 60), (0, 170, 190, 60), (120, 80, 40, 60), (200, 60, 140, 60)]
+
+
+def merge_intervals(intervals):
+    """Sorts (start, end) intervals and merges overlapping ones. Returns (starts, ends) arrays."""
+    if len(intervals) == 0:
+        return np.array([]), np.array([])
+    arr = np.asarray(intervals, dtype=float).reshape(-1, 2)
+    arr = arr[np.argsort(arr[:, 0], kind='stable')]
+    starts, ends = arr[:, 0], np.maximum.accumulate(arr[:, 1])
+    # A new band starts where the interval begins after everything before it has ended
+    new = np.concatenate(([True], starts[1:] > ends[:-1]))
+    first = np.flatnonzero(new)
+    last = np.concatenate((first[1:] - 1, [len(arr) - 1]))
+    return starts[first], ends[last]
+
+
+def visible_intervals(starts, ends, x_min, x_max, min_gap=0.0):
+    """
+    Clips merged, sorted intervals to [x_min, x_max] and joins neighbours closer
+    than min_gap (e.g. one pixel), so the number of bands is bounded by the view width.
+    """
+    lo = np.searchsorted(ends, x_min, side='left')
+    hi = np.searchsorted(starts, x_max, side='right')
+    starts = np.maximum(starts[lo:hi], x_min)
+    ends = np.minimum(ends[lo:hi], x_max)
+    if len(starts) > 1 and min_gap > 0:
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] >= min_gap))
+        first = np.flatnonzero(keep)
+        starts, ends = starts[first], ends[np.concatenate((first[1:] - 1, [len(ends) - 1]))]
+    return starts, ends
+
+
+class IntervalBands(QGraphicsObject):
+    """
+    Full-height shaded bands for a set of time intervals, drawn by a single item
+    as one batch of rectangles. Only the part inside the view is kept and it is
+    rebuilt when the view pans or zooms.
+    """
+    def __init__(self, view_box, starts, ends, color):
+        super().__init__()
+        self.view_box = view_box
+        self.starts, self.ends = starts, ends
+        self.brush = QBrush(QColor(*color))
+        self.rects = []
+        self.bounds = QRectF()
+        self.setZValue(-10)
+        view_box.sigRangeChanged.connect(self.update_rects)
+        self.update_rects()
+
+    def detach(self):
+        self.view_box.sigRangeChanged.disconnect(self.update_rects)
+
+    def update_rects(self, *args):
+        (x_min, x_max), (y_min, y_max) = self.view_box.viewRange()
+        pixel = (x_max - x_min) / max(self.view_box.width(), 1)
+        starts, ends = visible_intervals(self.starts, self.ends, x_min, x_max, pixel)
+        # Bands narrower than a pixel would not be drawn at all
+        ends = np.maximum(ends, starts + pixel)
+        height = y_max - y_min
+        self.prepareGeometryChange()
+        self.rects = [QRectF(start, y_min, end - start, height) for start, end in zip(starts.tolist(), ends.tolist())]
+        self.bounds = QRectF(x_min, y_min, x_max - x_min, height)
+        self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        if self.rects:
+            painter.setPen(QPen(Qt.PenStyle.NoPen))
+            painter.setBrush(self.brush)
+            painter.drawRects(self.rects)
 
 
 class TimelineWidget(QWidget):
@@ -12,10 +89,13 @@ class TimelineWidget(QWidget):
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
         
-        # Plot Widget Container (GraphicsLayoutWidget for subplots)
-        self.plot_layout = pg.GraphicsLayoutWidget()
-        self.plot_layout.setBackground('w')
-        self.layout.addWidget(self.plot_layout)
+        # Plot Widget Container (GraphicsLayoutWidget for subplots).
+        # pyqtgraph is imported and the container built on the first plot; until
+        # then an empty white placeholder holds its place in the layout.
+        self.plot_layout = None
+        self.plot_placeholder = QWidget()
+        self.plot_placeholder.setStyleSheet("background-color: white;")
+        self.layout.addWidget(self.plot_placeholder, 1)
 
         # We will keep track of created plots
         self.plots = [] 
@@ -31,6 +111,11 @@ class TimelineWidget(QWidget):
         self.current_time_data = None
         self.fs = 0.033
         
+        # Shaded time intervals drawn on every plot: name -> (color, starts, ends)
+        # e.g. the recording diff and failing rule intervals after an evaluation
+        self.overlays = {}
+        self.highlight_items = []
+        
         # Integrated Range Controls
         self._setup_range_controls()
 
@@ -87,11 +172,25 @@ class TimelineWidget(QWidget):
             for r in self.regions:
                 r.setBounds(bounds)
             
+    def _ensure_plot_layout(self):
+        if self.plot_layout is None:
+            import pyqtgraph as pg
+            self.plot_layout = pg.GraphicsLayoutWidget()
+            self.plot_layout.setBackground('w')
+            self.layout.replaceWidget(self.plot_placeholder, self.plot_layout)
+            self.plot_placeholder.deleteLater()
+            self.plot_placeholder = None
+        return self.plot_layout
+
     def plot_topics(self, time_axis, data_dict, plot_map=None):
-        self.plot_layout.clear()
+        if self.plot_layout is None and not data_dict:
+            return # Nothing has been plotted yet, keep the placeholder
+        import pyqtgraph as pg
+        self._ensure_plot_layout().clear()
         self.plots = []
         self.cursors = []
         self.regions = []
+        self.highlight_items = []
         
         if not data_dict:
             return
@@ -149,6 +248,47 @@ class TimelineWidget(QWidget):
             self.regions.append(region)
             
             self.plots.append(p)
+        
+        self._draw_highlights()
+
+    def set_highlight_intervals(self, intervals, color=(255, 140, 0, 60)):
+        """Shades the given (start_s, end_s) intervals on all plots; [] clears them."""
+        self._set_overlay("highlight", [(start, max(end, start + self.fs)) for start, end in intervals], color)
+        self._draw_highlights()
+
+    def set_failure_intervals(self, rule_intervals):
+        """
+        Shades failing intervals per rule: rule_intervals is a list of
+        (rule_index, [(start_s, end_s), ...]); [] clears them. Rules sharing a
+        color are merged into one band set per plot.
+        """
+        by_color = {}
+        for rule_index, intervals in rule_intervals:
+            by_color.setdefault(rule_index % len(FAILURE_COLORS), []).extend(intervals)
+        for name in [n for n in self.overlays if n.startswith("fail:")]:
+            del self.overlays[name]
+        for k, intervals in by_color.items():
+            self._set_overlay(f"fail:{k}", intervals, FAILURE_COLORS[k])
+        self._draw_highlights()
+
+    def _set_overlay(self, name, intervals, color):
+        starts, ends = merge_intervals(intervals)
+        if len(starts) == 0:
+            self.overlays.pop(name, None)
+        else:
+            self.overlays[name] = (color, starts, ends)
+
+    def _draw_highlights(self):
+        for plot, item in self.highlight_items:
+            item.detach()
+            plot.removeItem(item)
+        self.highlight_items = []
+        
+        for p in self.plots:
+            for color, starts, ends in self.overlays.values():
+                item = IntervalBands(p.getViewBox(), starts, ends, color)
+                p.addItem(item, ignoreBounds=True)
+                self.highlight_items.append((p, item))
 
     def on_cursor_dragged(self, sender):
         if self.updating_cursor: return
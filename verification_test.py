@@ -1,5 +1,8 @@
 import sys
 import os
+import shutil
+import tempfile
+import contextlib
 import pandas as pd
 import numpy as np
 
@@ -19,6 +22,34 @@ def create_dummy_excel(filename):
     df.to_excel(filename, index=False)
     print(f"Created {filename}")
 
+@contextlib.contextmanager
+def temp_folder():
+    """A temporary folder that is removed afterwards, also when the test fails."""
+    folder = tempfile.mkdtemp()
+    try:
+        yield folder
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def write_recording(path, columns):
+    """Writes {topic: values} as a recording CSV, creating its folder."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+def load_dummy_recording(folder):
+    """Writes the create_dummy_excel recording into folder and loads it."""
+    excel_file = os.path.join(folder, "dummy.xlsx")
+    create_dummy_excel(excel_file)
+    loader = ExcelLoader()
+    loader.load_file(excel_file)
+    return loader
+
+def master_logic(files, **sections):
+    """An InspectorLogic whose master config maps file stems to the given entries."""
+    logic = InspectorLogic()
+    logic.master_config_data = dict({"files": files}, **sections)
+    return logic
+
 def test_core_logic():
     excel_file = "dumm_test.xlsx"
     create_dummy_excel(excel_file)
@@ -69,5 +100,813 @@ def test_core_logic():
     if os.path.exists(excel_file):
         os.remove(excel_file)
 
+def test_verdict_only():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+    logic = InspectorLogic()
+    logic.rules = [Rule(0.0, 1.0, "TopicB", 10, RuleType.MUST),
+                   Rule(0.0, 1.0, "TopicC", 1, RuleType.SHOULD_NOT),
+                   Rule(0.0, 1.0, "TopicB", 20, RuleType.MUST)]
+    results = logic.check_rules(loader)
+    assert [r['status'] for r in results] == ['PASS', 'PASS', 'FAIL']
+    
+    # Verdict-only mode must agree on status without building frame lists
+    verdicts = logic.check_rules(loader, verdict_only=True)
+    assert [r['status'] for r in verdicts] == [r['status'] for r in results]
+    assert all(r['fail_frames'] == [] for r in verdicts)
+    assert len(logic.check_rules(loader, verdict_only=True, fail_fast=True)) == 3
+    print("Verdict-only verification passed.")
+
+def test_expression_rules():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+    
+    # Comparisons, sets and ranges over several topics
+    logic = InspectorLogic()
+    logic.rules = [Rule(0.0, 1.0, "TopicA < 50 & TopicB in {10, 20} & TopicC in 0..1", "", RuleType.EXPR),
+                   Rule(0.0, 3.2, "TopicA < 20", "", RuleType.EXPR),
+                   Rule(0.0, 1.0, "TopicA >", "", RuleType.EXPR)]
+    results = logic.check_rules(loader)
+    assert results[0]['status'] == 'PASS', "Expression rule should pass"
+    assert results[1]['status'] == 'FAIL' and results[1]['fail_frames'][0] == 20, "Expression rule should fail from frame 20"
+    assert results[2]['status'] == 'ERROR', "Invalid expression should be reported"
+
+    # Compiled expressions are reused, but the cache stays bounded
+    from core.expression import compile_expression, COMPILED_CACHE_SIZE
+    assert compile_expression("TopicA < 20") is compile_expression("TopicA < 20")
+    for i in range(COMPILED_CACHE_SIZE + 1):
+        compile_expression(f"TopicA < {i}")
+    assert compile_expression.cache_info().currsize == COMPILED_CACHE_SIZE
+    print("Expression rule verification passed.")
+
+def test_expression_types():
+    with temp_folder() as folder:
+        path = os.path.join(folder, "rec.csv")
+        write_recording(path, {"A": np.linspace(0, 9, 10), "S": ["on"] * 5 + ["off"] * 5, "N": [1.0, None] * 5})
+        loader = ExcelLoader()
+        loader.load_file(path)
+    
+    # Type mismatches are reported on the rule instead of escaping check_rules
+    logic = InspectorLogic()
+    logic.rules = [Rule(0.0, 1.0, expr, "", RuleType.EXPR)
+                   for expr in ["A > 'abc'", "S > 3", "abs(S) > 1", "bit(N, 0)", "bit(S, 0)", "S == 'on'"]]
+    results = logic.check_rules(loader)
+    assert [r["status"] for r in results] == ["ERROR"] * 5 + ["FAIL"], results
+    assert "missing" in results[3]["msg"]
+    print("Expression type verification passed.")
+
+def test_implies():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+    
+    # TopicC becomes 1 at frame 50 (1.65s); TopicB is already 10 so the reaction holds,
+    # while TopicA never becomes 5 after it
+    logic = InspectorLogic()
+    logic.rules = [
+        Rule(0.0, 3.3, ["TopicC", "Topic[B]"], [1, 10], RuleType.IMPLIES, 0.5),
+        Rule(0.0, 3.3, ["TopicC", "TopicA"], [1, 5], RuleType.IMPLIES, 0.5),
+    ]
+    results = logic.check_rules(loader)
+    assert results[0]['status'] == 'PASS', "Response already active should satisfy the trigger"
+    assert results[1]['status'] == 'FAIL' and results[1]['fail_frames'] == [50], "Trigger at frame 50 should be reported"
+    assert abs(results[1]['fail_times'][0] - 50 * 0.033) < 1e-6
+    print("Implies verification passed.")
+
+def test_dataset_cache():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+        
+        # A second load of the unchanged file is served from the dataset cache
+        cached_loader = ExcelLoader()
+        cached_loader.load_file(os.path.join(folder, "dummy.xlsx"))
+        assert cached_loader.df is loader.df, "Unchanged file should not be parsed again"
+        assert cached_loader.get_topics() == loader.get_topics()
+    print("Dataset cache verification passed.")
+
+def test_header_probe():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+        
+        # Header-only probe agrees with the full load
+        probe = ExcelLoader().probe_file(os.path.join(folder, "dummy.xlsx"))
+        assert probe["topics"] == loader.get_topics(), f"Probe topics {probe['topics']}"
+        assert probe["n_frames"] == 100 and abs(probe["duration"] - 99 * 0.033) < 1e-9
+    print("Header probe verification passed.")
+
+def test_segments():
+    with temp_folder() as folder:
+        loader = load_dummy_recording(folder)
+    
+    # Slow-changing topics are indexed as runs; TopicA changes every frame and is not
+    starts, lengths, values = loader.get_segments("TopicC")
+    assert starts.tolist() == [0, 50] and lengths.tolist() == [50, 50] and values.tolist() == [0, 1]
+    assert loader.get_segments("TopicA") is None
+    print("Segment index verification passed.")
+
+def test_deferred_imports():
+    import subprocess
+    
+    # A fresh interpreter: importing the main window must not pull in the lazily loaded packages
+    code = ("import sys; import ui.main_window; from main import LAZY_MODULES, StartupProfiler; "
+            "p = StartupProfiler(); p.mark('x'); assert 'x' in p.report(); "
+            "print(','.join(m for m in LAZY_MODULES if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "", f"Loaded at startup: {out.stdout.strip()}"
+    print("Deferred import verification passed.")
+
+def test_batch_analytics():
+    from core.batch_analytics import BatchAnalytics
+    
+    analytics = BatchAnalytics()
+    analytics.add_many([
+        {"status": "PASS", "vehicle": "V1", "sw_ver": "1.0", "categories": "A | B"},
+        {"status": "FAIL", "vehicle": "V1", "sw_ver": "1.0", "categories": "A", "failed_rules": ["R1", "R2"]},
+        {"status": "FAIL", "vehicle": "V2", "sw_ver": "1.0", "categories": "B", "failed_rules": ["R1"]},
+        {"status": "NO_CONFIG", "vehicle": "V2", "sw_ver": "2.0", "categories": ""},
+        {"status": "ERROR", "vehicle": "V1", "sw_ver": "2.0", "categories": "A"},
+    ])
+    pick = lambda table, keys: [tuple(e[k] for k in keys) for e in table]
+    
+    # Files without rules to check are left out of the pass rate
+    by_vehicle = analytics.summary(["vehicle"])
+    assert pick(by_vehicle, ["vehicle", "total", "PASS", "FAIL", "ERROR", "NO_CONFIG"]) == \
+        [("V1", 3, 1, 1, 1, 0), ("V2", 2, 0, 1, 0, 1)]
+    assert abs(by_vehicle[0]["pass_rate"] - 1 / 3) < 1e-12 and by_vehicle[1]["pass_rate"] == 0.0
+    assert pick(analytics.summary(["vehicle", "sw_ver"]), ["vehicle", "sw_ver", "total"]) == \
+        [("V1", "1.0", 2), ("V1", "2.0", 1), ("V2", "1.0", 1), ("V2", "2.0", 1)]
+    # A file counts once in each of its categories
+    assert pick(analytics.summary(["categories"]), ["categories", "total", "pass_rate"]) == \
+        [("", 1, 0.0), ("A", 3, 1 / 3), ("B", 2, 0.5)]
+    
+    assert pick(analytics.rule_failures(), ["rule", "failures", "fail_share"]) == [("R1", 2, 0.5), ("R2", 1, 0.25)]
+    assert pick(analytics.rule_failures(["sw_ver"]), ["sw_ver", "rule", "failures", "fail_share"]) == \
+        [("1.0", "R1", 2, 2 / 3), ("1.0", "R2", 1, 1 / 3)]
+    assert pick(analytics.rule_failures(["categories"]), ["categories", "rule", "failures", "fail_share"]) == \
+        [("A", "R1", 1, 1 / 3), ("A", "R2", 1, 1 / 3), ("B", "R1", 1, 0.5)]
+    
+    analytics.clear()
+    assert analytics.summary(["vehicle"]) == [] and analytics.rule_failures() == []
+    print("Batch analytics verification passed.")
+
+def test_macro_sweep():
+    import csv
+    from core.macro_sweep import run_macro_sweep, macro_pass_counts, export_sweep_csv
+    
+    with temp_folder() as folder:
+        data = os.path.join(folder, "data")
+        write_recording(os.path.join(data, "one.csv"), {"TopicA": [1] * 40})
+        write_recording(os.path.join(data, "sub", "two.csv"), {"TopicA": [2] * 40})
+        with open(os.path.join(data, "broken.csv"), "w") as f:
+            f.write("")
+        macros = [
+            {"name": "is_one", "rules": [Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST).to_dict()]},
+            {"name": "legacy_two", "topic": "TopicA", "start": 0.0, "end": 1.0, "value": 2, "rule_type": RuleType.MUST},
+            {"name": "malformed", "rules": [{"topic": "TopicA"}]},
+            {"name": "unknown_topic", "rules": [Rule(0.0, 1.0, "Nope", 1, RuleType.MUST).to_dict()]},
+        ]
+        
+        # Every file x every macro, rows sorted by path; the same with worker processes
+        sweep = run_macro_sweep(data, macros, max_workers=1)
+        assert sweep["macros"] == ["is_one", "legacy_two", "malformed", "unknown_topic"]
+        rows = {row["file"].replace(os.sep, "/"): row for row in sweep["rows"]}
+        assert [r["file"] for r in sweep["rows"]] == sorted(r["file"] for r in sweep["rows"])
+        assert rows["one.csv"]["statuses"] == ["PASS", "FAIL", "ERROR", "ERROR"]
+        assert rows["sub/two.csv"]["statuses"] == ["FAIL", "PASS", "ERROR", "ERROR"]
+        assert rows["broken.csv"]["statuses"] == ["ERROR"] * 4 and rows["broken.csv"]["details"]
+        assert run_macro_sweep(data, macros, max_workers=2) == sweep
+        
+        assert [(c["macro"], c["PASS"], c["FAIL"], c["ERROR"]) for c in macro_pass_counts(sweep)] == \
+            [("is_one", 1, 1, 1), ("legacy_two", 1, 1, 1), ("malformed", 0, 0, 3), ("unknown_topic", 0, 0, 3)]
+        out = os.path.join(folder, "sweep.csv")
+        export_sweep_csv(sweep, out)
+        with open(out, newline="", encoding="utf-8") as f:
+            matrix = list(csv.reader(f))
+        assert matrix[0] == ["file"] + sweep["macros"] + ["details"] and len(matrix) == 4
+    print("Macro sweep verification passed.")
+
+def test_interval_bands():
+    from ui.widgets import IntervalBands, merge_intervals, visible_intervals
+    
+    starts, ends = merge_intervals([(5.05, 6), (1, 2), (1.5, 3), (5, 5.01), (12, 13), (2.5, 2.8)])
+    assert starts.tolist() == [1, 5, 5.05, 12] and ends.tolist() == [3, 5.01, 6, 13]
+    assert merge_intervals([])[0].size == 0
+    
+    # Clipped to the view, neighbours closer than a pixel joined
+    s, e = visible_intervals(starts, ends, 2.0, 10.0, 0.1)
+    assert s.tolist() == [2.0, 5] and e.tolist() == [3, 6]
+    s, e = visible_intervals(starts, ends, 2.0, 10.0)
+    assert s.tolist() == [2.0, 5, 5.05] and e.tolist() == [3, 5.01, 6]
+    
+    class Signal:
+        def connect(self, slot): pass
+        def disconnect(self, slot): pass
+    class ViewBox:
+        sigRangeChanged = Signal()
+        x_range = [0.0, 10.0]
+        def viewRange(self): return [self.x_range, [-1.0, 1.0]]
+        def width(self): return 100
+    
+    view_box = ViewBox()
+    bands = IntervalBands(view_box, starts, ends, (255, 0, 0, 60))
+    assert [(r.left(), r.right(), r.top(), r.height()) for r in bands.rects] == [(1, 3, -1, 2), (5, 6, -1, 2)]
+    # Zoomed out, bands closer than a pixel merge and a band narrower than one is widened to it
+    view_box.x_range = [0.0, 100.0]
+    bands.update_rects()
+    assert [(r.left(), r.width()) for r in bands.rects] == [(1, 2), (5, 1), (12, 1)]
+    thin = IntervalBands(view_box, *merge_intervals([(50, 50.01)]), (255, 0, 0, 60))
+    assert [(r.left(), r.width()) for r in thin.rects] == [(50, 1)]
+    view_box.x_range = [20.0, 30.0]
+    bands.update_rects()
+    assert bands.rects == []
+    print("Interval band verification passed.")
+
+def test_recording_diff():
+    from core.recording_diff import diff_recordings
+    
+    loaders = []
+    with temp_folder() as folder:
+        for name, speed in (("base", [1, 2, 3, 4, 5, 6]), ("new", [1, 2, 9, 9, 5, 6])):
+            path = os.path.join(folder, f"{name}.csv")
+            write_recording(path, {"speed": speed, "mode": ["on", None, "off", None, "on", "on"]})
+            loader = ExcelLoader()
+            loader.load_file(path)
+            loaders.append(loader)
+    
+    # Missing text on both sides is not a divergence
+    assert diff_recordings(loaders[0], loaders[0]) == []
+    diffs = diff_recordings(*loaders)
+    assert [d["topic"] for d in diffs] == ["speed"]
+    assert diffs[0]["diverge_frames"] == 2 and type(diffs[0]["diverge_ratio"]) is float
+    assert abs(diffs[0]["diverge_ratio"] - 2 / 6) < 1e-12
+    print("Recording diff verification passed.")
+
+def test_xlsx_reader():
+    import openpyxl
+    from core.xlsx_reader import read_xlsx, XlsxUnsupported
+    
+    with temp_folder() as folder:
+        path = os.path.join(folder, "rec.xlsx")
+        
+        def write(rows):
+            wb = openpyxl.Workbook()
+            for row in rows:
+                wb.active.append(row)
+            wb.save(path)
+        
+        # Read like pd.read_excel: dtypes, missing values, mixed columns, trailing "" rows dropped
+        write([["int", "float", "text", "mixed", "gaps"],
+               [1, 0.5, "on", 1, 7],
+               [2, 1.5, "NA", "a", None],
+               [3, 2.0, "off", 1, 9],
+               ["", "", "", "", ""],
+               ["", "", "", "", ""]])
+        expected = pd.read_excel(path)
+        columns = read_xlsx(path)
+        assert list(columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(pd.DataFrame(columns), expected)
+        
+        # Numbers and booleans stored as text are left to pandas, which converts them
+        for cells in (["1", "2", "3"], [1, "2", 3], ["1.5", "x"], ["True", "False"]):
+            write([["a"]] + [[v] for v in cells])
+            try:
+                read_xlsx(path)
+                assert False, f"{cells} should fall back to pandas"
+            except XlsxUnsupported:
+                pass
+        write([["a"], ["1"], ["1"], ["1"]])
+        loader = ExcelLoader()
+        loader.load_file(path)
+        assert loader.df["a"].dtype == np.int64
+        logic = InspectorLogic()
+        logic.rules = [Rule(0.0, 0.05, "a", 1, RuleType.MUST)]
+        assert logic.check_rules(loader)[0]["status"] == "PASS"
+    print("Xlsx reader verification passed.")
+
+def test_csv_schema_drift():
+    from core.csv_reader import read_csv, clear_schema_cache
+    
+    first = "a,b,c\n1,0.5,on\n2,1.5,off\n"
+    # Later files with the same header but values the cached dtypes can't hold
+    drifted = ["a,b,c\n99999999999999999999,0.5,on\n2,1.5,off\n",   # Overflows int64
+               "a,b,c\n1.5,0.5,on\n2,1.5,off\n",                    # int -> float
+               "a,b,c\n,0.5,on\n2,1.5,off\n",                       # Missing value in an int column
+               "a,b,c\nx,1,on\n2,2,off\n",                          # Text in an int column, integral floats
+               "a,b,c\n1,0.5,1\n2,1.5,0\n",                         # Text column now numeric
+               "a,b,c\n1.0,0.5,1\n2.0,1.5,0\n",                     # Integers written as floats
+               "a,b,c\n1,0.5,1\n2,1.5,0\n",
+               "a,b,c\n+1,0.5,1\n2e0,1.5,0\n"]                      # Signed and exponent notation
+    with temp_folder() as folder:
+        for i, text in enumerate([first] + drifted):
+            path = os.path.join(folder, f"rec_{i}.csv")
+            with open(path, "w") as f:
+                f.write(text)
+        clear_schema_cache()
+        for i in range(len(drifted) + 1):
+            path = os.path.join(folder, f"rec_{i}.csv")
+            pd.testing.assert_frame_equal(read_csv(path), pd.read_csv(path))
+    print("CSV schema drift verification passed.")
+
+def test_array_store():
+    import openpyxl
+    from core.array_store import convert_recording
+    
+    with temp_folder() as folder:
+        xlsx = os.path.join(folder, "mixed.xlsx")
+        wb = openpyxl.Workbook()
+        for row in [["mix", "num"], [1, 0.5], ["a", 1.5], [1, 2.5], [1, 3.5]]:
+            wb.active.append(row)
+        wb.save(xlsx)
+        csv = os.path.join(folder, "text.csv")
+        write_recording(csv, {"s": ["x", None, "y", "x"], "n": [1, 2, 3, 4]})
+        
+        rules = {xlsx: [Rule(0.0, 0.05, "mix", 1, RuleType.MUST)],
+                 csv: [Rule(0.0, 0.1, "s", "nan", RuleType.EXIST), Rule(0.0, 0.1, "s", "x", RuleType.EXIST)]}
+        logic = InspectorLogic()
+        for path in (xlsx, csv):
+            parsed = ExcelLoader()
+            parsed.use_array_store = False
+            parsed.use_cache = False
+            parsed.load_file(path)
+            convert_recording(path)
+            stored = ExcelLoader()
+            stored.use_cache = False
+            stored.load_file(path)
+            assert stored.store is not None
+            
+            # Missing values and number/text mixes come back as parsed
+            frame = lambda loader: pd.DataFrame({t: loader.get_data_for_topic(t) for t in loader.get_topics()})
+            pd.testing.assert_frame_equal(frame(parsed), frame(stored))
+            logic.rules = rules[path]
+            assert logic.check_rules(parsed) == logic.check_rules(stored)
+        logic.rules = rules[csv]
+        assert [r["status"] for r in logic.check_rules(stored)] == ["FAIL", "PASS"]
+    print("Array store verification passed.")
+
+def _request(base_url, method, path, payload=None):
+    import json
+    import urllib.request
+    import urllib.error
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_validation_service():
+    import base64
+    import threading
+    from core.service import ValidationService, make_server
+    
+    csv_file = os.path.abspath("dumm_service.csv")
+    pd.DataFrame({"TopicB": [10] * 100, "TopicC": [0] * 50 + [1] * 50}).to_csv(csv_file, index=False)
+    rules = [Rule(0.0, 1.0, "TopicB", 10, RuleType.MUST).to_dict(),
+             Rule(0.0, 3.0, "TopicC", 0, RuleType.MUST).to_dict()]
+    
+    service = ValidationService(max_workers=2, max_pending=8)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:%d" % server.server_address[1]
+    try:
+        # Several clients at once: by path and by upload
+        with open(csv_file, "rb") as f:
+            upload = {"name": "uploaded.csv", "content": base64.b64encode(f.read()).decode("ascii")}
+        submitted = []
+        def client(payload):
+            submitted.append(_request(base_url, "POST", "/jobs", payload))
+        clients = [threading.Thread(target=client, args=({"path": csv_file, "rules": rules},)),
+                   threading.Thread(target=client, args=({"upload": upload, "rules": rules[:1]},))]
+        for t in clients: t.start()
+        for t in clients: t.join()
+        assert sorted(code for code, _ in submitted) == [202, 202], submitted
+        
+        statuses = {}
+        for _, job in submitted:
+            code, job_status = _request(base_url, "GET", f"/jobs/{job['job_id']}?wait=60")
+            assert code == 200 and job_status["status"] == "done", job_status
+            statuses[job_status["file"]] = job_status["result"]["status"]
+        assert statuses == {"dumm_service.csv": "FAIL", "uploaded.csv": "PASS"}, statuses
+        
+        # No master config: the file stem has no config
+        code, job = _request(base_url, "POST", "/jobs", {"path": csv_file})
+        assert _request(base_url, "GET", f"/jobs/{job['job_id']}?wait=60")[1]["result"]["status"] == "NO_CONFIG"
+        
+        assert _request(base_url, "POST", "/jobs", {"path": csv_file + ".missing", "rules": rules})[0] == 400
+        # Rules that can never run are rejected up front
+        bad_rules = [dict(rules[0], rule_type="Bogus"), Rule(0.0, 1.0, "TopicB >", "", RuleType.EXPR).to_dict()]
+        for bad in bad_rules:
+            assert _request(base_url, "POST", "/jobs", {"path": csv_file, "rules": [bad]})[0] == 400, bad
+        assert _request(base_url, "GET", "/jobs/unknown")[0] == 404
+        assert len(_request(base_url, "GET", "/jobs")[1]["jobs"]) == 3
+        assert _request(base_url, "GET", "/health")[1]["pending"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+        os.remove(csv_file)
+    print("Service verification passed.")
+
+def test_pipelined_batch():
+    from core.batch_processor import BatchProcessor
+    from core.batch_pipeline import PipelinedBatchProcessor, STAGES
+    
+    with temp_folder() as folder:
+        for name, values in [("rec_a", [1] * 40), ("rec_b", [1] * 20 + [2] * 20), ("rec_c", [1] * 40)]:
+            write_recording(os.path.join(folder, name + ".csv"), {"TopicA": values})
+        open(os.path.join(folder, "broken.csv"), "w").close()
+        rules = [Rule(0.0, 1.2, "TopicA", 1, RuleType.MUST).to_dict()]
+        logic = master_logic({stem: {"rules": rules} for stem in ["rec_a", "rec_b", "broken"]})
+        
+        expected = BatchProcessor().run_batch(folder, logic)
+        processor = PipelinedBatchProcessor(parse_workers=2, queue_size=1)
+        results = processor.run_batch(folder, logic)
+        strip = lambda entries: [{k: v for k, v in e.items() if k != "duration"} for e in entries]
+        assert strip(results) == strip(expected), results
+        assert {e["file"]: e["status"] for e in results} == {"rec_a.csv": "PASS", "rec_b.csv": "FAIL",
+                                                             "rec_c.csv": "NO_CONFIG", "broken.csv": "ERROR"}
+        assert processor.stage_stats["sink"]["items"] == 4 and set(processor.stage_stats) == set(STAGES)
+        
+        # Memory budget: a budget below one recording's estimate parses them one at a time
+        mem_folder = os.path.join(folder, "mem")
+        for i in range(4):
+            write_recording(os.path.join(mem_folder, f"mem_{i}.csv"), {"TopicA": [1 + i % 2] * 200})
+        logic.master_config_data["files"].update({f"mem_{i}": {"rules": rules} for i in range(4)})
+        for max_memory_mb, max_in_flight in [(1, 1), (4096, None)]:
+            processor = PipelinedBatchProcessor(parse_workers=2, max_memory_mb=max_memory_mb)
+            results = processor.run_batch(mem_folder, logic)
+            assert [e["status"] for e in results] == ["PASS", "FAIL", "PASS", "FAIL"], results
+            assert processor.memory_stats["limit_mb"] == max_memory_mb
+            if max_in_flight is not None:
+                assert processor.memory_stats["max_in_flight"] == max_in_flight, processor.memory_stats
+            assert processor.memory_stats["in_flight"] == 0
+        
+        # Zero byte reservations are released too (nothing measured: the file fails to parse)
+        with open(os.path.join(mem_folder, "mem_bad.xlsx"), "wb") as f:
+            f.write(b"not a workbook")
+        logic.master_config_data["files"]["mem_bad"] = {"rules": rules}
+        processor = PipelinedBatchProcessor(parse_workers=2, max_memory_mb=1)
+        processor.memory_model.estimate = lambda path: (0, 0)
+        results = processor.run_batch(mem_folder, logic)
+        assert [e["status"] for e in results if e["file"] == "mem_bad.xlsx"] == ["ERROR"]
+        assert processor.memory_stats["in_flight"] == 0 and processor.memory_stats["max_in_flight"] >= 1
+    print("Pipelined batch verification passed.")
+
+def test_distributed_batch():
+    import multiprocessing
+    from core.batch_processor import BatchProcessor
+    from core.work_queue import WorkQueue, run_worker
+    
+    with temp_folder() as folder:
+        for i in range(6):
+            values = [1] * 40 if i % 2 == 0 else [1] * 20 + [2] * 20
+            write_recording(os.path.join(folder, f"rec_{i}.csv"), {"TopicA": values})
+        rules = [Rule(0.0, 1.2, "TopicA", 1, RuleType.MUST).to_dict()]
+        logic = master_logic({f"rec_{i}": {"rules": rules} for i in range(5)})
+        queue_path = os.path.join(folder, "queue.db")
+        
+        with WorkQueue(queue_path, lease_seconds=0.5) as queue:
+            assert queue.enqueue_folder(folder, logic) == 6
+            assert queue.enqueue_folder(folder, logic) == 0, "Enqueuing again must not duplicate files"
+            # A node that claims a file and dies without reporting it
+            crashed = queue.claim("crashed-node")
+        
+        # Local processes stand in for the worker nodes
+        workers = [multiprocessing.Process(target=run_worker, args=(queue_path, f"node-{i}"),
+                                           kwargs={"poll_interval": 0.1, "lease_seconds": 0.5})
+                   for i in range(3)]
+        for w in workers: w.start()
+        for w in workers: w.join(60)
+        assert all(w.exitcode == 0 for w in workers)
+        
+        with WorkQueue(queue_path) as queue:
+            assert queue.counts() == {"pending": 0, "leased": 0, "done": 6, "failed": 0}, queue.counts()
+            results = queue.results()
+            attempts = queue.conn.execute("SELECT attempts FROM tasks WHERE task_id = ?", (crashed[0][0],)).fetchone()[0]
+        assert attempts == 2, "The crashed node's file should have been claimed again after its lease expired"
+        
+        os.remove(queue_path)
+        expected = BatchProcessor().run_batch(folder, logic)
+        strip = lambda entries: sorted(({k: v for k, v in e.items() if k not in ("duration", "worker")} for e in entries),
+                                       key=lambda e: e["file"])
+        assert strip(results) == strip(expected)
+    print("Distributed batch verification passed.")
+
+def test_result_sinks():
+    from core.batch_processor import BatchProcessor
+    from core.batch_pipeline import PipelinedBatchProcessor
+    from core.result_sinks import open_sink, read_results, read_column
+    
+    with temp_folder() as folder:
+        data = os.path.join(folder, "data")
+        for i in range(5):
+            write_recording(os.path.join(data, f"rec_{i}.csv"), {"TopicA": [1] * 40 if i % 2 == 0 else [2] * 40})
+        logic = master_logic({f"rec_{i}": {"rules": [Rule(0.0, 1.2, "TopicA", 1, RuleType.MUST).to_dict()]}
+                              for i in range(5)})
+        expected = {e["file"]: e["status"] for e in BatchProcessor().run_batch(data, logic)}
+        
+        for name, processor in [("out.csv", BatchProcessor()), ("out.jsonl", PipelinedBatchProcessor()), ("out_cols", BatchProcessor())]:
+            path = os.path.join(folder, name)
+            # First run dies after two files, in the middle of writing the third
+            with open_sink(path) as sink:
+                processor.run_batch(data, logic, result_sink=sink, keep_results=False)
+            kept = list(read_results(path))[:2]
+            with open_sink(path) as sink:
+                for entry in kept:
+                    sink.write(entry)
+            if os.path.isdir(path):
+                with open(os.path.join(path, "file.col"), "a") as f:
+                    f.write('"rec_')
+            else:
+                with open(path, "a") as f:
+                    f.write('rec_9.csv,PA')
+            
+            with open_sink(path, resume=True) as sink:
+                assert sink.completed_files() == {e["file"] for e in kept}
+                results = processor.run_batch(data, logic, result_sink=sink, resume=True)
+            assert len(results) == 3 and not {e["file"] for e in results} & sink.completed_files()
+            written = {e["file"]: e["status"] for e in read_results(path)}
+            assert written == expected, (name, written)
+            if os.path.isdir(path):
+                assert sorted(read_column(path, "file")) == sorted(expected)
+        
+        # CSV resume cuts at record ends, not at line breaks inside quoted fields
+        path = os.path.join(folder, "multiline.csv")
+        entries = [{"file": f"m_{i}.csv", "status": "FAIL", "fail_count": 1, "details": f"first\r\nsecond {i}"}
+                   for i in range(2)]
+        with open_sink(path) as sink:
+            for entry in entries:
+                sink.write(entry)
+        with open(path, "a", newline="") as f:
+            f.write('m_9.csv,FAIL,1,"first\r\nsec')
+        with open_sink(path, resume=True) as sink:
+            assert sink.completed_files() == {"m_0.csv", "m_1.csv"}
+            sink.write(dict(entries[0], file="m_2.csv"))
+        assert [(e["file"], e["details"]) for e in read_results(path)] == \
+            [("m_0.csv", "first\r\nsecond 0"), ("m_1.csv", "first\r\nsecond 1"), ("m_2.csv", "first\r\nsecond 0")]
+        
+        from core.result_sinks import ResultSink
+        try:
+            ResultSink(path)
+            assert False, "ResultSink is abstract"
+        except TypeError:
+            pass
+    print("Result sink verification passed.")
+
+def test_batch_scheduling():
+    from core.batch_processor import BatchProcessor
+    from core.batch_pipeline import PipelinedBatchProcessor
+    from core.batch_scheduler import schedule, ORDER_COST, ORDER_FEEDBACK
+    from core.results_store import ResultsStore
+    
+    with temp_folder() as folder:
+        data = os.path.join(folder, "data")
+        sizes = {"rec_0": 50, "rec_1": 2000, "rec_2": 400}
+        for stem, n in sizes.items():
+            write_recording(os.path.join(data, f"{stem}.csv"), {"TopicA": [1] * n})
+        logic = master_logic({stem: {"rules": [Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST).to_dict()]}
+                              for stem in sizes})
+        paths = [os.path.join(data, f"rec_{i}.csv") for i in range(3)]
+        
+        # Largest first without any history
+        ordered = schedule(paths, data, logic, ORDER_COST)
+        assert [os.path.basename(p) for p in ordered] == ["rec_1.csv", "rec_2.csv", "rec_0.csv"], ordered
+        
+        # A file that failed last time comes first, whatever its cost
+        store = ResultsStore(os.path.join(folder, "history.db"))
+        logic.master_config_data["files"]["rec_1"]["rules"] = [Rule(0.0, 1.0, "TopicA", 2, RuleType.MUST).to_dict()]
+        BatchProcessor().run_batch(data, logic, results_store=store)
+        history = store.last_file_results()
+        assert history["rec_1.csv"]["status"] == "FAIL"
+        assert schedule(paths, data, logic, ORDER_FEEDBACK, history)[0].endswith("rec_1.csv")
+        
+        # Both engines give the same results in every order
+        expected = {e["file"]: e["status"] for e in BatchProcessor().run_batch(data, logic)}
+        for order in (ORDER_COST, ORDER_FEEDBACK):
+            for processor in (BatchProcessor(), PipelinedBatchProcessor()):
+                results = processor.run_batch(data, logic, results_store=store, order=order)
+                assert {e["file"]: e["status"] for e in results} == expected
+        store.close()
+    print("Batch scheduling verification passed.")
+
+def test_results_store():
+    import sqlite3
+    from core.batch_processor import BatchProcessor
+    from core.results_store import ResultsStore
+    
+    with temp_folder() as folder:
+        for name, values in (("a", [1] * 40), ("b", [1] * 16 + [2] * 24)):
+            write_recording(os.path.join(folder, name, "rec.csv"), {"TopicA": values})
+        # Both rules describe themselves as "0.0s-0.5s"; only the second reaches frame 16
+        rules = [Rule(0.0, 0.5, "TopicA", 1, RuleType.MUST), Rule(0.0, 0.54, "TopicA", 1, RuleType.MUST)]
+        assert rules[0].describe() == rules[1].describe()
+        logic = master_logic({"rec": {"rules": [r.to_dict() for r in rules]}})
+        
+        store = ResultsStore(os.path.join(folder, "history.db"))
+        for name in ("a", "b", "a"):
+            BatchProcessor().run_batch(os.path.join(folder, name), logic, results_store=store)
+        a, b = os.path.join(folder, "a"), os.path.join(folder, "b")
+        
+        # The same relative path in two folders is kept apart
+        assert store.last_file_results(a)["rec.csv"]["status"] == "PASS"
+        assert store.last_file_results(b)["rec.csv"]["status"] == "FAIL"
+        assert [r["run_id"] for r in store.runs(folder=a)] == [3, 1]
+        assert [h["status"] for h in store.file_history("rec.csv", b)] == ["FAIL"]
+        assert store.newly_failing_files(*[r["run_id"] for r in store.runs(limit=2, folder=a)][::-1]) == []
+        
+        # Rules with the same description are told apart by their hash
+        entry = BatchProcessor().run_batch(b, logic)[0]
+        hashes = [r["rule_hash"] for r in entry["rule_results"]]
+        assert hashes[0] != hashes[1]
+        assert [h["status"] for h in store.rule_history("rec.csv", hashes[0], b)] == ["PASS"]
+        assert [h["status"] for h in store.rule_history("rec.csv", hashes[1], b)] == ["FAIL"]
+        assert store.failing_since("rec.csv", hashes[1], b)["run_id"] == 2
+        assert store.failing_since("rec.csv", hashes[1], a) is None
+        store.close()
+        
+        # Histories written before rules were hashed are migrated
+        old_path = os.path.join(folder, "old.db")
+        conn = sqlite3.connect(old_path)
+        conn.executescript("CREATE TABLE rules (rule_id INTEGER PRIMARY KEY, rule TEXT UNIQUE NOT NULL);"
+                           "INSERT INTO rules (rule) VALUES ('MUST x == 1 (0.0s-1.0s)');")
+        conn.close()
+        with ResultsStore(old_path) as old:
+            BatchProcessor().run_batch(b, logic, results_store=old)
+            assert old.conn.execute("SELECT COUNT(*) FROM rules").fetchone()[0] == 3
+    print("Results store verification passed.")
+
+def test_preflight():
+    from core.batch_processor import BatchProcessor
+    from core.batch_pipeline import PipelinedBatchProcessor
+    from core.dataset_cache import dataset_cache
+    from core.logic import missing_topics
+    
+    rules = [Rule(0.0, 1.0, "TopicA < 5 & TopicQ == 1", "", RuleType.EXPR),
+             Rule(0.0, 1.0, ["TopicA", "Topic[BZ]"], [1, 1], RuleType.IMPLIES, 0.5),
+             Rule(0.0, 1.0, ["TopicA", "TopicR"], [1, 1], RuleType.MUST_OR),
+             Rule(0.0, 1.0, ["TopicS", "TopicA"], [1, 1], RuleType.MUST_OR)]
+    assert missing_topics(rules, ["TopicA", "TopicB"]) == ["TopicQ", "TopicS"]
+    assert missing_topics(rules[1:3], ["TopicA", "TopicB"]) == []
+    assert missing_topics(rules[1:2], ["TopicA"]) == ["Topic[BZ]"]
+    
+    with temp_folder() as folder:
+        for name in ["ok", "empty", "missing", "unlisted"]:
+            write_recording(os.path.join(folder, name + ".csv"), {"TopicA": [1] * 40, "TopicB": [0] * 40})
+        must = Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST).to_dict()
+        logic = master_logic({"ok": {"rules": [must]}, "empty": {"rules": [], "metadata": {"vehicle": "V1"}},
+                              "missing": {"rules": [must, Rule(0.0, 1.0, "TopicZ", 1, RuleType.MUST).to_dict()]}})
+        expected = {"ok.csv": "PASS", "empty.csv": "EMPTY_RULES", "missing.csv": "MISSING_TOPICS", "unlisted.csv": "NO_CONFIG"}
+        for processor in (PipelinedBatchProcessor(), BatchProcessor()):
+            results = {e["file"]: e for e in processor.run_batch(folder, logic)}
+            assert {f: e["status"] for f, e in results.items()} == expected, results
+            assert results["missing.csv"]["details"] == "Missing topics: TopicZ"
+            assert results["empty.csv"]["vehicle"] == "V1"
+            # Rejected files are never loaded
+            assert dataset_cache.get(os.path.join(folder, "missing.csv")) is None
+            assert dataset_cache.get(os.path.join(folder, "empty.csv")) is None
+        
+        # The pipeline checks a header once: files discovery accepted are not checked again
+        import core.batch_processor as batch_processor
+        checked = []
+        check_header = batch_processor._preflight_rules
+        batch_processor._preflight_rules = lambda path, rules: checked.append(os.path.basename(path)) or check_header(path, rules)
+        try:
+            PipelinedBatchProcessor().run_batch(folder, logic)
+        finally:
+            batch_processor._preflight_rules = check_header
+        assert checked.count("ok.csv") == 1, checked
+        
+        results = {e["file"]: e["status"] for e in BatchProcessor().run_batch(folder, logic, use_preflight=False)}
+        assert results["empty.csv"] == "PASS" and results["missing.csv"] == "PASS"
+    print("Pre-flight verification passed.")
+
+def test_rule_optimizer():
+    from core.rule_optimizer import optimize_rules
+    
+    with temp_folder() as folder:
+        path = os.path.join(folder, "rec.csv")
+        write_recording(path, {"TopicA": [1] * 60 + [2] * 40, "TopicB": [0] * 100})
+        loader = ExcelLoader()
+        loader.load_file(path)
+    
+    rules = [Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST),
+             Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST, 0.5),   # Duplicate (tolerance unused)
+             Rule(1.0, 2.5, "TopicA", 1, RuleType.MUST),        # Adjacent window, fails after 60 frames
+             Rule(0.0, 3.0, ["TopicB", "TopicA"], [0, 1], RuleType.MUST_OR),
+             Rule(0.0, 3.0, ["TopicB", "TopicA", "TopicA"], [0, 1, 1], RuleType.MUST_OR),
+             Rule(0.0, 1.0, "TopicA", 1, RuleType.EXIST),
+             Rule(2.0, 3.0, "TopicA", 1, RuleType.EXIST)]
+    plan = optimize_rules(rules)
+    assert [u.members for u in plan.units] == [[0, 1, 2], [3, 4], [5], [6]]
+    
+    logic = InspectorLogic()
+    logic.rules = rules
+    for verdict_only in (True, False):
+        for fail_fast in (False, True):
+            optimized = logic.check_rules(loader, verdict_only, fail_fast)
+            assert optimized == logic.check_rules(loader, verdict_only, fail_fast, optimize=False)
+    statuses = [r["status"] for r in logic.check_rules(loader, verdict_only=True)]
+    assert statuses == ["PASS", "PASS", "FAIL", "PASS", "PASS", "PASS", "FAIL"], statuses
+    assert logic.check_rules(loader)[2]["fail_frames"][0] == 60
+    print("Rule optimizer verification passed.")
+
+def test_config_patterns():
+    from core.batch_processor import BatchProcessor
+    
+    must = lambda value: {"rules": [Rule(0.0, 1.0, "TopicA", value, RuleType.MUST).to_dict()]}
+    logic = master_logic({"base": must(1), "run_7": must(3)}, patterns=[
+        {"match": "run_*", "use": "base"},
+        {"match": r"run_(\d+)_night", "kind": "regex", "priority": 5, "config": must(2)},
+        {"match": "night/*", "on": "path", "config": must(4)},
+        {"match": "*_v?", "config": must(5)},
+    ])
+    assert logic.get_config_for_file("run_1") == must(1)              # Glob + "use"
+    assert logic.get_config_for_file("run_12_night") == must(2)       # Priority beats list order
+    assert logic.get_config_for_file("run_7") == must(3)              # Exact entry wins
+    assert logic.get_config_for_file("x", "night/x.csv") == must(4)   # Path pattern
+    assert logic.get_config_for_file("run_1", "night/run_1.csv") == must(1) # Earlier entry wins
+    assert logic.get_config_for_file("cam_v2") == must(5)
+    assert logic.get_config_for_file("other") is None
+    logic.master_config_data["patterns"].append({"match": "oth*", "config": must(6)})
+    assert logic.get_config_for_file("other") == must(6)              # Index follows changes
+    
+    with temp_folder() as folder:
+        for rel in ["run_1.csv", "run_7.csv", "night/x.csv", "unknown.csv"]:
+            write_recording(os.path.join(folder, rel), {"TopicA": [1] * 40})
+        results = {e["file"].replace(os.sep, "/"): e["status"] for e in BatchProcessor().run_batch(folder, logic)}
+        assert results == {"run_1.csv": "PASS", "run_7.csv": "FAIL", "night/x.csv": "FAIL", "unknown.csv": "NO_CONFIG"}, results
+        
+        # The service matches path patterns against the upload name
+        import json
+        import base64
+        from core.service import ValidationService
+        master_path = os.path.join(folder, "master.json")
+        with open(master_path, "w") as f:
+            json.dump(dict(logic.master_config_data, macros=[]), f)
+        with open(os.path.join(folder, "night", "x.csv"), "rb") as f:
+            content = base64.b64encode(f.read()).decode("ascii")
+        service = ValidationService(master_path, max_workers=1)
+        try:
+            job = service.submit({"upload": {"name": "night/x.csv", "content": content}})
+            assert service.status(job["job_id"], wait=60)["result"]["status"] == "FAIL"
+        finally:
+            service.shutdown()
+    print("Config pattern verification passed.")
+
+def test_plan_cache():
+    from core.batch_processor import BatchProcessor, PlanCache, check_file
+    from core.batch_pipeline import PipelinedBatchProcessor
+    
+    with temp_folder() as folder:
+        for i in range(4):
+            write_recording(os.path.join(folder, f"rec_{i}.csv"), {"TopicA": [1] * 40 if i < 3 else [2] * 40})
+        rules = [Rule(0.0, 1.0, "TopicA", 1, RuleType.MUST).to_dict(), Rule(0.5, 1.2, "TopicA", 1, RuleType.MUST).to_dict()]
+        # Same rules in separate entries, metadata differs per file
+        logic = master_logic({f"rec_{i}": {"rules": [dict(r) for r in rules], "metadata": {"vehicle": f"V{i}"}}
+                              for i in range(4)})
+        
+        for processor in (BatchProcessor(), PipelinedBatchProcessor()):
+            results = processor.run_batch(folder, logic)
+            assert {e["file"]: (e["status"], e["vehicle"]) for e in results} == \
+                {"rec_0.csv": ("PASS", "V0"), "rec_1.csv": ("PASS", "V1"), "rec_2.csv": ("PASS", "V2"), "rec_3.csv": ("FAIL", "V3")}
+            assert (processor.plan_cache.misses, processor.plan_cache.hits) == (1, 3)
+        
+        cache = PlanCache()
+        path = os.path.join(folder, "rec_3.csv")
+        config = logic.get_config_for_file("rec_3")
+        strip = lambda e: {k: v for k, v in e.items() if k != "duration"}
+        for collect_intervals in (False, True):
+            assert strip(check_file(path, config, collect_intervals=collect_intervals, plan_cache=cache)) == \
+                strip(check_file(path, config, collect_intervals=collect_intervals))
+    print("Plan cache verification passed.")
+
 if __name__ == "__main__":
     test_core_logic()
+    test_verdict_only()
+    test_expression_rules()
+    test_expression_types()
+    test_implies()
+    test_dataset_cache()
+    test_header_probe()
+    test_segments()
+    test_deferred_imports()
+    test_batch_analytics()
+    test_macro_sweep()
+    test_interval_bands()
+    test_recording_diff()
+    test_xlsx_reader()
+    test_csv_schema_drift()
+    test_array_store()
+    test_validation_service()
+    test_pipelined_batch()
+    test_distributed_batch()
+    test_result_sinks()
+    test_batch_scheduling()
+    test_results_store()
+    test_preflight()
+    test_rule_optimizer()
+    test_config_patterns()
+    test_plan_cache()